@@ -6,6 +6,8 @@ Verwendet ConfigHandler für persistenten API-Key.
 
 import os
 import sys
+import time
+import importlib.util
 import streamlit as st
 import traceback
 
@@ -17,9 +19,11 @@ st.set_page_config(
 )
 
 # Debug-Informationen für Streamlit Cloud
+debug_expander = None
 try:
     # Zeige Umgebungsvariablen (ohne sensible Daten)
-    with st.expander("Debug-Informationen (nur während der Entwicklung)", expanded=False):
+    debug_expander = st.expander("Debug-Informationen (nur während der Entwicklung)", expanded=False)
+    with debug_expander:
         st.write(f"Python-Version: {sys.version}")
         st.write(f"Aktuelles Verzeichnis: {os.getcwd()}")
         st.write(f"Dateien im aktuellen Verzeichnis: {os.listdir('.')}")
@@ -35,12 +39,13 @@ try:
 except Exception as e:
     st.error(f"Fehler bei der Debug-Anzeige: {str(e)}")
 
-# Import der Module mit verbesserter Fehlerbehandlung
-try:
-    import openai
-    st.success("✅ OpenAI erfolgreich importiert")
-except ImportError as e:
-    st.error(f"❌ Fehler beim Import von OpenAI: {str(e)}")
+# Import der Module mit verbesserter Fehlerbehandlung.
+# Schwere Bibliotheken (openai, chromadb, pandas, sentence-transformers) werden erst bei Bedarf
+# bzw. im Hintergrund-Aufwärmen importiert, damit die Oberfläche sofort erscheint.
+if importlib.util.find_spec("openai") is not None:
+    st.success("✅ OpenAI verfügbar")
+else:
+    st.error("❌ Die Bibliothek openai ist nicht installiert")
     st.info("Bitte stellen Sie sicher, dass die Bibliothek installiert ist: pip install openai")
 
 try:
@@ -52,12 +57,73 @@ except ImportError as e:
     st.info("Prüfen Sie, ob die Datei modules/rag.py existiert und das modules/__init__.py vorhanden ist.")
     
 try:
-    from modules.knowledge_base import KnowledgeBase
+    from modules.knowledge_base import KnowledgeBase, get_shared_knowledge_base
     st.success("✅ KnowledgeBase erfolgreich importiert")
 except ImportError as e:
     st.error(f"❌ Fehler beim Import der Knowledge-Base: {str(e)}")
     st.code(traceback.format_exc())
 
+try:
+    from modules.openai_client import get_openai_client
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des OpenAI-Client-Pools: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.chroma_manager import ChromaManager, get_shared_chroma_manager
+    from modules.embeddings import get_shared_embedding_backend, backend_options
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des ChromaManagers: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.answer_cache import get_shared_answer_cache, DEFAULT_CACHE_PATH
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des Antwort-Caches: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.semantic_cache import get_shared_semantic_cache
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des semantischen Caches: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.rate_limiter import get_shared_rate_limiter
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des Rate-Limiters: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.context_packer import ContextPacker
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des Context-Packers: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.history_compactor import HistoryCompactor
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des History-Compactors: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.knowledge_watcher import get_shared_knowledge_watcher
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des Knowledge-Watchers: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.warmup import get_shared_warmup, READY, FAILED
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import des Aufwärmens: {str(e)}")
+    st.code(traceback.format_exc())
+
+try:
+    from modules.telemetry import record_span, render_prometheus, start_metrics_server, DEFAULT_METRICS_HOST
+except ImportError as e:
+    st.error(f"❌ Fehler beim Import der Telemetrie: {str(e)}")
+    st.code(traceback.format_exc())
+
 try:
     from modules.config_handler import ConfigHandler
     st.success("✅ ConfigHandler erfolgreich importiert")
@@ -72,6 +138,14 @@ except ImportError as e:
 # Nach erfolgreichen Imports UI-Debug-Elemente entfernen
 st.empty()
 
+# Maximale Anzahl gespeicherter Chat-Nachrichten pro Session
+MAX_CHAT_HISTORY_MESSAGES = 100
+
+# Prometheus-Endpunkt /metrics (einmal pro Prozess, 0 = deaktiviert; nur localhost,
+# außer metrics_host ist ausdrücklich gesetzt, z.B. "0.0.0.0" für einen externen Prometheus)
+if config.get_setting("metrics_port", 0):
+    start_metrics_server(int(config.get_setting("metrics_port", 0)), config.get_setting("metrics_host", DEFAULT_METRICS_HOST))
+
 # Titel und Beschreibung der App
 st.set_page_config(
     page_title="Saalbach-Hinterglemm Chatbot",
@@ -94,8 +168,8 @@ def test_openai_connection(api_key):
         return False, "Kein API-Schlüssel angegeben."
     
     try:
-        # OpenAI-Client konfigurieren
-        client = openai.OpenAI(api_key=api_key)
+        # Gemeinsamen OpenAI-Client aus dem Pool verwenden
+        client = get_openai_client(api_key, client_settings=config.get_client_settings())
         
         # Kurze Testanfrage
         response = client.chat.completions.create(
@@ -237,10 +311,183 @@ with st.sidebar:
 st.title("🏔️ Saalbach-Hinterglemm Tourismusberater")
 
 # Chatbot-Logik
+def get_chroma_manager():
+    """
+    Gibt den gemeinsamen ChromaManager mit dem konfigurierten Embedding-Backend zurück.
+    
+    Returns:
+        Der ChromaManager
+    """
+    embedding_settings = config.get_embedding_settings()
+    return get_shared_chroma_manager(
+        embedding_settings["model"],
+        embedding_backend=embedding_settings["backend"],
+        backend_options=backend_options(embedding_settings)
+    )
+
+def create_rag_system(api_key):
+    """
+    Erstellt das RAG-System mit den gespeicherten Einstellungen.
+    
+    Args:
+        api_key: Der OpenAI API-Schlüssel
+        
+    Returns:
+        Das initialisierte RAG-System
+    """
+    model = config.get_setting("model", "gpt-3.5-turbo")
+    
+    # Gemeinsamer Antwort-Cache für alle Sessions
+    answer_cache = None
+    if config.get_rag_setting("answer_cache_enabled", True):
+        answer_cache = get_shared_answer_cache(
+            max_entries=config.get_rag_setting("answer_cache_size", 500),
+            ttl_seconds=config.get_rag_setting("answer_cache_ttl", 24 * 3600),
+            db_path=DEFAULT_CACHE_PATH if config.get_rag_setting("answer_cache_persistent", True) else None
+        )
+    
+    # Semantischer Cache für umformulierte Fragen (lädt das Embedding-Modell einmal pro Prozess)
+    semantic_cache = None
+    if config.get_rag_setting("semantic_cache_enabled", True):
+        semantic_cache = get_shared_semantic_cache(
+            capacity=config.get_rag_setting("semantic_cache_size", 1000),
+            threshold=config.get_rag_setting("semantic_cache_threshold", 0.92),
+            ttl_seconds=config.get_rag_setting("answer_cache_ttl", 24 * 3600)
+        )
+    
+    # Prozessweites Limit für gleichzeitige LLM-Aufrufe sowie Requests/Tokens pro Minute
+    rate_limiter = get_shared_rate_limiter(
+        max_concurrent=config.get_setting("max_concurrent_requests", 8),
+        requests_per_minute=config.get_setting("requests_per_minute", 500),
+        tokens_per_minute=config.get_setting("tokens_per_minute", 200000),
+        max_wait_seconds=config.get_setting("rate_limit_max_wait", 30)
+    )
+    
+    # Vektorsuche über ChromaDB zusätzlich zur Stichwortsuche (Client und Modell einmal pro Prozess)
+    chroma_manager = None
+    if config.get_rag_setting("hybrid_search", True):
+        try:
+            chroma_manager = get_chroma_manager()
+        except Exception as e:
+            print(f"ChromaManager für die hybride Suche nicht verfügbar: {str(e)}")
+    
+    rag_system = RAGSystem(
+        api_key,
+        model,
+        client_settings=config.get_client_settings(),
+        answer_cache=answer_cache,
+        semantic_cache=semantic_cache,
+        rate_limiter=rate_limiter,
+        context_packer=ContextPacker(
+            model=model,
+            prompt_token_budget=config.get_rag_setting("prompt_token_budget", 3000),
+            max_section_tokens=config.get_rag_setting("max_section_tokens", 800)
+        ),
+        history_compactor=HistoryCompactor(
+            keep_recent_turns=config.get_rag_setting("history_recent_turns", 2),
+            history_token_budget=config.get_rag_setting("history_token_budget", 800),
+            model=model
+        ),
+        chroma_manager=chroma_manager,
+        retrieval_leg_timeout=config.get_rag_setting("retrieval_leg_timeout", 1.5),
+        structured_answers=config.get_rag_setting("structured_answers", True),
+        theme_routing=config.get_rag_setting("theme_routing", True),
+        theme_routing_confidence=config.get_rag_setting("theme_routing_confidence", 0.8)
+    )
+    
+    # Änderungen im Wissensverzeichnis ohne Neustart übernehmen (ein Watcher pro Prozess)
+    if config.get_rag_setting("knowledge_watch_enabled", True) and rag_system.knowledge_dir:
+        watcher = get_shared_knowledge_watcher(
+            rag_system.knowledge_dir,
+            poll_interval=config.get_rag_setting("knowledge_watch_interval", 2.0)
+        )
+        watcher.subscribe(rag_system.reload_files, weak=True)
+        
+        # ChromaDB nur einmal pro Prozess synchronisieren, nicht pro Session
+        if chroma_manager is not None and chroma_manager.is_functional and not watcher.has_subscriber("chroma"):
+            watcher.subscribe(get_shared_knowledge_base(rag_system.knowledge_dir, chroma_manager).sync_files, key="chroma")
+    
+    return rag_system
+
+def warm_up_keyword_index():
+    """Lädt Korpus, Stichwortindex, Eintragstabelle und Themen-Router (gemeinsam für alle Sessions)."""
+    RAGSystem(
+        None,
+        structured_answers=config.get_rag_setting("structured_answers", True),
+        theme_routing=config.get_rag_setting("theme_routing", True),
+        theme_routing_confidence=config.get_rag_setting("theme_routing_confidence", 0.8)
+    )
+
+def warm_up_embedding_model():
+    """Lädt das Embedding-Backend der Vektorsuche und das Modell des semantischen Caches."""
+    embedding_settings = config.get_embedding_settings()
+    get_shared_embedding_backend(
+        embedding_settings["backend"],
+        embedding_settings["model"],
+        backend_options(embedding_settings)
+    )
+    if config.get_rag_setting("semantic_cache_enabled", True):
+        get_shared_semantic_cache(
+            capacity=config.get_rag_setting("semantic_cache_size", 1000),
+            threshold=config.get_rag_setting("semantic_cache_threshold", 0.92),
+            ttl_seconds=config.get_rag_setting("answer_cache_ttl", 24 * 3600)
+        )
+
+def warm_up_chroma():
+    """Öffnet die ChromaDB-Collection für die Vektorsuche."""
+    chroma_manager = get_chroma_manager()
+    if not chroma_manager.is_functional:
+        raise RuntimeError("ChromaDB ist nicht verfügbar")
+
+def start_warmup():
+    """
+    Startet das Hintergrund-Aufwärmen (einmal pro Prozess) und gibt es zurück.
+    
+    Returns:
+        Das Aufwärmen oder None, wenn es deaktiviert ist
+    """
+    if not config.get_rag_setting("warmup_enabled", True):
+        return None
+    
+    steps = [("keyword_index", "Stichwortindex", warm_up_keyword_index)]
+    if config.get_rag_setting("semantic_cache_enabled", True) or config.get_rag_setting("hybrid_search", True):
+        steps.append(("embedding_model", "Embedding-Modell", warm_up_embedding_model))
+    if config.get_rag_setting("hybrid_search", True):
+        steps.append(("chroma", "Vektordatenbank", warm_up_chroma))
+    
+    try:
+        return get_shared_warmup(steps)
+    except Exception as e:
+        print(f"Aufwärmen konnte nicht gestartet werden: {str(e)}")
+        return None
+
+# Aufwärmen läuft im Hintergrund, die Oberfläche ist sofort bedienbar
+warmup = start_warmup()
+
+# Bereitschaftsstatus in der Sidebar
+if warmup is not None:
+    with st.sidebar:
+        if warmup.is_ready():
+            st.caption("✅ Tourismusberater vollständig bereit")
+        else:
+            st.caption("Tourismusberater bereit (eingeschränkt):" if warmup.is_finished()
+                       else "Tourismusberater wird vorbereitet:")
+            for step in warmup.get_status():
+                icon = "✅" if step["state"] == READY else "❌" if step["state"] == FAILED else "⏳"
+                duration = f" ({step['seconds']:.1f} s)" if step["seconds"] is not None else ""
+                st.caption(f"{icon} {step['label']}{duration}")
+
 def initialize_session_state():
     """Initialisiert die Session-State-Variablen."""
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
+    
+    # Solange das Aufwärmen läuft, wird das RAG-System erst bei der ersten Frage erstellt;
+    # es wartet dann nur auf die noch fehlenden Ressourcen statt sie erneut zu laden
+    if "rag_system" not in st.session_state and warmup is not None and not warmup.is_finished():
+        st.session_state.rag_system = None
+        return
+    
     if "rag_system" not in st.session_state:
         # RAG-System mit gespeichertem API-Key initialisieren
         try:
@@ -252,8 +499,7 @@ def initialize_session_state():
                 # Ansonsten aus Config laden
                 api_key = config.get_api_key()
                 
-            model = config.get_setting("model", "gpt-3.5-turbo")
-            st.session_state.rag_system = RAGSystem(api_key, model) if api_key else None
+            st.session_state.rag_system = create_rag_system(api_key) if api_key else None
         except Exception as e:
             st.error(f"Fehler bei der Initialisierung des RAG-Systems: {str(e)}")
             st.code(traceback.format_exc())
@@ -294,44 +540,88 @@ if prompt:
     if st.session_state.rag_system is None:
         with st.spinner("Initialisiere Tourismusberater..."):
             try:
-                model = config.get_setting("model", "gpt-3.5-turbo")
-                st.session_state.rag_system = RAGSystem(api_key, model)
+                st.session_state.rag_system = create_rag_system(api_key)
             except Exception as e:
                 st.error(f"Fehler bei der Initialisierung des RAG-Systems: {str(e)}")
                 st.code(traceback.format_exc())
                 st.session_state.rag_system = None  # Setze auf None, damit es beim nächsten Versuch erneut initialisiert wird
     
-    # Antwort mit Fortschrittsindikator generieren
+    # Antwort generieren und Token für Token anzeigen
     with st.chat_message("assistant", avatar="🤖"):
-        with st.spinner("Denke nach..."):
-            try:
-                # Chat-History für den Kontext vorbereiten (ohne Systemnachrichten)
-                chat_context = [
-                    {"role": msg["role"], "content": msg["content"]}
-                    for msg in st.session_state.chat_history[:-1]  # Letzte Nachricht ausschließen, wird separat hinzugefügt
-                ]
-                
-                # Antwort generieren
-                response = st.session_state.rag_system.answer_query(
-                    query=prompt,
-                    chat_history=chat_context
-                )
-                
-                # Antwort anzeigen
-                st.write(response)
+        placeholder = st.empty()
+        placeholder.markdown("Denke nach...")
+        response = ""
+        try:
+            # Chat-History für den Kontext vorbereiten (ohne Systemnachrichten)
+            chat_context = [
+                {"role": msg["role"], "content": msg["content"]}
+                for msg in st.session_state.chat_history[:-1]  # Letzte Nachricht ausschließen, wird separat hinzugefügt
+            ]
+            
+            # Antwort streamen und fortlaufend anzeigen, Zeit für die Darstellung separat messen
+            render_seconds = 0.0
+            render_updates = 0
+            for delta in st.session_state.rag_system.answer_query_stream(
+                query=prompt,
+                chat_history=chat_context
+            ):
+                response += delta
+                render_start = time.perf_counter()
+                placeholder.markdown(response + "▌")
+                render_seconds += time.perf_counter() - render_start
+                render_updates += 1
+            
+            # Vollständige Antwort ohne Cursor anzeigen
+            render_start = time.perf_counter()
+            placeholder.markdown(response)
+            render_seconds += time.perf_counter() - render_start
+            
+            last_trace = st.session_state.rag_system.last_trace
+            if last_trace is not None:
+                record_span("render", render_seconds, trace=last_trace, updates=render_updates + 1)
+                st.session_state.last_trace = last_trace.as_dict()
+            
+            # Fehlerbehandlung für Fallback-Antwort
+            if "technisches Problem" in response or "überfordert" in response:
+                st.error("Es gab ein Problem bei der Verarbeitung deiner Anfrage. Bitte überprüfe die API-Einstellungen oder versuche es später erneut.")
                 
-                # Fehlerbehandlung für Fallback-Antwort
-                if "technisches Problem" in response or "überfordert" in response:
-                    st.error("Es gab ein Problem bei der Verarbeitung deiner Anfrage. Bitte überprüfe die API-Einstellungen oder versuche es später erneut.")
-                    
-            except Exception as e:
-                error_message = f"Fehler bei der Verarbeitung: {str(e)}"
-                st.error(error_message)
-                response = "Servus! Entschuldige bitte, ich habe gerade ein technisches Problem. Magst du es in ein paar Minuten nochmal versuchen? Danke für dein Verständnis! 😊"
-                st.write(response)
+        except Exception as e:
+            error_message = f"Fehler bei der Verarbeitung: {str(e)}"
+            st.error(error_message)
+            fallback = "Servus! Entschuldige bitte, ich habe gerade ein technisches Problem. Magst du es in ein paar Minuten nochmal versuchen? Danke für dein Verständnis! 😊"
+            # Bereits angezeigten Teil der Antwort behalten
+            response = f"{response}\n\n{fallback}" if response else fallback
+            placeholder.markdown(response)
     
     # Antwort zur Chat-History hinzufügen
     st.session_state.chat_history.append({"role": "assistant", "content": response})
+    
+    # Gespeicherten Verlauf begrenzen, ältere Runden stecken in der Zusammenfassung des RAG-Systems
+    if len(st.session_state.chat_history) > MAX_CHAT_HISTORY_MESSAGES:
+        st.session_state.chat_history = st.session_state.chat_history[-MAX_CHAT_HISTORY_MESSAGES:]
+
+# Ablauf der letzten Anfrage und Metriken in den Debug-Informationen anzeigen
+if debug_expander is not None:
+    with debug_expander:
+        trace = st.session_state.get("last_trace")
+        if trace:
+            attributes = trace["attributes"]
+            st.write(
+                f"Letzte Anfrage: {trace['duration_ms']:.0f} ms ({trace['outcome']}), "
+                f"Tokens: {attributes.get('prompt_tokens', '-')} Prompt / {attributes.get('completion_tokens', '-')} Antwort"
+            )
+            st.table([
+                {
+                    "Stufe": f"{'  ' if span_data['parent'] else ''}{span_data['name']}",
+                    "Start (ms)": round(span_data["start_ms"], 1),
+                    "Dauer (ms)": round(span_data["duration_ms"] or 0.0, 1),
+                    "Details": ", ".join(f"{key}={value}" for key, value in span_data["attributes"].items()),
+                    "Fehler": span_data["error"] or ""
+                }
+                for span_data in trace["spans"]
+            ])
+            st.json(trace, expanded=False)
+        st.code(render_prometheus(), language="text")
 
 # Hinweis zur Verwendung am Ende
 st.markdown("---")
@@ -340,17 +630,44 @@ st.caption("Dies ist ein KI-gestützter Chatbot. Bitte beachten Sie, dass sich I
 # Status der Wissensbasis anzeigen
 with st.expander("Status der Wissensbasis", expanded=False):
     try:
-        kb = KnowledgeBase()
-        stats = kb.get_knowledge_statistics()
-        
-        if stats["total_documents"] > 0:
-            st.success(f"Wissensbasis aktiv: {stats['total_documents']} Dokumente in {len(stats['themes'])} Themen")
-            
-            # Themen anzeigen
-            themes_str = ", ".join(stats["themes"])
-            st.write(f"Verfügbare Themen: {themes_str}")
+        if warmup is not None and "chroma" in warmup.steps and not warmup.is_finished("chroma"):
+            # Nicht auf das Laden von Modell und Datenbank warten, das Aufwärmen erledigt das im Hintergrund
+            st.info("Die Wissensbasis wird gerade vorbereitet ⏳")
         else:
-            st.warning("Keine Dokumente in der Wissensbasis gefunden. Bitte importieren Sie Daten über das Admin-Tool.")
+            # Gemeinsame Wissensbasis: kein neuer ChromaDB-Client und kein Modell-Laden pro Rerun
+            kb = get_shared_knowledge_base(chroma_manager=get_chroma_manager())
+            stats = kb.get_knowledge_statistics()
+            
+            if stats["total_documents"] > 0:
+                st.success(f"Wissensbasis aktiv: {stats['total_documents']} Dokumente in {len(stats['themes'])} Themen")
+                
+                # Themen anzeigen
+                themes_str = ", ".join(stats["themes"])
+                st.write(f"Verfügbare Themen: {themes_str}")
+            else:
+                st.warning("Keine Dokumente in der Wissensbasis gefunden. Bitte importieren Sie Daten über das Admin-Tool.")
             
     except Exception as e:
         st.error(f"Fehler beim Abrufen der Wissensbasis-Statistik: {str(e)}")
+    
+    # Trefferstatistik des Antwort-Caches
+    rag_system = st.session_state.get("rag_system")
+    if rag_system is not None and rag_system.answer_cache is not None:
+        cache_stats = rag_system.answer_cache.get_stats()
+        st.caption(
+            f"Antwort-Cache: {cache_stats['hits']} Treffer, {cache_stats['misses']} Fehlversuche "
+            f"(Trefferquote {cache_stats['hit_rate']:.0%}), {cache_stats['memory_entries']}/{cache_stats['max_entries']} Einträge"
+        )
+    if rag_system is not None and rag_system.semantic_cache is not None:
+        semantic_stats = rag_system.semantic_cache.get_stats()
+        st.caption(
+            f"Semantischer Cache: {semantic_stats['hits']} Treffer, {semantic_stats['misses']} Fehlversuche "
+            f"(Trefferquote {semantic_stats['hit_rate']:.0%}), {semantic_stats['entries']}/{semantic_stats['capacity']} Einträge"
+        )
+    chroma_manager = rag_system.retriever.chroma_manager if rag_system is not None else None
+    if chroma_manager is not None and chroma_manager.query_cache is not None:
+        query_stats = chroma_manager.query_cache.get_stats()
+        st.caption(
+            f"Anfrage-Embeddings: {query_stats['hits']} Treffer, {query_stats['misses']} Fehlversuche "
+            f"(Trefferquote {query_stats['hit_rate']:.0%}), {query_stats['entries']}/{query_stats['capacity']} Einträge"
+        )
@@ -0,0 +1,271 @@
+"""
+End-to-End-Latenzmessung für den Saalbach Tourismus Chatbot.
+Schickt Anfragen mit fester Parallelität durch SimpleRAG (Retrieval, Prompt,
+LLM-Aufruf) gegen den lokalen Mock-Server oder einen beliebigen
+OpenAI-kompatiblen Endpunkt und berichtet p50/p95/p99-Latenz, Time-to-first-Token,
+Durchsatz und Fehlerquote.
+
+Beispiele:
+    python -m benchmarks.e2e_latency --requests 200 --concurrency 16
+    python -m benchmarks.e2e_latency --mode stream --error-rate-429 0.05 --max-retries 2
+    python -m benchmarks.e2e_latency --base-url http://localhost:8000/v1 --api-key sk-... --output results.json
+"""
+
+import io
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from modules.rag import SimpleRAG, FALLBACK_MESSAGES
+from modules.openai_client import DEFAULT_CLIENT_SETTINGS, close_all_clients
+from modules.rate_limiter import LLMRateLimiter
+from benchmarks.mock_openai_server import MockOpenAIServer, add_mock_arguments, settings_from_args
+
+# Typische Gästefragen, werden reihum verwendet
+QUERIES = [
+    "Welche Wanderungen sind für Familien mit Kindern geeignet?",
+    "Wo kann ich in Hinterglemm gut Kaiserschmarrn essen?",
+    "Welche Biketrails gibt es für Anfänger?",
+    "Wie komme ich am besten zum Skicircus?",
+    "Was kann man bei Regen in Saalbach unternehmen?",
+    "Welche Hütten haben am Abend geöffnet?",
+    "Gibt es Rodelbahnen in der Region?",
+    "Welche Skipisten sind für Anfänger geeignet?"
+]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Berechnet ein Perzentil mit linearer Interpolation.
+
+    Args:
+        values: Messwerte
+        q: Perzentil zwischen 0 und 100
+
+    Returns:
+        Der Wert des Perzentils oder None bei leerer Liste
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _is_fallback(answer: str) -> bool:
+    """Erkennt Fallback-Antworten, die SimpleRAG statt einer Ausnahme liefert."""
+    return any(answer == message or answer.endswith("\n\n" + message) for message in FALLBACK_MESSAGES)
+
+
+def _run_sync(rag: SimpleRAG, query: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    answer = rag.answer_query(query)
+    latency = time.perf_counter() - start
+    return {"latency": latency, "ttft": None, "error": _is_fallback(answer), "chars": len(answer)}
+
+
+def _run_stream(rag: SimpleRAG, query: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    ttft = None
+    parts = []
+    for fragment in rag.answer_query_stream(query):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        parts.append(fragment)
+    latency = time.perf_counter() - start
+    answer = "".join(parts)
+    return {"latency": latency, "ttft": ttft, "error": _is_fallback(answer), "chars": len(answer)}
+
+
+def _run_threads(rag: SimpleRAG, mode: str, queries: List[str], concurrency: int) -> List[Dict[str, Any]]:
+    worker = _run_stream if mode == "stream" else _run_sync
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda query: worker(rag, query), queries))
+
+
+async def _run_async(rag: SimpleRAG, queries: List[str], concurrency: int) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query: str) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            answer = await rag.answer_query_async(query)
+            latency = time.perf_counter() - start
+            return {"latency": latency, "ttft": None, "error": _is_fallback(answer), "chars": len(answer)}
+
+    return await asyncio.gather(*(one(query) for query in queries))
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """
+    Verdichtet die Einzelmessungen zu Kennzahlen.
+
+    Args:
+        results: Messungen je Anfrage
+        wall_seconds: Gesamtdauer des Laufs
+
+    Returns:
+        Dictionary mit Latenz-Perzentilen (ms), TTFT, Durchsatz und Fehlerquote
+    """
+    ok = [r for r in results if not r["error"]]
+    latencies = [r["latency"] * 1000 for r in ok]
+    ttfts = [r["ttft"] * 1000 for r in ok if r["ttft"] is not None]
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value, 1) if value is not None else None
+
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(max(latencies) if latencies else None)
+        },
+        "ttft_ms": {
+            "p50": ms(percentile(ttfts, 50)),
+            "p95": ms(percentile(ttfts, 95)),
+            "p99": ms(percentile(ttfts, 99))
+        } if ttfts else None
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Führt einen Benchmark-Lauf aus.
+
+    Args:
+        args: Geparste Kommandozeilen-Argumente
+
+    Returns:
+        Dictionary mit Konfiguration, Kennzahlen und ggf. Statistik des Mock-Servers
+    """
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockOpenAIServer(settings_from_args(args)).start()
+        base_url = server.base_url
+
+    client_settings = dict(DEFAULT_CLIENT_SETTINGS)
+    client_settings["max_retries"] = args.max_retries
+    client_settings["max_connections"] = max(client_settings["max_connections"], args.concurrency)
+
+    rate_limiter = None
+    if args.max_concurrent_llm:
+        rate_limiter = LLMRateLimiter(max_concurrent=args.max_concurrent_llm)
+
+    # Ausgaben von SimpleRAG unterdrücken, sie kosten bei hoher Parallelität messbar Zeit
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    try:
+        with quiet:
+            rag = SimpleRAG(
+                openai_api_key=args.api_key,
+                model=args.model,
+                base_url=base_url,
+                client_settings=client_settings,
+                rate_limiter=rate_limiter
+            )
+            queries = [QUERIES[i % len(QUERIES)] for i in range(args.requests)]
+
+            # Aufwärmen: Verbindungen aufbauen und Importe laden, fließt nicht in die Messung ein
+            for query in queries[:min(args.warmup, len(queries))]:
+                rag.answer_query(query)
+
+            start = time.perf_counter()
+            if args.mode == "async":
+                results = asyncio.run(_run_async(rag, queries, args.concurrency))
+            else:
+                results = _run_threads(rag, args.mode, queries, args.concurrency)
+            wall_seconds = time.perf_counter() - start
+    finally:
+        close_all_clients()
+        if server is not None:
+            server.stop()
+
+    report = {
+        "config": {
+            "mode": args.mode,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "max_retries": args.max_retries,
+            "max_concurrent_llm": args.max_concurrent_llm,
+            "base_url": args.base_url or "mock",
+            "model": args.model
+        },
+        "results": summarize(results, wall_seconds)
+    }
+    if server is not None:
+        report["config"]["mock"] = {
+            "latency_ms": args.latency_ms,
+            "latency_jitter_ms": args.latency_jitter_ms,
+            "latency_distribution": args.latency_distribution,
+            "tokens_per_second": args.tokens_per_second,
+            "answer_tokens": args.answer_tokens,
+            "error_rate_429": args.error_rate_429,
+            "error_rate_5xx": args.error_rate_5xx,
+            "seed": args.seed
+        }
+        report["mock_stats"] = server.stats.as_dict()
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """Gibt den Bericht lesbar auf der Konsole aus."""
+    config = report["config"]
+    results = report["results"]
+    latency = results["latency_ms"]
+
+    print(f"Modus: {config['mode']}, Anfragen: {config['requests']}, Parallelität: {config['concurrency']}, "
+          f"Retries: {config['max_retries']}, Endpunkt: {config['base_url']}")
+    print(f"Erfolgreich: {results['succeeded']}/{results['requests']} "
+          f"(Fehlerquote {results['error_rate'] * 100:.1f}%), Dauer {results['wall_seconds']}s, "
+          f"Durchsatz {results['throughput_rps']} Anfragen/s")
+    print(f"Latenz (ms): p50 {latency['p50']}, p95 {latency['p95']}, p99 {latency['p99']}, max {latency['max']}")
+    if results["ttft_ms"]:
+        ttft = results["ttft_ms"]
+        print(f"Time-to-first-Token (ms): p50 {ttft['p50']}, p95 {ttft['p95']}, p99 {ttft['p99']}")
+    if "mock_stats" in report:
+        print(f"Mock-Server: {report['mock_stats']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-End-Latenzmessung für SimpleRAG")
+    parser.add_argument("--mode", choices=["sync", "stream", "async"], default="sync", help="Antwortpfad von SimpleRAG")
+    parser.add_argument("--requests", type=int, default=100, help="Anzahl der Anfragen")
+    parser.add_argument("--concurrency", type=int, default=8, help="Gleichzeitige Anfragen")
+    parser.add_argument("--warmup", type=int, default=2, help="Anfragen zum Aufwärmen (nicht gemessen)")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_CLIENT_SETTINGS["max_retries"],
+                        help="Wiederholungen des OpenAI-Clients bei 429/5xx")
+    parser.add_argument("--max-concurrent-llm", type=int, default=0,
+                        help="Optional, Rate-Limiter mit dieser Anzahl gleichzeitiger LLM-Aufrufe (0 = aus)")
+    parser.add_argument("--base-url", default=None, help="Echter Endpunkt statt des Mock-Servers")
+    parser.add_argument("--api-key", default="sk-benchmark", help="API-Schlüssel für den Endpunkt")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--output", default=None, help="Optional, Pfad für den Bericht als JSON")
+    parser.add_argument("--verbose", action="store_true", help="Ausgaben von SimpleRAG anzeigen")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Bericht gespeichert: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Benchmark der Embedding-Backends des Saalbach Tourismus Chatbots.
+Bettet die Abschnitte der Wissensbasis mit jedem Backend ein und misst Ladezeit,
+Durchsatz (Embeddings pro Sekunde, in Batches), Latenz je Anfrage-Embedding und
+Recall@k einer exakten Kosinus-Suche. Als Anfragen dienen die Besonderheiten der
+Einträge (ohne deren Namen), relevant ist jedes Dokument mit dem Namen des Eintrags.
+Für das int8-Backend wird zusätzlich die mittlere Kosinus-Ähnlichkeit zu den Vektoren
+des sentence-transformers-Modells ausgegeben.
+
+Beispiele:
+    python -m benchmarks.embedding_benchmark
+    python -m benchmarks.embedding_benchmark --backends hashing int8 --output embeddings.json
+"""
+
+import io
+import re
+import time
+import json
+import platform
+import argparse
+import contextlib
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from modules.rag import SimpleRAG
+from modules.embeddings import (
+    EMBEDDING_BACKENDS,
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_ONNX_FILE,
+    DEFAULT_HASHING_DIMENSIONS,
+    SentenceTransformerBackend,
+    create_embedding_backend
+)
+from benchmarks.retrieval_benchmark import RECALL_KS, _git_commit, _latency_stats, _relevant_ids
+
+DEFAULT_BATCH_SIZE = 64
+
+# Feld eines Eintrags, das als Anfrage dient (beschreibt den Eintrag, ohne ihn zu nennen)
+QUERY_FIELD_PATTERN = re.compile(r"\*\*Besonderheiten:\*\*\s*(.+)")
+
+
+def build_queries(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Erstellt gelabelte Anfragen aus den Einträgen der Wissensbasis.
+
+    Args:
+        documents: Abschnitte der Wissensbasis
+
+    Returns:
+        Anfragen mit "query", "relevant_name" und "file"
+    """
+    queries = []
+    seen = set()
+    for doc in documents:
+        name = (doc["metadata"].get("entry") or "").strip()
+        match = QUERY_FIELD_PATTERN.search(doc["content"])
+        if not name or not match or name in seen:
+            continue
+        seen.add(name)
+        queries.append({
+            "query": match.group(1).replace(name, "").strip(),
+            "relevant_name": name,
+            "file": doc["metadata"].get("source_file", "")
+        })
+    return queries
+
+
+def bench_backend(backend_name: str,
+                  options: Dict[str, Any],
+                  documents: List[Dict[str, Any]],
+                  queries: List[Dict[str, Any]],
+                  relevant: List[set],
+                  args: argparse.Namespace) -> Tuple[Dict[str, Any], Optional[np.ndarray]]:
+    """
+    Misst ein Embedding-Backend.
+
+    Args:
+        backend_name: Name des Backends
+        options: Optionen des Backends
+        documents: Abschnitte der Wissensbasis
+        queries: Gelabelte Anfragen
+        relevant: Relevante Dokument-IDs je Anfrage
+        args: Geparste Kommandozeilen-Argumente
+
+    Returns:
+        Kennzahlen des Backends (oder ein Fehlerhinweis) und die normalisierten Dokument-Embeddings
+    """
+    start = time.perf_counter()
+    try:
+        backend = create_embedding_backend(backend_name, args.model, options)
+        backend.embed(["Aufwärmen"])
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {str(e)}"}, None
+    load_seconds = time.perf_counter() - start
+
+    texts = [doc["content"] for doc in documents]
+    throughput = []
+    matrix: Optional[np.ndarray] = None
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        batches = [backend.embed(texts[offset:offset + args.batch_size])
+                   for offset in range(0, len(texts), args.batch_size)]
+        throughput.append(len(texts) / (time.perf_counter() - start))
+        matrix = np.vstack(batches)
+
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(backend.embed([query["query"]])[0])
+        latencies.append(time.perf_counter() - start)
+
+    # Exakte Kosinus-Suche, damit nur die Qualität der Embeddings eingeht
+    doc_matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query_matrix = np.vstack(query_vectors)
+    query_matrix /= np.maximum(np.linalg.norm(query_matrix, axis=1, keepdims=True), 1e-12)
+    ranking = np.argsort(-(query_matrix @ doc_matrix.T), axis=1)[:, :max(RECALL_KS)]
+    ids = [doc["id"] for doc in documents]
+    hits = {k: 0 for k in RECALL_KS}
+    for row, relevant_ids in zip(ranking, relevant):
+        ranked = [ids[index] for index in row]
+        for k in RECALL_KS:
+            if relevant_ids.intersection(ranked[:k]):
+                hits[k] += 1
+
+    result = {
+        "description": backend.describe(),
+        "dimensions": int(matrix.shape[1]),
+        "load_seconds": round(load_seconds, 3),
+        "embeddings_per_second": round(max(throughput), 1),
+        "query_latency_ms": _latency_stats(latencies),
+        "recall": {f"@{k}": round(hits[k] / len(queries), 4) if queries else None for k in RECALL_KS}
+    }
+    return result, doc_matrix
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Führt den Benchmark für alle gewählten Backends aus.
+
+    Args:
+        args: Geparste Kommandozeilen-Argumente
+
+    Returns:
+        Bericht mit Umgebung, Konfiguration und Ergebnissen je Backend
+    """
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        rag = SimpleRAG(knowledge_dir=args.knowledge_dir, structured_answers=False, theme_routing=False)
+    documents = rag.knowledge_base
+    queries = build_queries(documents)
+    relevant = _relevant_ids(documents, queries)
+    print(f"{len(documents)} Abschnitte, {len(queries)} Anfragen aus {rag.knowledge_dir}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "config": {
+            "knowledge_dir": rag.knowledge_dir,
+            "documents": len(documents),
+            "queries": len(queries),
+            "model": args.model,
+            "batch_size": args.batch_size,
+            "repeats": args.repeats,
+            "recall_ks": RECALL_KS
+        },
+        "results": {}
+    }
+
+    options = {
+        "int8": {"onnx_file": args.onnx_file},
+        "hashing": {"dimensions": args.hashing_dimensions}
+    }
+    matrices = {}
+    for backend_name in args.backends:
+        with quiet:
+            result, matrix = bench_backend(backend_name, options.get(backend_name, {}), documents, queries, relevant, args)
+        if matrix is not None:
+            matrices[backend_name] = matrix
+        report["results"][backend_name] = result
+        print_result(backend_name, result)
+
+    # Abweichung des quantisierten Modells vom Original (gleiche Dimensionen vorausgesetzt)
+    reference = matrices.get(SentenceTransformerBackend.name)
+    quantized = matrices.get("int8")
+    if reference is not None and quantized is not None and reference.shape == quantized.shape:
+        agreement = float(np.mean(np.sum(reference * quantized, axis=1)))
+        report["results"]["int8"]["cosine_to_reference"] = round(agreement, 4)
+        print(f"  [int8] mittlere Kosinus-Ähnlichkeit zu sentence_transformers: {agreement:.4f}")
+
+    return report
+
+
+def print_result(backend: str, result: Dict[str, Any]) -> None:
+    """Gibt die Kennzahlen eines Backends lesbar aus."""
+    if "error" in result:
+        print(f"  [{backend}] nicht verfügbar: {result['error']}")
+        return
+    latency = result["query_latency_ms"]
+    recall = ", ".join(f"{k} {v}" for k, v in result["recall"].items())
+    print(f"  [{backend}] {result['dimensions']} Dimensionen, geladen in {result['load_seconds']}s, "
+          f"{result['embeddings_per_second']} Embeddings/s")
+    print(f"  [{backend}] Anfrage (ms): p50 {latency['p50']}, p95 {latency['p95']}; Recall {recall}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark der Embedding-Backends auf der Wissensbasis")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--knowledge-dir", default=None, help="Verzeichnis der Markdown-Dateien (Standard: knowledge/)")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Modell für sentence_transformers und int8")
+    parser.add_argument("--onnx-file", default=DEFAULT_ONNX_FILE, help="Quantisiertes ONNX-Modell für int8")
+    parser.add_argument("--hashing-dimensions", type=int, default=DEFAULT_HASHING_DIMENSIONS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--repeats", type=int, default=3, help="Durchläufe für den Durchsatz (bester zählt)")
+    parser.add_argument("--output", default=None, help="Optional, Pfad für den Bericht als JSON")
+    parser.add_argument("--verbose", action="store_true", help="Ausgaben beim Laden anzeigen")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\nBericht gespeichert: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark für den vollständigen Neuaufbau der Wissensbasis (KnowledgeBase.import_all_knowledge).
+Erzeugt einen synthetischen Korpus und importiert ihn mit unterschiedlich vielen
+Prozessen jeweils in eine frische, temporäre ChromaDB-Collection. Ohne ChromaDB
+wird nur die Stufe Lesen + Zerlegen gemessen.
+
+Beispiele:
+    python -m benchmarks.ingest_benchmark
+    python -m benchmarks.ingest_benchmark --sections 20000 --workers 1 2 4 8 --batch-size 32 64 128
+"""
+
+import io
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+from typing import List, Dict, Any
+
+from modules.chroma_manager import ChromaManager
+from modules.knowledge_base import KnowledgeBase, DEFAULT_EMBED_BATCH_SIZE
+from benchmarks.synthetic_corpus import generate_corpus
+from benchmarks.retrieval_benchmark import _git_commit
+
+
+def bench_rebuild(corpus_dir: str, workers: int, batch_size: int, verbose: bool = False) -> Dict[str, Any]:
+    """
+    Misst einen vollständigen Import in eine leere Collection.
+
+    Args:
+        corpus_dir: Verzeichnis mit den Markdown-Dateien
+        workers: Anzahl der Prozesse für das Zerlegen
+        batch_size: Chunks je Embedding-Batch
+        verbose: Ausgaben von KnowledgeBase/ChromaManager anzeigen
+
+    Returns:
+        Kennzahlen des Laufs (Dauer, Dokumente, Durchsatz)
+    """
+    db_directory = tempfile.mkdtemp(prefix="saalbach_bench_ingest_")
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with quiet:
+            manager = ChromaManager(db_directory=db_directory, collection_name="ingest_benchmark")
+            knowledge_base = KnowledgeBase(corpus_dir, chroma_manager=manager)
+            start = time.perf_counter()
+            results = knowledge_base.import_all_knowledge(workers=workers, embed_batch_size=batch_size, force=True)
+            seconds = time.perf_counter() - start
+
+        documents = sum(results.values())
+        return {
+            "workers": workers,
+            "batch_size": batch_size,
+            "chroma": manager.is_functional,
+            "seconds": round(seconds, 3),
+            "documents": documents,
+            "failed_files": sum(1 for count in results.values() if count == 0),
+            "documents_per_second": round(documents / seconds, 1) if seconds > 0 else None
+        }
+    finally:
+        shutil.rmtree(db_directory, ignore_errors=True)
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Führt den Import für alle Kombinationen aus Prozessanzahl und Batch-Größe aus.
+
+    Args:
+        args: Geparste Kommandozeilen-Argumente
+
+    Returns:
+        Bericht mit Umgebung, Konfiguration und Ergebnissen
+    """
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "config": {"sections": args.sections, "workers": args.workers, "batch_sizes": args.batch_size},
+        "results": []
+    }
+
+    corpus_dir = tempfile.mkdtemp(prefix=f"saalbach_bench_ingest_{args.sections}_")
+    try:
+        corpus = generate_corpus(corpus_dir, args.sections, n_queries=0, seed=args.seed)
+        print(f"{corpus['sections']} Abschnitte in {len(corpus['files'])} Dateien erzeugt.")
+
+        for batch_size in args.batch_size:
+            for workers in args.workers:
+                result = bench_rebuild(corpus_dir, workers, batch_size, verbose=args.verbose)
+                report["results"].append(result)
+                stage = "" if result["chroma"] else " (ohne ChromaDB: nur Lesen + Zerlegen)"
+                print(f"  {workers} Prozesse, Batch {batch_size}: {result['seconds']}s, "
+                      f"{result['documents']} Dokumente, {result['documents_per_second']} Dokumente/s{stage}")
+    finally:
+        shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark für den Neuaufbau der Wissensbasis")
+    parser.add_argument("--sections", type=int, default=10000, help="Größe des Korpus (###-Abschnitte)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                        help="Zu messende Prozessanzahlen")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[DEFAULT_EMBED_BATCH_SIZE],
+                        help="Zu messende Embedding-Batch-Größen")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Optional, Pfad für den Bericht als JSON")
+    parser.add_argument("--verbose", action="store_true", help="Ausgaben von KnowledgeBase/ChromaManager anzeigen")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\nBericht gespeichert: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Lokaler Ersatz für den Chat-Completions-Endpunkt der OpenAI-API.
+Simuliert Latenz, Token-Durchsatz, Streaming (Server-Sent Events) sowie
+429- und 5xx-Fehler, damit der Chatbot ohne API-Kontingent unter Last
+getestet werden kann.
+
+Start als eigenständiger Server:
+    python -m benchmarks.mock_openai_server --port 8765 --latency-ms 400 --tokens-per-second 60
+"""
+
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional
+
+# Bausteine der simulierten Antworten (ein Eintrag entspricht ungefähr einem Token)
+ANSWER_TOKENS = [
+    "Servus", "!", " 😊", " Für", " Familien", " kann", " ich", " dir", " die", " Walleggalm",
+    " und", " die", " Sonnalm", " empfehlen", ".", " Mein", " Geheimtipp", ":", " Bestell",
+    " dort", " unbedingt", " den", " Kaiserschmarrn", "!", " Bis", " bald", "!"
+]
+
+
+class MockSettings:
+    """Konfiguration des simulierten Endpunkts."""
+
+    def __init__(self,
+                 latency_ms: float = 400.0,
+                 latency_jitter_ms: float = 100.0,
+                 latency_distribution: str = "lognormal",
+                 tokens_per_second: float = 60.0,
+                 answer_tokens: int = 150,
+                 error_rate_429: float = 0.0,
+                 error_rate_5xx: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: Mittlere Latenz bis zum ersten Token in Millisekunden
+            latency_jitter_ms: Streuung der Latenz in Millisekunden
+            latency_distribution: "fixed", "uniform" oder "lognormal"
+            tokens_per_second: Generierungsgeschwindigkeit nach dem ersten Token
+            answer_tokens: Anzahl der Tokens je Antwort (begrenzt durch max_tokens der Anfrage)
+            error_rate_429: Anteil der Anfragen, die mit 429 (Rate Limit) beantwortet werden
+            error_rate_5xx: Anteil der Anfragen, die mit 500/503 beantwortet werden
+            seed: Optional, Startwert für reproduzierbare Zufallszahlen
+        """
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        """
+        Zieht eine Latenz bis zum ersten Token.
+
+        Returns:
+            Latenz in Sekunden
+        """
+        with self._random_lock:
+            if self.latency_distribution == "fixed":
+                value = self.latency_ms
+            elif self.latency_distribution == "uniform":
+                value = self._random.uniform(self.latency_ms - self.latency_jitter_ms,
+                                             self.latency_ms + self.latency_jitter_ms)
+            else:
+                # Lognormal mit vorgegebenem Mittelwert und Streuung
+                mean = max(self.latency_ms, 1.0)
+                variance = self.latency_jitter_ms ** 2
+                sigma_sq = math.log(1 + variance / mean ** 2)
+                mu = math.log(mean) - sigma_sq / 2
+                value = self._random.lognormvariate(mu, sigma_sq ** 0.5)
+        return max(value, 0.0) / 1000.0
+
+    def sample_error(self) -> Optional[int]:
+        """
+        Entscheidet, ob die Anfrage mit einem Fehler beantwortet wird.
+
+        Returns:
+            HTTP-Statuscode des Fehlers oder None
+        """
+        with self._random_lock:
+            roll = self._random.random()
+            if roll < self.error_rate_429:
+                return 429
+            if roll < self.error_rate_429 + self.error_rate_5xx:
+                return self._random.choice([500, 503])
+        return None
+
+
+class MockStats:
+    """Thread-sichere Zähler des Mock-Servers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.streamed = 0
+        self.errors: Dict[int, int] = {}
+
+    def record(self, stream: bool, status: int) -> None:
+        with self._lock:
+            self.requests += 1
+            if stream:
+                self.streamed += 1
+            if status != 200:
+                self.errors[status] = self.errors.get(status, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": self.requests, "streamed": self.streamed, "errors": dict(self.errors)}
+
+
+def _answer_token(index: int) -> str:
+    return ANSWER_TOKENS[index % len(ANSWER_TOKENS)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP-Handler für /v1/chat/completions."""
+
+    protocol_version = "HTTP/1.1"
+    server: "_MockHTTPServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Keine Zugriffsprotokolle, sie verfälschen die Messung
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unbekannter Pfad: {self.path}", "type": "invalid_request_error"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Ungültiges JSON", "type": "invalid_request_error"}})
+            return
+
+        settings = self.server.settings
+        stream = bool(body.get("stream"))
+        model = body.get("model", "gpt-3.5-turbo")
+        completion_tokens = min(settings.answer_tokens, int(body.get("max_tokens") or settings.answer_tokens))
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+
+        # Latenz bis zum ersten Token (bzw. bis zur Fehlerantwort)
+        time.sleep(settings.sample_latency())
+
+        error = settings.sample_error()
+        if error is not None:
+            self.server.stats.record(stream, error)
+            if error == 429:
+                self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}},
+                                headers={"retry-after": "1"})
+            else:
+                self._send_json(error, {"error": {"message": "Mock server error", "type": "server_error"}})
+            return
+
+        self.server.stats.record(stream, 200)
+        created = int(time.time())
+        token_interval = 1.0 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+        completion_id = f"chatcmpl-mock-{random.getrandbits(32):08x}"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+        if not stream:
+            time.sleep(completion_tokens * token_interval)
+            content = "".join(_answer_token(i) for i in range(completion_tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        # Streaming als Server-Sent Events mit Chunked Transfer-Encoding
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload: str) -> None:
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            return json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            })
+
+        try:
+            send_event(chunk({"role": "assistant", "content": ""}))
+            for index in range(completion_tokens):
+                if index and token_interval:
+                    time.sleep(token_interval)
+                send_event(chunk({"content": _answer_token(index)}))
+            send_event(chunk({}, "stop"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send_event(json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage
+                }))
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hat den Stream abgebrochen
+            pass
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings: MockSettings):
+        super().__init__(address, _Handler)
+        self.settings = settings
+        self.stats = MockStats()
+
+
+class MockOpenAIServer:
+    """Startet den Mock-Endpunkt in einem Hintergrund-Thread."""
+
+    def __init__(self, settings: Optional[MockSettings] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            settings: Optional, Konfiguration des Endpunkts
+            host: Adresse, an die der Server gebunden wird
+            port: Port (0 wählt einen freien Port)
+        """
+        self.settings = settings or MockSettings()
+        self._server = _MockHTTPServer((host, port), self.settings)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def stats(self) -> MockStats:
+        return self._server.stats
+
+    def start(self) -> "MockOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    """Fügt die Kommandozeilen-Optionen des Mock-Servers zu einem Parser hinzu."""
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="Mittlere Latenz bis zum ersten Token")
+    parser.add_argument("--latency-jitter-ms", type=float, default=100.0, help="Streuung der Latenz")
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="Generierte Tokens pro Sekunde")
+    parser.add_argument("--answer-tokens", type=int, default=150, help="Tokens je Antwort")
+    parser.add_argument("--error-rate-429", type=float, default=0.0, help="Anteil der 429-Antworten (0-1)")
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0, help="Anteil der 5xx-Antworten (0-1)")
+    parser.add_argument("--seed", type=int, default=None, help="Startwert für reproduzierbare Läufe")
+
+
+def settings_from_args(args: argparse.Namespace) -> MockSettings:
+    """Erstellt MockSettings aus geparsten Kommandozeilen-Argumenten."""
+    return MockSettings(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        latency_distribution=args.latency_distribution,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate_429=args.error_rate_429,
+        error_rate_5xx=args.error_rate_5xx,
+        seed=args.seed
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokaler Mock des OpenAI Chat-Completions-Endpunkts")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(settings_from_args(args), host=args.host, port=args.port)
+    print(f"Mock-OpenAI-Server läuft auf {server.base_url} (Strg+C zum Beenden)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+        print(f"Statistik: {server.stats.as_dict()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""
+Mikrobenchmark für das Retrieval des Saalbach Tourismus Chatbots.
+Erzeugt synthetische Korpora in mehreren Größen und misst für die
+Stichwortsuche (SimpleRAG: _split_into_sections + BM25-Index) sowie optional
+für ChromaDB Aufbauzeit, Speicherbedarf, Latenz je Anfrage und Recall@k
+gegen gelabelte Anfragen. Mit --output werden die Ergebnisse als JSON geschrieben,
+damit Regressionen zwischen Versionen verglichen werden können. Die Stichwortsuche wird
+zusätzlich mit Themen-Routing gemessen (Latenz inklusive Routing, Anteil geroutete
+Anfragen und Trefferquote des Routers gegen das Thema der gesuchten Datei), die
+Vektorsuche zusätzlich als Batch über alle Anfragen (ChromaManager.search_many).
+Da die synthetischen Anfragen jeweils nur ein Thema betreffen, prüft ein zusätzlicher
+Lauf auf der echten Wissensbasis Anfragen über mehrere Themen ("Wanderung zu einer Hütte"):
+Der Router muss alle beteiligten Themen behalten, und der beste Treffer der
+uneingeschränkten Stichwortsuche darf nicht herausgefiltert werden.
+
+Beispiele:
+    python -m benchmarks.retrieval_benchmark
+    python -m benchmarks.retrieval_benchmark --sizes 1000 10000 --chroma --output results.json
+"""
+
+import io
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+from typing import List, Dict, Any, Callable, Optional
+
+from modules.rag import SimpleRAG
+from modules.corpus import load_corpus
+from modules.theme_router import theme_kind
+from benchmarks.synthetic_corpus import generate_corpus
+from benchmarks.e2e_latency import percentile
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    resource = None
+    RESOURCE_AVAILABLE = False
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+RECALL_KS = [1, 3, 5, 10]
+
+# Chroma berechnet Embeddings auf der CPU, große Korpora dauern dort sehr lange
+DEFAULT_CHROMA_MAX_SECTIONS = 10000
+CHROMA_BATCH_SIZE = 256
+
+# Anfragen über mehrere Themen (Art -> Präfix der Wissensdatei) für die Regressionsprüfung des Routers
+CROSS_THEME_QUERIES = [
+    {"query": "Wanderung zu einer Hütte mit Kaiserschmarrn", "kinds": ["wandern", "restaurants"]},
+    {"query": "Welche Wanderung endet bei einer Alm zum Einkehren?", "kinds": ["wandern", "restaurants"]},
+    {"query": "Nach der Bergtour gemütlich essen gehen", "kinds": ["wandern", "restaurants"]},
+    {"query": "Familienhotel in der Nähe von Wanderwegen", "kinds": ["unterkuenfte", "wandern"]},
+    {"query": "Hotel mit gutem Restaurant für ein Steak am Abend", "kinds": ["unterkuenfte", "restaurants"]},
+]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Maximaler Speicherverbrauch des Prozesses (inklusive nativer Bibliotheken) in MB."""
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldet KB, macOS Bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, Optional[float]]:
+    values = [latency * 1000 for latency in latencies]
+    return {
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "p50": round(percentile(values, 50), 4) if values else None,
+        "p95": round(percentile(values, 95), 4) if values else None,
+        "p99": round(percentile(values, 99), 4) if values else None
+    }
+
+
+def _relevant_ids(documents: List[Dict[str, Any]], queries: List[Dict[str, Any]]) -> List[set]:
+    """
+    Bestimmt je Anfrage die IDs der Dokumente, die den gesuchten Eintrag enthalten.
+    Unabhängig vom Chunking: relevant ist jedes Dokument mit dem Namen im Text.
+    """
+    by_name: Dict[str, set] = {query["relevant_name"]: set() for query in queries}
+    for doc in documents:
+        text = f"{doc['metadata'].get('subheading', '')}\n{doc['content']}"
+        for name, ids in by_name.items():
+            if name in text:
+                ids.add(doc["id"])
+    return [by_name[query["relevant_name"]] for query in queries]
+
+
+def _evaluate(search: Callable[[str, int], List[str]],
+              queries: List[Dict[str, Any]],
+              relevant: List[set],
+              repeats: int) -> Dict[str, Any]:
+    """
+    Misst Latenz und Recall@k einer Suchfunktion (Anfrage, k) -> Dokument-IDs.
+    """
+    max_k = max(RECALL_KS)
+    hits = {k: 0 for k in RECALL_KS}
+    latencies: List[float] = []
+
+    # Aufwärmen, damit Caches und Lazy-Imports nicht in die Messung eingehen
+    for query in queries[:5]:
+        search(query["query"], max_k)
+
+    for repeat in range(repeats):
+        for query, relevant_ids in zip(queries, relevant):
+            start = time.perf_counter()
+            ranked = search(query["query"], max_k)
+            latencies.append(time.perf_counter() - start)
+            if repeat == 0:
+                for k in RECALL_KS:
+                    if relevant_ids.intersection(ranked[:k]):
+                        hits[k] += 1
+
+    return {
+        "latency_ms": _latency_stats(latencies),
+        "recall": {f"@{k}": round(hits[k] / len(queries), 4) if queries else None for k in RECALL_KS}
+    }
+
+
+def bench_keyword(corpus_dir: str, queries: List[Dict[str, Any]], repeats: int) -> Dict[str, Any]:
+    """
+    Misst die Stichwortsuche von SimpleRAG auf einem Korpus.
+
+    Args:
+        corpus_dir: Verzeichnis mit den Markdown-Dateien
+        queries: Gelabelte Anfragen
+        repeats: Wiederholungen des Anfragesatzes für die Latenzmessung
+
+    Returns:
+        Kennzahlen zu Aufbau, Speicher, Latenz und Recall
+    """
+    # Aufbauzeit ohne tracemalloc messen, das würde die Zeit verfälschen
+    gc.collect()
+    start = time.perf_counter()
+    rag = SimpleRAG(knowledge_dir=corpus_dir)
+    build_seconds = time.perf_counter() - start
+
+    # Chunking separat messen
+    contents = []
+    for file_name in sorted(os.listdir(corpus_dir)):
+        if file_name.endswith(".md"):
+            with open(os.path.join(corpus_dir, file_name), 'r', encoding='utf-8') as file:
+                contents.append(file.read())
+    start = time.perf_counter()
+    for content in contents:
+        rag._split_into_sections(content)
+    split_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    type(rag.search_index)(rag.knowledge_base)
+    index_seconds = time.perf_counter() - start
+
+    # Speicher der Wissensbasis und des Index an einem frisch zerlegten Korpus messen;
+    # eine zweite SimpleRAG-Instanz würde den gemeinsamen Korpus nur wiederverwenden
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    corpus = load_corpus(corpus_dir, use_snapshot=False)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del corpus
+
+    index = rag.search_index
+    relevant = _relevant_ids(rag.knowledge_base, queries)
+    result = _evaluate(
+        lambda query, k: [doc["id"] for doc in rag._simple_search(query, k)],
+        queries, relevant, repeats
+    )
+
+    # Dieselben Anfragen mit Themen-Routing (Suche nur in den vorhergesagten Themen)
+    router = rag.theme_router
+    if router is not None:
+        result["routing"] = _evaluate(
+            lambda query, k: [doc["id"] for doc in rag._simple_search(query, k, router.route(query)["themes"])],
+            queries, relevant, repeats
+        )
+        routes = [router.route(query["query"]) for query in queries]
+        routed = [(query, route) for query, route in zip(queries, routes) if route["themes"] is not None]
+        correct = sum(1 for query, route in routed if theme_kind(query["file"]) in route["kinds"])
+        result["routing"].update({
+            "routed_share": round(len(routed) / len(queries), 4) if queries else None,
+            "accuracy": round(correct / len(routed), 4) if routed else None
+        })
+
+    result.update({
+        "documents": len(rag.knowledge_base),
+        "vocabulary": len(index.postings),
+        "postings": sum(len(postings) for postings in index.postings.values()),
+        "build_seconds": round(build_seconds, 4),
+        "split_seconds": round(split_seconds, 4),
+        "index_seconds": round(index_seconds, 4),
+        "memory_mb": {
+            "retained": round((retained - baseline) / (1024 * 1024), 2),
+            "peak": round((peak - baseline) / (1024 * 1024), 2)
+        }
+    })
+    return result
+
+
+def bench_cross_theme(knowledge_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Prüft das Themen-Routing mit Anfragen über mehrere Themen auf der echten Wissensbasis.
+
+    Args:
+        knowledge_dir: Optional, Verzeichnis der Markdown-Dateien (Standard: knowledge/)
+
+    Returns:
+        Anzahl der Anfragen, Anteil mit allen Themen bzw. mit erhaltenem besten Treffer
+        und die fehlgeschlagenen Anfragen samt Route
+    """
+    rag = SimpleRAG(knowledge_dir=knowledge_dir, structured_answers=False)
+    router = rag.theme_router
+    if router is None:
+        return {"error": "Themen-Router nicht verfügbar"}
+
+    kinds_kept = top_hit_kept = 0
+    failures = []
+    for case in CROSS_THEME_QUERIES:
+        route = router.route(case["query"])
+        themes = route["themes"]
+        top = rag._simple_search(case["query"], 1)
+        kinds_ok = themes is None or set(case["kinds"]) <= set(route["kinds"])
+        top_ok = themes is None or not top or top[0]["metadata"]["theme"] in themes
+        kinds_kept += kinds_ok
+        top_hit_kept += top_ok
+        if not (kinds_ok and top_ok):
+            failures.append({"query": case["query"], "expected": case["kinds"], "kinds": route["kinds"],
+                             "confidence": route["confidence"]})
+
+    return {
+        "queries": len(CROSS_THEME_QUERIES),
+        "kinds_kept": round(kinds_kept / len(CROSS_THEME_QUERIES), 4),
+        "top_hit_kept": round(top_hit_kept / len(CROSS_THEME_QUERIES), 4),
+        "failures": failures
+    }
+
+
+def bench_chroma(corpus_dir: str, queries: List[Dict[str, Any]], repeats: int) -> Dict[str, Any]:
+    """
+    Misst die Vektorsuche in einer temporären ChromaDB-Collection.
+
+    Args:
+        corpus_dir: Verzeichnis mit den Markdown-Dateien
+        queries: Gelabelte Anfragen
+        repeats: Wiederholungen des Anfragesatzes für die Latenzmessung
+
+    Returns:
+        Kennzahlen zu Aufbau, Speicher, Latenz und Recall oder ein Fehlerhinweis
+    """
+    from modules.chroma_manager import ChromaManager
+
+    documents = SimpleRAG(knowledge_dir=corpus_dir).knowledge_base
+    db_directory = tempfile.mkdtemp(prefix="saalbach_bench_chroma_")
+    try:
+        rss_before = _peak_rss_mb()
+        start = time.perf_counter()
+        # Ohne Cache der Anfrage-Embeddings, sonst messen die Wiederholungen nur Cache-Treffer
+        manager = ChromaManager(db_directory=db_directory, collection_name="retrieval_benchmark", query_cache_size=0)
+        if not manager.is_functional:
+            return {"error": "ChromaDB nicht verfügbar"}
+        for offset in range(0, len(documents), CHROMA_BATCH_SIZE):
+            batch = documents[offset:offset + CHROMA_BATCH_SIZE]
+            manager.add_documents_batch(
+                [doc["content"] for doc in batch],
+                [doc["metadata"] for doc in batch],
+                [doc["id"] for doc in batch]
+            )
+        build_seconds = time.perf_counter() - start
+        rss_after = _peak_rss_mb()
+
+        relevant = _relevant_ids(documents, queries)
+        result = _evaluate(
+            lambda query, k: (manager.search(query, n_results=k).get("ids") or [[]])[0],
+            queries, relevant, repeats
+        )
+
+        # Dieselben Anfragen als ein Batch (search_many: ein Embedding-Batch, eine Abfrage)
+        texts = [query["query"] for query in queries]
+        batch_latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            batch = manager.search_many(texts, n_results=max(RECALL_KS))
+            batch_latencies.append(time.perf_counter() - start)
+        hits = {k: 0 for k in RECALL_KS}
+        for response, relevant_ids in zip(batch, relevant):
+            ranked = (response.get("ids") or [[]])[0]
+            for k in RECALL_KS:
+                if relevant_ids.intersection(ranked[:k]):
+                    hits[k] += 1
+        result["batched"] = {
+            "total_ms": _latency_stats(batch_latencies),
+            "per_query_ms": round(min(batch_latencies) * 1000 / len(queries), 4) if queries else None,
+            "recall": {f"@{k}": round(hits[k] / len(queries), 4) if queries else None for k in RECALL_KS}
+        }
+
+        result.update({
+            "documents": manager.get_document_count(),
+            "build_seconds": round(build_seconds, 4),
+            "memory_mb": {
+                "peak_rss_increase": round(rss_after - rss_before, 1) if RESOURCE_AVAILABLE else None
+            }
+        })
+        return result
+    finally:
+        shutil.rmtree(db_directory, ignore_errors=True)
+
+
+def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Führt den Benchmark für alle Korpusgrößen aus.
+
+    Args:
+        args: Geparste Kommandozeilen-Argumente
+
+    Returns:
+        Bericht mit Umgebung, Konfiguration und Ergebnissen je Größe
+    """
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "config": {
+            "sizes": args.sizes,
+            "queries": args.queries,
+            "repeats": args.repeats,
+            "seed": args.seed,
+            "recall_ks": RECALL_KS
+        },
+        "results": []
+    }
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        report["cross_theme"] = bench_cross_theme(args.knowledge_dir)
+    print_cross_theme(report["cross_theme"])
+
+    for size in args.sizes:
+        corpus_dir = tempfile.mkdtemp(prefix=f"saalbach_bench_{size}_")
+        try:
+            start = time.perf_counter()
+            corpus = generate_corpus(corpus_dir, size, n_queries=args.queries, seed=args.seed)
+            generate_seconds = time.perf_counter() - start
+            print(f"\n{size} Abschnitte in {len(corpus['files'])} Dateien erzeugt ({generate_seconds:.1f}s).")
+
+            # Ausgaben von SimpleRAG und ChromaManager unterdrücken
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            entry = {"sections": size, "files": len(corpus["files"])}
+            with quiet:
+                entry["keyword"] = bench_keyword(corpus_dir, corpus["queries"], args.repeats)
+            print_result(size, "keyword", entry["keyword"])
+
+            if args.chroma:
+                if size > args.chroma_max_sections:
+                    entry["chroma"] = {"skipped": f"mehr als {args.chroma_max_sections} Abschnitte"}
+                else:
+                    with quiet:
+                        entry["chroma"] = bench_chroma(corpus_dir, corpus["queries"], args.repeats)
+                print_result(size, "chroma", entry["chroma"])
+
+            report["results"].append(entry)
+        finally:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    return report
+
+
+def print_cross_theme(result: Dict[str, Any]) -> None:
+    """Gibt das Ergebnis der Routing-Prüfung mit Anfragen über mehrere Themen aus."""
+    if "error" in result:
+        print(f"[routing, mehrere Themen] {result['error']}")
+        return
+    print(f"[routing, mehrere Themen] {result['queries']} Anfragen: alle Themen behalten {result['kinds_kept']}, "
+          f"bester Treffer behalten {result['top_hit_kept']}")
+    for failure in result["failures"]:
+        print(f"  FEHLER: '{failure['query']}' -> {failure['kinds']} (erwartet {failure['expected']}, "
+              f"Konfidenz {failure['confidence']})")
+
+
+def print_result(size: int, backend: str, result: Dict[str, Any]) -> None:
+    """Gibt die Kennzahlen eines Laufs lesbar aus."""
+    if "latency_ms" not in result:
+        print(f"  [{backend}] {result}")
+        return
+    latency = result["latency_ms"]
+    recall = ", ".join(f"{k} {v}" for k, v in result["recall"].items())
+    memory = ", ".join(f"{k} {v} MB" for k, v in result["memory_mb"].items())
+    print(f"  [{backend}] {result['documents']} Dokumente, Aufbau {result['build_seconds']}s, Speicher {memory}")
+    print(f"  [{backend}] Latenz (ms): mean {latency['mean']}, p50 {latency['p50']}, "
+          f"p95 {latency['p95']}, p99 {latency['p99']}; Recall {recall}")
+    batched = result.get("batched")
+    if batched:
+        recall = ", ".join(f"{k} {v}" for k, v in batched["recall"].items())
+        print(f"  [{backend}+batch] {batched['per_query_ms']} ms je Anfrage "
+              f"(Batch p50 {batched['total_ms']['p50']} ms); Recall {recall}")
+    routing = result.get("routing")
+    if routing:
+        latency = routing["latency_ms"]
+        recall = ", ".join(f"{k} {v}" for k, v in routing["recall"].items())
+        print(f"  [{backend}+routing] Latenz (ms): mean {latency['mean']}, p50 {latency['p50']}, "
+              f"p95 {latency['p95']}; Recall {recall}; geroutet {routing['routed_share']}, "
+              f"Trefferquote {routing['accuracy']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Retrieval-Mikrobenchmark mit synthetischem Korpus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Korpusgrößen (###-Abschnitte)")
+    parser.add_argument("--queries", type=int, default=200, help="Gelabelte Anfragen je Größe")
+    parser.add_argument("--repeats", type=int, default=3, help="Wiederholungen für die Latenzmessung")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--knowledge-dir", default=None,
+                        help="Wissensbasis für die Routing-Prüfung mit mehreren Themen (Standard: knowledge/)")
+    parser.add_argument("--chroma", action="store_true", help="Zusätzlich ChromaDB messen")
+    parser.add_argument("--chroma-max-sections", type=int, default=DEFAULT_CHROMA_MAX_SECTIONS,
+                        help="Größere Korpora werden für ChromaDB übersprungen")
+    parser.add_argument("--output", default=None, help="Optional, Pfad für den Bericht als JSON")
+    parser.add_argument("--verbose", action="store_true", help="Ausgaben von SimpleRAG/ChromaManager anzeigen")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\nBericht gespeichert: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
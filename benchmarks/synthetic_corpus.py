@@ -0,0 +1,186 @@
+"""
+Generator für synthetische Wissensdateien im Format des knowledge/-Verzeichnisses.
+Erzeugt Markdown mit #/##/### Überschriften und Aufzählungs-Attributen
+(- **Schlüssel:** Wert) in beliebiger Größe sowie einen Satz gelabelter
+Anfragen, deren relevante Einträge bekannt sind.
+
+Beispiel:
+    python -m benchmarks.synthetic_corpus --sections 10000 --output /tmp/saalbach_10k
+"""
+
+import os
+import json
+import random
+import argparse
+from typing import List, Dict, Any
+
+# Silben für eindeutige Eigennamen; keine endet auf eine Endung, die der
+# BM25-Tokenizer abschneidet, damit Namen auch nach dem Stemming eindeutig bleiben
+SYLLABLES = [
+    "brand", "kogl", "wald", "hoch", "lind", "berg", "tal", "reit", "bach", "ried",
+    "stock", "eck", "grub", "hof", "feld", "kar", "rast", "zell", "gut", "biel",
+    "platt", "spitz", "kopf", "joch", "sattl", "hut", "schart", "mitt", "kling", "gmoa",
+    "au", "bichl", "lehr", "rad", "stadl", "zwick", "fall", "grab", "wink", "furt",
+    "holz", "mark", "sonk", "tauf", "roth", "lack", "wall", "ham"
+]
+
+REGIONS = ["Saalbach", "Hinterglemm", "Leogang", "Fieberbrunn", "Viehhofen", "Maishofen", "Zell am See", "Kaprun"]
+
+# Thema (Dateipräfix) -> (Titel, Kategorien, Bezeichnungen der Einträge)
+THEMES = {
+    "restaurants": ("Restaurants", ["Almhütten & Hüttenrestaurants", "Après-Ski-Bars", "Gourmetrestaurants", "Cafés & Konditoreien"],
+                    ["Alm", "Hütte", "Stub'n", "Wirt"]),
+    "unterkuenfte": ("Unterkünfte", ["Hotels", "Pensionen", "Chalets", "Ferienwohnungen"],
+                     ["Hotel", "Pension", "Chalet", "Gasthof"]),
+    "wandern": ("Wanderungen", ["Familienwanderungen", "Gipfeltouren", "Höhenwege", "Themenwege"],
+                ["Rundweg", "Steig", "Höhenweg", "Runde"]),
+}
+
+FEATURES = [
+    "große Sonnenterrasse", "Gipfelblick", "regionale Küche", "Wellnessbereich", "Kinderspielplatz",
+    "urige Atmosphäre", "Live-Musik", "hausgemachte Kuchen", "Hundefreundlich", "Sauna",
+    "Panoramablick", "Skiverleih", "E-Bike-Ladestation", "Streichelzoo", "Bergsee"
+]
+SUITABILITY = ["Familien", "Gruppen", "Paare", "Romantisch", "Sportler", "Senioren", "Genießer"]
+PRICES = ["Günstig", "Mittel", "Gehoben", "Günstig bis Mittel"]
+DETAILS = [
+    "Rustikale Atmosphäre und freundliche Gastgeber, die Preise sind fair",
+    "Von der Bergstation ist man in wenigen Minuten zu Fuß dort",
+    "Im Winter liegt es direkt an der Piste, im Sommer ist es ein Ausgangspunkt für Wanderungen",
+    "Eine Reservierung am Wochenende wird empfohlen, da es oft voll ist",
+    "Bekannt für Kaiserschmarrn und Kasnocken, wie sie die Oma gemacht hat",
+    "Mit der Gondel bequem erreichbar und auch bei Regen einen Besuch wert"
+]
+OPENING_HOURS = ["täglich von 9 bis 17 Uhr", "von 10 bis 22 Uhr, Montag Ruhetag", "nur in der Saison von Dezember bis April",
+                 "ganzjährig geöffnet", "von Juni bis Oktober"]
+
+QUERY_TEMPLATES = [
+    "Was kannst du mir über {name} erzählen?",
+    "Ist {name} in {region} für Familien geeignet?",
+    "Wie sind Preise und Öffnungszeiten von {name}?",
+    "Gibt es bei {name} eine Terrasse mit Aussicht?",
+    "Lohnt sich ein Besuch bei {name} im Winter?"
+]
+
+
+def entry_name(index: int, label: str) -> str:
+    """
+    Erzeugt einen eindeutigen Eigennamen für einen Eintrag.
+
+    Args:
+        index: Laufende Nummer des Eintrags
+        label: Bezeichnung, z.B. "Alm" oder "Hotel"
+
+    Returns:
+        Der Name, z.B. "Koglwaldhoch-Alm"
+    """
+    digits = []
+    value = index
+    while value or len(digits) < 3:
+        value, digit = divmod(value, len(SYLLABLES))
+        digits.append(SYLLABLES[digit])
+    return f"{''.join(digits).capitalize()}-{label}"
+
+
+def generate_corpus(output_dir: str,
+                    n_sections: int,
+                    entries_per_category: int = 5,
+                    entries_per_file: int = 500,
+                    n_queries: int = 200,
+                    seed: int = 42) -> Dict[str, Any]:
+    """
+    Schreibt einen synthetischen Korpus als Markdown-Dateien.
+
+    Ein Abschnitt entspricht einem ###-Eintrag mit Attributliste. Einträge werden
+    reihum auf die Themen verteilt, je Datei in Regionen (#) und Kategorien (##) gegliedert.
+
+    Args:
+        output_dir: Zielverzeichnis (wird angelegt)
+        n_sections: Anzahl der ###-Einträge insgesamt
+        entries_per_category: Einträge je ##-Kategorie
+        entries_per_file: Maximale Einträge je Datei
+        n_queries: Anzahl der gelabelten Anfragen
+        seed: Startwert für reproduzierbare Korpora
+
+    Returns:
+        Dictionary mit Dateien, Anzahl der Einträge und gelabelten Anfragen
+        (Anfrage, Name des relevanten Eintrags, Datei)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    theme_names = list(THEMES)
+    entries: List[Dict[str, str]] = []
+    files: List[str] = []
+
+    # Einträge je Thema sammeln, dann dateiweise schreiben
+    per_theme: Dict[str, List[int]] = {theme: [] for theme in theme_names}
+    for index in range(n_sections):
+        per_theme[theme_names[index % len(theme_names)]].append(index)
+
+    for theme, indices in per_theme.items():
+        title, categories, labels = THEMES[theme]
+        for file_number, start in enumerate(range(0, len(indices), entries_per_file)):
+            file_name = f"{theme}_{file_number:04d}.md"
+            lines = [f"# {title} – Teil {file_number + 1}", "",
+                     f"Synthetische Sammlung von {title} für Lasttests der Suche.", "", "---", ""]
+            current_region = None
+            chunk = indices[start:start + entries_per_file]
+
+            for position, index in enumerate(chunk):
+                region = REGIONS[(index // (entries_per_category * len(categories))) % len(REGIONS)]
+                if region != current_region:
+                    lines += [f"# {region}", ""]
+                    current_region = region
+                if position % entries_per_category == 0:
+                    category = categories[(position // entries_per_category) % len(categories)]
+                    lines += [f"## {category} in {region}", ""]
+
+                name = entry_name(index, labels[index % len(labels)])
+                features = rng.sample(FEATURES, 3)
+                lines += [
+                    f"### {name}",
+                    f"- **Bewertung:** {rng.uniform(3.5, 5.0):.1f} ({rng.randint(10, 900)} Bewertungen)".replace(".", ",", 1),
+                    f"- **Ort:** {region}",
+                    f"- **Besonderheiten:** {', '.join(features)}",
+                    f"- **Eignung:** {', '.join(rng.sample(SUITABILITY, 2))}",
+                    f"- **Preiskategorie:** {rng.choice(PRICES)}",
+                    f"- **Öffnungszeiten:** {rng.choice(OPENING_HOURS)}",
+                    f"- **Details:** {rng.choice(DETAILS)}",
+                    "",
+                    "---",
+                    ""
+                ]
+                entries.append({"name": name, "region": region, "file": file_name})
+
+            with open(os.path.join(output_dir, file_name), 'w', encoding='utf-8') as file:
+                file.write("\n".join(lines))
+            files.append(file_name)
+
+    queries = []
+    for entry in rng.sample(entries, min(n_queries, len(entries))):
+        template = rng.choice(QUERY_TEMPLATES)
+        queries.append({
+            "query": template.format(name=entry["name"], region=entry["region"]),
+            "relevant_name": entry["name"],
+            "file": entry["file"]
+        })
+
+    return {"files": sorted(files), "sections": len(entries), "queries": queries}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Synthetischen Saalbach-Korpus erzeugen")
+    parser.add_argument("--sections", type=int, default=1000, help="Anzahl der ###-Einträge")
+    parser.add_argument("--output", required=True, help="Zielverzeichnis")
+    parser.add_argument("--queries", type=int, default=200, help="Anzahl der gelabelten Anfragen")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.output, args.sections, n_queries=args.queries, seed=args.seed)
+    with open(os.path.join(args.output, "queries.json"), 'w', encoding='utf-8') as file:
+        json.dump(corpus["queries"], file, ensure_ascii=False, indent=2)
+    print(f"{corpus['sections']} Einträge in {len(corpus['files'])} Dateien nach {args.output} geschrieben.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Antwort-Cache für den Saalbach Tourismus Chatbot.
+Speichert LLM-Antworten mit LRU- und TTL-Verdrängung im Speicher und optional
+persistent in einer SQLite-Datenbank, damit häufige Fragen keinen erneuten
+LLM-Aufruf kosten.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+from modules.corpus import user_cache_directory, is_private_path
+
+# Standardpfad für den persistenten Cache, in einem privaten Verzeichnis des Benutzers,
+# damit andere Benutzer keine Antworten einschleusen oder mitlesen können
+DEFAULT_CACHE_PATH = os.path.join(user_cache_directory("saalbach_answer_cache"), "answers.sqlite")
+
+# Wird erhöht, wenn sich Prompt-Aufbau oder Schlüsselformat ändern
+CACHE_FORMAT_VERSION = 1
+
+_shared_caches: Dict[Tuple, "AnswerCache"] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalisiert eine Anfrage für den Cache-Schlüssel
+    (Unicode-Normalform, Kleinschreibung, ohne Satzzeichen und doppelte Leerzeichen).
+
+    Args:
+        query: Die Benutzeranfrage
+
+    Returns:
+        Die normalisierte Anfrage
+    """
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r'[^\w\s]', ' ', query)
+    return " ".join(query.split())
+
+
+def make_cache_key(query: str,
+                   model: str,
+                   section_ids: List[str],
+                   file_versions: Dict[str, str],
+                   extra: str = "") -> str:
+    """
+    Erstellt den Cache-Schlüssel aus Anfrage, Modell und abgerufenem Kontext.
+
+    Args:
+        query: Die Benutzeranfrage (wird normalisiert)
+        model: Das verwendete LLM-Modell
+        section_ids: IDs (Inhalts-Hashes) der abgerufenen Abschnitte in Rangfolge
+        file_versions: Versionen der Quelldateien, aus denen die Abschnitte stammen
+        extra: Optional, weitere Bestandteile wie ein Digest des Chat-Verlaufs
+
+    Returns:
+        Der Cache-Schlüssel als Hex-String
+    """
+    payload = json.dumps([
+        CACHE_FORMAT_VERSION,
+        normalize_query(query),
+        model,
+        list(section_ids),
+        sorted(file_versions.items()),
+        extra
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Thread-sicherer Antwort-Cache mit LRU+TTL im Speicher und optionalem SQLite-Backend.
+    Jeder Eintrag merkt sich seine Quelldateien, damit Änderungen an einer
+    Wissensdatei gezielt nur die betroffenen Einträge entfernen.
+    """
+
+    def __init__(self, max_entries: int = 500, ttl_seconds: float = 24 * 3600, db_path: Optional[str] = None):
+        """
+        Initialisiert den Cache.
+
+        Args:
+            max_entries: Maximale Anzahl an Einträgen (Speicher und Datenbank)
+            ttl_seconds: Lebensdauer eines Eintrags in Sekunden
+            db_path: Optional, Pfad zur SQLite-Datei für die Persistenz. Verzeichnis und
+                Datei müssen dem eigenen Benutzer gehören und für andere nicht beschreibbar
+                sein, sonst wird nur im Speicher gecacht.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+
+        # Schlüssel -> (Antwort, Erstellungszeit, Quelldateien)
+        self._entries: "OrderedDict[str, Tuple[str, float, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if db_path:
+            try:
+                db_directory = os.path.dirname(os.path.abspath(db_path))
+                os.makedirs(db_directory, mode=0o700, exist_ok=True)
+                if not is_private_path(db_directory) or (os.path.lexists(db_path) and not is_private_path(db_path)):
+                    raise PermissionError(f"{db_path} ist nicht privat (Eigentümer oder Schreibrechte prüfen)")
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS answers ("
+                    "key TEXT PRIMARY KEY, answer TEXT NOT NULL, source_files TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)")
+                self._db.commit()
+            except Exception as e:
+                print(f"Persistenter Antwort-Cache nicht verfügbar, nutze nur Speicher: {str(e)}")
+                self._db = None
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Sucht eine Antwort im Cache.
+
+        Args:
+            key: Der Cache-Schlüssel
+
+        Returns:
+            Die gespeicherte Antwort oder None
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                answer, created_at, _ = entry
+                if self._is_expired(created_at, now):
+                    self._remove(key)
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return answer
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT answer, source_files, created_at FROM answers WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        answer, source_files, created_at = row
+                        if self._is_expired(created_at, now):
+                            self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                            self._db.commit()
+                            self.expirations += 1
+                        else:
+                            self._db.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+                            self._db.commit()
+                            self._store_in_memory(key, answer, created_at, json.loads(source_files))
+                            self.hits += 1
+                            return answer
+                except Exception as e:
+                    print(f"Fehler beim Lesen aus dem Antwort-Cache: {str(e)}")
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, answer: str, source_files: List[str] = None) -> None:
+        """
+        Speichert eine Antwort im Cache.
+
+        Args:
+            key: Der Cache-Schlüssel
+            answer: Die zu speichernde Antwort
+            source_files: Quelldateien der Abschnitte, auf denen die Antwort basiert
+        """
+        now = time.time()
+        source_files = sorted(set(source_files or []))
+
+        with self._lock:
+            self._store_in_memory(key, answer, now, source_files)
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO answers (key, answer, source_files, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, answer, json.dumps(source_files), now, now)
+                    )
+                    # Am längsten nicht genutzte Einträge über dem Limit entfernen
+                    self._db.execute(
+                        "DELETE FROM answers WHERE key NOT IN "
+                        "(SELECT key FROM answers ORDER BY last_access DESC LIMIT ?)",
+                        (self.max_entries,)
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Fehler beim Schreiben in den Antwort-Cache: {str(e)}")
+
+    def _store_in_memory(self, key: str, answer: str, created_at: float, source_files: List[str]) -> None:
+        """Legt einen Eintrag im Speicher ab und verdrängt bei Bedarf den ältesten (Lock muss gehalten werden)."""
+        self._entries[key] = (answer, created_at, source_files)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        """Entfernt einen Eintrag aus Speicher und Datenbank (Lock muss gehalten werden)."""
+        self._entries.pop(key, None)
+        if self._db is not None:
+            try:
+                self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._db.commit()
+            except Exception as e:
+                print(f"Fehler beim Löschen aus dem Antwort-Cache: {str(e)}")
+
+    def invalidate_files(self, file_names: List[str]) -> int:
+        """
+        Entfernt alle Einträge, die auf einer der angegebenen Quelldateien basieren.
+
+        Args:
+            file_names: Dateinamen der geänderten Wissensdateien
+
+        Returns:
+            Anzahl der entfernten Einträge
+        """
+        changed = set(file_names)
+        removed = 0
+
+        with self._lock:
+            for key in [k for k, (_, _, files) in self._entries.items() if changed.intersection(files)]:
+                del self._entries[key]
+                removed += 1
+
+            if self._db is not None:
+                try:
+                    rows = self._db.execute("SELECT key, source_files FROM answers").fetchall()
+                    stale = [(key,) for key, files in rows if changed.intersection(json.loads(files))]
+                    self._db.executemany("DELETE FROM answers WHERE key = ?", stale)
+                    self._db.commit()
+                    removed = max(removed, len(stale))
+                except Exception as e:
+                    print(f"Fehler beim Invalidieren des Antwort-Caches: {str(e)}")
+
+        if removed:
+            print(f"{removed} Cache-Einträge für {', '.join(sorted(changed))} entfernt.")
+        return removed
+
+    def clear(self) -> None:
+        """Leert den Cache vollständig."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM answers")
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Fehler beim Leeren des Antwort-Caches: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Gibt die Trefferstatistik des Caches zurück.
+
+        Returns:
+            Dictionary mit Treffern, Fehlversuchen, Trefferquote und Größe
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None
+            }
+            if self._db is not None:
+                try:
+                    stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+                except Exception:
+                    stats["disk_entries"] = 0
+            return stats
+
+
+def get_shared_answer_cache(max_entries: int = 500,
+                            ttl_seconds: float = 24 * 3600,
+                            db_path: Optional[str] = None) -> AnswerCache:
+    """
+    Gibt den prozessweit gemeinsamen Antwort-Cache für die angegebene Konfiguration zurück.
+
+    Args:
+        max_entries: Maximale Anzahl an Einträgen
+        ttl_seconds: Lebensdauer eines Eintrags in Sekunden
+        db_path: Optional, Pfad zur SQLite-Datei
+
+    Returns:
+        Der gemeinsam genutzte Cache
+    """
+    key = (max_entries, ttl_seconds, db_path)
+    with _shared_caches_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = AnswerCache(max_entries=max_entries, ttl_seconds=ttl_seconds, db_path=db_path)
+            _shared_caches[key] = cache
+        return cache
@@ -2,41 +2,78 @@
 ChromaDB Manager für den Saalbach Tourismus Chatbot.
 Verwaltet die Vektordatenbank für das RAG-System.
 Mit verbesserter Fehlerbehandlung und Fallback-Mechanismen.
+Client, Collection und Embedding-Modell werden über get_shared_chroma_manager
+einmal pro Prozess erstellt und von allen Sessions gemeinsam genutzt.
 """
 
 import os
 import sys
+import json
 import tempfile
 import uuid
+import threading
 import traceback
 from typing import List, Dict, Any, Optional, Union
 
-# Globale Variable für Fehler-Fallback
+from modules.telemetry import span
+from modules.resources import shared_resources
+from modules.embeddings import (
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_EMBEDDING_BACKEND,
+    DEFAULT_QUERY_CACHE_SIZE,
+    EmbeddingBackend,
+    QueryEmbeddingCache,
+    get_shared_embedding_model,
+    get_shared_embedding_backend,
+    get_shared_query_embedding_cache,
+    collection_name_for
+)
+
+# ChromaDB wird erst beim ersten ChromaManager importiert (der Import dauert mehrere
+# Sekunden und soll den Start der App nicht blockieren), siehe _import_chromadb
+chromadb = None
 CHROMA_INITIALIZED = False
 ERROR_MESSAGE = ""
+_chromadb_import_lock = threading.Lock()
+_chromadb_import_attempted = False
+
 
-try:
-    print("Versuche ChromaDB zu importieren...")
-    import chromadb
-    print("ChromaDB erfolgreich importiert!")
+def _import_chromadb() -> bool:
+    """
+    Importiert ChromaDB beim ersten Aufruf (thread-sicher, nur einmal pro Prozess).
+    
+    Returns:
+        True, wenn ChromaDB verfügbar ist
+    """
+    global chromadb, CHROMA_INITIALIZED, ERROR_MESSAGE, _chromadb_import_attempted
     
-    try:
-        from chromadb.utils import embedding_functions
-        print("Embedding-Funktionen erfolgreich importiert!")
-        CHROMA_INITIALIZED = True
-    except Exception as e:
-        ERROR_MESSAGE = f"Fehler beim Import der Embedding-Funktionen: {str(e)}"
-        print(ERROR_MESSAGE)
-        print(traceback.format_exc())
-except Exception as e:
-    ERROR_MESSAGE = f"Fehler beim Import von ChromaDB: {str(e)}"
-    print(ERROR_MESSAGE)
-    print(traceback.format_exc())
+    with _chromadb_import_lock:
+        if _chromadb_import_attempted:
+            return CHROMA_INITIALIZED
+        _chromadb_import_attempted = True
+        
+        try:
+            print("Versuche ChromaDB zu importieren...")
+            import chromadb as chromadb_module
+            chromadb = chromadb_module
+            CHROMA_INITIALIZED = True
+            print("ChromaDB erfolgreich importiert!")
+        except Exception as e:
+            ERROR_MESSAGE = f"Fehler beim Import von ChromaDB: {str(e)}"
+            print(ERROR_MESSAGE)
+            print(traceback.format_exc())
+        return CHROMA_INITIALIZED
 
 # Konstanten für die ChromaDB-Konfiguration
 DB_DIRECTORY = os.path.join(tempfile.gettempdir(), "saalbach_db")
 COLLECTION_NAME = "saalbach_knowledge"
 
+# Wartezeit in Sekunden, bevor ein nicht funktionsfähiger gemeinsamer Manager erneut erstellt wird
+FAILED_MANAGER_RETRY_SECONDS = 60.0
+
+# Felder eines Suchergebnisses, die search_many je Anfrage aufteilt
+QUERY_RESULT_FIELDS = ("ids", "documents", "metadatas", "distances", "embeddings")
+
 class DummyResponse:
     """Fallback-Klasse, wenn ChromaDB nicht verfügbar ist."""
     def __init__(self):
@@ -45,36 +82,62 @@ class DummyResponse:
         self.distances = [[]]
         self.ids = [[]]
 
+def _empty_search_result() -> Dict[str, Any]:
+    """Leeres Suchergebnis im Format von ChromaManager.search."""
+    dummy = DummyResponse()
+    return {
+        "documents": dummy.documents,
+        "metadatas": dummy.metadatas,
+        "distances": dummy.distances,
+        "ids": dummy.ids
+    }
+
 class ChromaManager:
     """Verwaltet die ChromaDB für das RAG-System des Saalbach-Chatbots."""
     
-    def __init__(self, embedding_model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self,
+                 embedding_model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 db_directory: Optional[str] = None,
+                 collection_name: str = COLLECTION_NAME,
+                 embedding_backend: str = DEFAULT_EMBEDDING_BACKEND,
+                 backend_options: Optional[Dict[str, Any]] = None,
+                 query_cache_size: int = DEFAULT_QUERY_CACHE_SIZE):
         """
         Initialisiert den ChromaDB Manager.
         
         Args:
             embedding_model_name: Name des zu verwendenden Embedding-Modells
+            db_directory: Optional, Verzeichnis der Datenbank (Standard: DB_DIRECTORY)
+            collection_name: Name der Collection (andere Backends als das Standard-Backend
+                verwenden eine eigene Collection mit Anhang, z.B. "saalbach_knowledge_int8")
+            embedding_backend: Name des Embedding-Backends (siehe modules.embeddings)
+            backend_options: Optional, weitere Einstellungen des Backends
+            query_cache_size: Anfrage-Embeddings im gemeinsamen LRU-Cache des Backends (0 = kein Cache)
         """
         self.client = None
         self.collection = None
-        self.embedding_function = None
+        self.embedding_function: Optional[EmbeddingBackend] = None
+        self.query_cache: Optional[QueryEmbeddingCache] = None
         self.is_functional = False
+        self.db_directory = db_directory or DB_DIRECTORY
+        self.collection_name = collection_name
+        self.embedding_backend = embedding_backend
         
         # Falls ChromaDB nicht importiert werden konnte, gebe Warnung aus
-        if not CHROMA_INITIALIZED:
+        if not _import_chromadb():
             print(f"WARNUNG: ChromaDB konnte nicht initialisiert werden: {ERROR_MESSAGE}")
             print("RAG-Funktionalität ist eingeschränkt.")
             return
         
         try:
             # Sicherstellen, dass das DB-Verzeichnis existiert
-            os.makedirs(DB_DIRECTORY, exist_ok=True)
+            os.makedirs(self.db_directory, exist_ok=True)
             
-            print(f"ChromaDB-Verzeichnis: {DB_DIRECTORY}")
+            print(f"ChromaDB-Verzeichnis: {self.db_directory}")
             print(f"Prüfe, ob das Verzeichnis existiert und Schreibrechte vorhanden sind...")
             
             # Teste Schreibrechte im Verzeichnis
-            test_file = os.path.join(DB_DIRECTORY, "test_write.txt")
+            test_file = os.path.join(self.db_directory, "test_write.txt")
             try:
                 with open(test_file, 'w') as f:
                     f.write("Test")
@@ -83,47 +146,47 @@ class ChromaManager:
             except Exception as e:
                 print(f"Schreibtest fehlgeschlagen: {str(e)}")
                 # Versuche, ein anderes Verzeichnis zu verwenden
-                DB_DIRECTORY = tempfile.mkdtemp(prefix="saalbach_")
-                print(f"Verwende alternatives Verzeichnis: {DB_DIRECTORY}")
+                self.db_directory = tempfile.mkdtemp(prefix="saalbach_")
+                print(f"Verwende alternatives Verzeichnis: {self.db_directory}")
             
             # ChromaDB Client initialisieren
             print("Initialisiere ChromaDB Client...")
-            self.client = chromadb.PersistentClient(path=DB_DIRECTORY)
+            self.client = chromadb.PersistentClient(path=self.db_directory)
             print("ChromaDB Client erfolgreich initialisiert!")
             
-            # Embedding-Funktion definieren
-            print(f"Initialisiere Embedding-Funktion mit Modell: {embedding_model_name}")
+            # Embedding-Funktion definieren. Ohne das gewählte Backend bleibt der Manager nicht
+            # funktionsbereit: ein stiller Wechsel auf ChromaDBs eigenes Modell würde Anfragen mit
+            # anderen Vektoren als die gespeicherten Dokumente vergleichen
+            print(f"Initialisiere Embedding-Backend '{embedding_backend}' mit Modell: {embedding_model_name}")
             try:
-                self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-                    model_name=embedding_model_name
+                self.embedding_function = get_shared_embedding_backend(
+                    embedding_backend, embedding_model_name, backend_options
                 )
-                print("Embedding-Funktion erfolgreich initialisiert!")
+                self.collection_name = collection_name_for(collection_name, self.embedding_function)
+                if query_cache_size > 0:
+                    self.query_cache = get_shared_query_embedding_cache(self.embedding_function, query_cache_size)
+                print(f"Embedding-Backend erfolgreich initialisiert: {self.embedding_function.describe()}")
             except Exception as e:
-                print(f"Fehler bei der Initialisierung der Embedding-Funktion: {str(e)}")
-                print("Versuche Default-Embedding-Funktion...")
-                # Fallback auf einfachere Embedding-Funktion
-                try:
-                    self.embedding_function = None  # ChromaDB verwendet intern ein einfaches Modell
-                except Exception as e2:
-                    print(f"Auch Default-Embedding-Funktion fehlgeschlagen: {str(e2)}")
-                    return
+                print(f"Fehler bei der Initialisierung des Embedding-Backends '{embedding_backend}': {str(e)}")
+                print("Vektorsuche ist deaktiviert, die Stichwortsuche bleibt verfügbar.")
+                return
             
             # Collection erstellen oder laden
             try:
-                print(f"Versuche, Collection '{COLLECTION_NAME}' zu laden...")
+                print(f"Versuche, Collection '{self.collection_name}' zu laden...")
                 self.collection = self.client.get_collection(
-                    name=COLLECTION_NAME,
+                    name=self.collection_name,
                     embedding_function=self.embedding_function
                 )
-                print(f"Collection '{COLLECTION_NAME}' erfolgreich geladen.")
+                print(f"Collection '{self.collection_name}' erfolgreich geladen.")
             except Exception as e:
                 print(f"Collection nicht gefunden, erstelle neue: {str(e)}")
                 try:
                     self.collection = self.client.create_collection(
-                        name=COLLECTION_NAME,
+                        name=self.collection_name,
                         embedding_function=self.embedding_function
                     )
-                    print(f"Collection '{COLLECTION_NAME}' neu erstellt.")
+                    print(f"Collection '{self.collection_name}' neu erstellt.")
                 except Exception as e2:
                     print(f"Konnte Collection nicht erstellen: {str(e2)}")
                     return
@@ -230,11 +293,20 @@ class ChromaManager:
             }
             
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                where=filter_criteria
-            )
+            with span("chroma_search", n_results=n_results):
+                query_embeddings = self._cached_query_embeddings([query])
+                if query_embeddings is not None:
+                    results = self.collection.query(
+                        query_embeddings=query_embeddings,
+                        n_results=n_results,
+                        where=filter_criteria
+                    )
+                else:
+                    results = self.collection.query(
+                        query_texts=[query],
+                        n_results=n_results,
+                        where=filter_criteria
+                    )
             return results
         except Exception as e:
             print(f"Fehler bei der Suche: {str(e)}")
@@ -246,6 +318,90 @@ class ChromaManager:
                 "ids": dummy.ids
             }
     
+    def search_many(self,
+                    queries: List[str],
+                    n_results: Union[int, List[int]] = 3,
+                    filter_criteria: Union[None, Dict[str, Any], List[Optional[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """
+        Durchsucht die Vektordatenbank für mehrere Anfragen auf einmal.
+        Alle Anfragen werden in einem Batch eingebettet (bekannte aus dem Cache) und
+        je Filter mit einer einzigen Collection-Abfrage gesucht; ohne unterschiedliche
+        Filter ist das genau eine Abfrage für alle Anfragen.
+        
+        Args:
+            queries: Die Suchanfragen
+            n_results: Anzahl der Ergebnisse für alle Anfragen oder je Anfrage
+            filter_criteria: Optional, Filter für alle Anfragen oder je Anfrage (None = ohne Filter)
+            
+        Returns:
+            Ein Ergebnis je Anfrage in derselben Reihenfolge und im Format von search
+            
+        Raises:
+            ValueError: Wenn n_results oder filter_criteria als Liste nicht zur Anzahl der Anfragen passt
+        """
+        count = len(queries)
+        limits = list(n_results) if isinstance(n_results, (list, tuple)) else [n_results] * count
+        filters = list(filter_criteria) if isinstance(filter_criteria, (list, tuple)) else [filter_criteria] * count
+        if len(limits) != count or len(filters) != count:
+            raise ValueError("n_results und filter_criteria müssen je Anfrage einen Wert enthalten")
+        
+        if not count:
+            return []
+        if not self.is_functional:
+            print("ChromaManager ist nicht funktionsbereit. Leere Antworten werden zurückgegeben.")
+            return [_empty_search_result() for _ in queries]
+        
+        try:
+            with span("chroma_search_many", queries=count) as search_span:
+                query_embeddings = self._cached_query_embeddings(queries)
+                
+                # Anfragen mit gleichem Filter teilen sich eine Abfrage (Chroma kennt nur ein where je Abfrage)
+                groups: Dict[str, List[int]] = {}
+                for position, criteria in enumerate(filters):
+                    groups.setdefault(json.dumps(criteria, sort_keys=True), []).append(position)
+                search_span.set(collection_queries=len(groups))
+                
+                results: List[Optional[Dict[str, Any]]] = [None] * count
+                for positions in groups.values():
+                    if query_embeddings is not None:
+                        query_input = {"query_embeddings": [query_embeddings[position] for position in positions]}
+                    else:
+                        query_input = {"query_texts": [queries[position] for position in positions]}
+                    response = self.collection.query(
+                        n_results=max(limits[position] for position in positions),
+                        where=filters[positions[0]],
+                        **query_input
+                    )
+                    
+                    # Je Anfrage eine Zeile, gekürzt auf ihr eigenes n_results
+                    for row, position in enumerate(positions):
+                        results[position] = {
+                            field: [response[field][row][:limits[position]]] if response.get(field) is not None else None
+                            for field in QUERY_RESULT_FIELDS
+                        }
+            return results
+        except Exception as e:
+            print(f"Fehler bei der Suche mit mehreren Anfragen: {str(e)}")
+            return [_empty_search_result() for _ in queries]
+    
+    def _cached_query_embeddings(self, queries: List[str]) -> Optional[List[List[float]]]:
+        """
+        Liefert die Embeddings der Anfragen über den gemeinsamen LRU-Cache (Fehlversuche in einem Batch).
+        
+        Args:
+            queries: Die Suchanfragen
+            
+        Returns:
+            Die Embeddings oder None, wenn ChromaDB selbst einbetten soll (kein Cache, Fehler)
+        """
+        if self.query_cache is None:
+            return None
+        try:
+            return self.query_cache.embed_queries(queries).tolist()
+        except Exception as e:
+            print(f"Fehler beim Berechnen der Query-Embeddings: {str(e)}")
+            return None
+    
     def update_document(self, doc_id: str, text: str, metadata: Dict[str, Any]) -> None:
         """
         Aktualisiert ein vorhandenes Dokument.
@@ -284,6 +440,100 @@ class ChromaManager:
         except Exception as e:
             print(f"Fehler beim Löschen des Dokuments: {str(e)}")
     
+    def embed_texts(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """
+        Berechnet die Embeddings mehrerer Texte mit der Embedding-Funktion der Collection.
+        
+        Args:
+            texts: Liste der Texte
+            
+        Returns:
+            Liste der Embeddings oder None, wenn ChromaDB selbst einbetten soll
+        """
+        if not self.is_functional or self.embedding_function is None or not texts:
+            return None
+        
+        try:
+            return self.embedding_function.embed(list(texts)).tolist()
+        except Exception as e:
+            print(f"Fehler beim Berechnen der Embeddings: {str(e)}")
+            return None
+    
+    def upsert_documents_batch(self,
+                               texts: List[str],
+                               metadatas: List[Dict[str, Any]],
+                               ids: List[str],
+                               embeddings: Optional[List[List[float]]] = None) -> List[str]:
+        """
+        Fügt mehrere Dokumente hinzu oder überschreibt vorhandene mit derselben ID.
+        Wiederholte Importe erzeugen dadurch keine Duplikate.
+        
+        Args:
+            texts: Liste der Dokumententexte
+            metadatas: Liste der Metadaten für die Dokumente
+            ids: Liste der Dokument-IDs
+            embeddings: Optional, bereits berechnete Embeddings (sonst bettet ChromaDB ein)
+            
+        Returns:
+            Liste der IDs der geschriebenen Dokumente
+        """
+        if not self.is_functional:
+            print("ChromaManager ist nicht funktionsbereit. Dokumente werden nicht geschrieben.")
+            return ids
+        
+        try:
+            if embeddings is not None:
+                self.collection.upsert(
+                    documents=texts,
+                    metadatas=metadatas,
+                    ids=ids,
+                    embeddings=embeddings
+                )
+            else:
+                self.collection.upsert(
+                    documents=texts,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+            return ids
+        except Exception as e:
+            print(f"Fehler beim Upsert von Dokumenten: {str(e)}")
+            return []
+    
+    def delete_documents(self, doc_ids: List[str]) -> None:
+        """
+        Löscht mehrere Dokumente aus der Datenbank.
+        
+        Args:
+            doc_ids: Die IDs der zu löschenden Dokumente
+        """
+        if not self.is_functional or not doc_ids:
+            return
+        
+        try:
+            self.collection.delete(ids=list(doc_ids))
+        except Exception as e:
+            print(f"Fehler beim Löschen von Dokumenten: {str(e)}")
+    
+    def get_document_ids(self, filter_criteria: Optional[Dict[str, Any]] = None) -> List[str]:
+        """
+        Gibt die IDs aller Dokumente zurück, optional gefiltert nach Metadaten.
+        
+        Args:
+            filter_criteria: Optional, Filterkriterien (z.B. {"source_file": "wandern_saalbach.md"})
+            
+        Returns:
+            Liste der Dokument-IDs
+        """
+        if not self.is_functional:
+            return []
+        
+        try:
+            return self.collection.get(where=filter_criteria, include=[])["ids"]
+        except Exception as e:
+            print(f"Fehler beim Abrufen der Dokument-IDs: {str(e)}")
+            return []
+    
     def get_document_count(self) -> int:
         """
         Gibt die Anzahl der Dokumente in der Collection zurück.
@@ -327,3 +577,35 @@ class ChromaManager:
                 "metadatas": dummy.metadatas,
                 "ids": dummy.ids
             }
+
+
+def get_shared_chroma_manager(embedding_model_name: str = DEFAULT_EMBEDDING_MODEL,
+                              db_directory: Optional[str] = None,
+                              collection_name: str = COLLECTION_NAME,
+                              embedding_backend: str = DEFAULT_EMBEDDING_BACKEND,
+                              backend_options: Optional[Dict[str, Any]] = None) -> ChromaManager:
+    """
+    Gibt den prozessweit gemeinsamen ChromaManager zurück.
+    Client und Embedding-Modell werden dadurch nicht bei jedem Streamlit-Rerun neu geladen.
+    Nicht funktionsfähige Manager werden nur für FAILED_MANAGER_RETRY_SECONDS weiter ausgeliefert,
+    danach versucht der nächste Zugriff es erneut (sofort nach invalidate_shared_resources("chroma_manager")).
+    
+    Args:
+        embedding_model_name: Name des Embedding-Modells
+        db_directory: Optional, Verzeichnis der Datenbank (Standard: DB_DIRECTORY)
+        collection_name: Name der Collection
+        embedding_backend: Name des Embedding-Backends
+        backend_options: Optional, weitere Einstellungen des Backends
+        
+    Returns:
+        Der gemeinsam genutzte ChromaManager
+    """
+    key = ("chroma_manager", os.path.abspath(db_directory or DB_DIRECTORY), collection_name, embedding_model_name,
+           embedding_backend, tuple(sorted((backend_options or {}).items())))
+    return shared_resources.get(
+        key,
+        lambda: ChromaManager(embedding_model_name, db_directory=db_directory, collection_name=collection_name,
+                              embedding_backend=embedding_backend, backend_options=backend_options),
+        keep=lambda manager: manager.is_functional,
+        retry_after=FAILED_MANAGER_RETRY_SECONDS
+    )
@@ -111,11 +111,50 @@ class ConfigHandler:
                 "model": "gpt-3.5-turbo",
                 "temperature": 0.7,
                 "max_tokens": 1000,
-                "language": "de"
+                "language": "de",
+                "max_concurrent_requests": 8,
+                "requests_per_minute": 500,
+                "tokens_per_minute": 200000,
+                "rate_limit_max_wait": 30,
+                "metrics_port": 0,
+                "metrics_host": "127.0.0.1"
             },
             "rag_settings": {
                 "use_own_knowledge_first": True,
-                "n_results": 5
+                "n_results": 5,
+                "answer_cache_enabled": True,
+                "answer_cache_size": 500,
+                "answer_cache_ttl": 86400,
+                "answer_cache_persistent": True,
+                "semantic_cache_enabled": True,
+                "semantic_cache_size": 1000,
+                "semantic_cache_threshold": 0.92,
+                "prompt_token_budget": 3000,
+                "max_section_tokens": 800,
+                "history_recent_turns": 2,
+                "history_token_budget": 800,
+                "hybrid_search": True,
+                "retrieval_leg_timeout": 1.5,
+                "knowledge_watch_enabled": True,
+                "knowledge_watch_interval": 2.0,
+                "structured_answers": True,
+                "theme_routing": True,
+                "theme_routing_confidence": 0.8,
+                "warmup_enabled": True
+            },
+            "client_settings": {
+                "timeout": 60.0,
+                "connect_timeout": 5.0,
+                "max_connections": 50,
+                "max_keepalive_connections": 20,
+                "keepalive_expiry": 30.0,
+                "max_retries": 2
+            },
+            "embedding_settings": {
+                "backend": "sentence_transformers",
+                "model": "all-MiniLM-L6-v2",
+                "onnx_file": "onnx/model_quint8_avx2.onnx",
+                "hashing_dimensions": 1024
             }
         }
     
@@ -217,3 +256,36 @@ class ConfigHandler:
         
         self.config["rag_settings"][key] = value
         self._save_config()
+    
+    def get_client_settings(self) -> Dict[str, Any]:
+        """
+        Gibt die Einstellungen für den OpenAI-Client (Pool-Limits, Timeouts) zurück.
+        
+        Returns:
+            Dictionary mit den Client-Einstellungen
+        """
+        settings = dict(self._get_default_config()["client_settings"])
+        settings.update(self.config.get("client_settings", {}))
+        
+        # Streamlit Secrets haben Vorrang
+        if self.using_streamlit_cloud and "client_settings" in st.secrets:
+            settings.update(dict(st.secrets["client_settings"]))
+            
+        return settings
+    
+    def get_embedding_settings(self) -> Dict[str, Any]:
+        """
+        Gibt die Einstellungen des Embedding-Backends zurück
+        (backend: "sentence_transformers", "int8" oder "hashing").
+        
+        Returns:
+            Dictionary mit Backend, Modell und Backend-Optionen
+        """
+        settings = dict(self._get_default_config()["embedding_settings"])
+        settings.update(self.config.get("embedding_settings", {}))
+        
+        # Streamlit Secrets haben Vorrang
+        if self.using_streamlit_cloud and "embedding_settings" in st.secrets:
+            settings.update(dict(st.secrets["embedding_settings"]))
+            
+        return settings
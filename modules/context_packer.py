@@ -0,0 +1,241 @@
+"""
+Token-budgetiertes Zusammenstellen des Prompts für den Saalbach Tourismus Chatbot.
+Zählt Tokens lokal und füllt ein festes Prompt-Budget in Rangfolge mit den
+abgerufenen Abschnitten. Der statische System-Prompt steht immer am Anfang,
+damit er ein stabiler, cachebarer Präfix bleibt.
+"""
+
+import re
+from typing import List, Dict, Any, Optional
+
+# tiktoken ist optional, ohne wird die Tokenanzahl konservativ geschätzt
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except Exception:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 3000
+DEFAULT_MAX_SECTION_TOKENS = 800
+
+# Abschnitte werden nur gekürzt, wenn danach noch mindestens so viele Tokens übrig bleiben
+MIN_SECTION_TOKENS = 60
+
+# Zusätzliche Tokens, die die Chat-API je Nachricht für Rolle und Trennzeichen berechnet
+TOKENS_PER_MESSAGE = 4
+
+_APPROX_TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+_encodings: Dict[str, Any] = {}
+
+
+def _get_encoding(model: str):
+    """
+    Gibt die tiktoken-Kodierung für ein Modell zurück (zwischengespeichert).
+
+    Args:
+        model: Name des OpenAI-Modells
+
+    Returns:
+        Die Kodierung oder None, wenn tiktoken nicht verfügbar ist
+    """
+    if not TIKTOKEN_AVAILABLE:
+        return None
+
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except Exception:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _encodings[model] = encoding
+    return encoding
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Zählt die Tokens eines Textes lokal.
+
+    Args:
+        text: Der Text
+        model: Name des OpenAI-Modells (bestimmt die Kodierung)
+
+    Returns:
+        Anzahl der Tokens (ohne tiktoken eine konservative Schätzung)
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    # Wörter und Satzzeichen zählen, deutsche Wörter zerfallen oft in mehrere Tokens
+    return int(len(_APPROX_TOKEN_PATTERN.findall(text)) * 1.4) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+    """
+    Kürzt einen Text auf eine maximale Anzahl an Tokens.
+    Ohne tiktoken wird an einer Zeilengrenze gekürzt, damit keine halben Aufzählungen entstehen.
+
+    Args:
+        text: Der Text
+        max_tokens: Maximale Anzahl an Tokens
+        model: Name des OpenAI-Modells
+
+    Returns:
+        Der gekürzte Text (mit Auslassungszeichen, falls gekürzt wurde)
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens - 1]).rstrip() + " …"
+
+    kept_lines = []
+    used = 0
+    for line in text.split('\n'):
+        line_tokens = count_tokens(line, model) + 1
+        if used + line_tokens > max_tokens - 1:
+            # Zeile passt nicht mehr ganz: wortweise auffüllen, wenn es die erste ist
+            if not kept_lines:
+                kept_words = []
+                for word in line.split():
+                    used += count_tokens(word, model)
+                    if used > max_tokens - 1:
+                        break
+                    kept_words.append(word)
+                return " ".join(kept_words) + " …"
+            break
+        kept_lines.append(line)
+        used += line_tokens
+    return "\n".join(kept_lines).rstrip() + "\n…"
+
+
+class ContextPacker:
+    """
+    Stellt System-Prompt, Wissenskontext, Verlauf und Anfrage innerhalb eines
+    festen Token-Budgets zusammen und protokolliert den Verbrauch je Bestandteil.
+    """
+
+    def __init__(self,
+                 model: str = "gpt-3.5-turbo",
+                 prompt_token_budget: int = DEFAULT_PROMPT_TOKEN_BUDGET,
+                 max_section_tokens: int = DEFAULT_MAX_SECTION_TOKENS):
+        """
+        Initialisiert den Packer.
+
+        Args:
+            model: Name des OpenAI-Modells (für die Token-Zählung)
+            prompt_token_budget: Maximale Anzahl an Prompt-Tokens insgesamt
+            max_section_tokens: Maximale Anzahl an Tokens je Wissensabschnitt
+        """
+        self.model = model
+        self.prompt_token_budget = prompt_token_budget
+        self.max_section_tokens = max_section_tokens
+        self._static_token_counts: Dict[str, int] = {}
+
+    def _count_static(self, text: str) -> int:
+        """Zählt die Tokens eines statischen Textes (z.B. System-Prompt) nur einmal."""
+        count = self._static_token_counts.get(text)
+        if count is None:
+            count = count_tokens(text, self.model)
+            self._static_token_counts[text] = count
+        return count
+
+    def pack(self,
+             system_prompt: str,
+             sections: List[str],
+             history: List[Dict[str, str]],
+             query: str,
+             context_header: str = "\n\nZUSÄTZLICHE INFORMATIONEN:\n",
+             empty_context: str = "") -> Dict[str, Any]:
+        """
+        Stellt die Nachrichten für das LLM innerhalb des Budgets zusammen.
+
+        Reihenfolge der Budgetvergabe: System-Prompt und Anfrage sind fix, danach
+        kommt der Verlauf (älteste Nachrichten fallen zuerst weg), der Rest wird
+        in Rangfolge mit Wissensabschnitten gefüllt. Zu große Abschnitte werden
+        gekürzt oder übersprungen, wenn kaum noch Budget übrig ist.
+
+        Args:
+            system_prompt: Der statische System-Prompt (stabiler Präfix)
+            sections: Formatierte Wissensabschnitte in Rangfolge
+            history: Nachrichten des Verlaufs, die mitgeschickt werden sollen
+            query: Die Benutzeranfrage
+            context_header: Text zwischen System-Prompt und Wissenskontext
+            empty_context: Kontexttext, falls kein Abschnitt ins Budget passt
+
+        Returns:
+            Dictionary mit Nachrichten, Indizes der verwendeten Abschnitte,
+            gekürzten und übersprungenen Abschnitten sowie dem Token-Verbrauch je Bestandteil
+        """
+        system_tokens = self._count_static(system_prompt) + self._count_static(context_header) + TOKENS_PER_MESSAGE
+        query_tokens = count_tokens(query, self.model) + TOKENS_PER_MESSAGE
+        remaining = self.prompt_token_budget - system_tokens - query_tokens
+
+        # Verlauf von hinten auffüllen, damit die jüngsten Nachrichten erhalten bleiben
+        kept_history: List[Dict[str, str]] = []
+        history_tokens = 0
+        for message in reversed(history or []):
+            message_tokens = count_tokens(message["content"], self.model) + TOKENS_PER_MESSAGE
+            if history_tokens + message_tokens > remaining:
+                break
+            kept_history.append(message)
+            history_tokens += message_tokens
+        kept_history.reverse()
+        remaining -= history_tokens
+
+        # Wissensabschnitte in Rangfolge einpacken
+        context_parts: List[str] = []
+        included: List[int] = []
+        truncated: List[int] = []
+        skipped: List[int] = []
+        context_tokens = 0
+
+        for index, section in enumerate(sections):
+            section_tokens = count_tokens(section, self.model)
+            limit = min(self.max_section_tokens, remaining - context_tokens)
+
+            if section_tokens <= limit:
+                context_parts.append(section)
+                context_tokens += section_tokens
+                included.append(index)
+            elif limit >= MIN_SECTION_TOKENS:
+                shortened = truncate_to_tokens(section, limit, self.model)
+                context_parts.append(shortened)
+                context_tokens += count_tokens(shortened, self.model)
+                included.append(index)
+                truncated.append(index)
+            else:
+                skipped.append(index)
+
+        if context_parts:
+            context = "\n".join(context_parts)
+        else:
+            context = empty_context
+            context_tokens = count_tokens(context, self.model)
+
+        messages = [{"role": "system", "content": f"{system_prompt}{context_header}{context}"}]
+        messages.extend(kept_history)
+        messages.append({"role": "user", "content": query})
+
+        return {
+            "messages": messages,
+            "included_sections": included,
+            "truncated_sections": truncated,
+            "skipped_sections": skipped,
+            "dropped_history_messages": len(history or []) - len(kept_history),
+            "token_usage": {
+                "system": system_tokens,
+                "context": context_tokens,
+                "history": history_tokens,
+                "query": query_tokens,
+                "total": system_tokens + context_tokens + history_tokens + query_tokens,
+                "budget": self.prompt_token_budget
+            }
+        }
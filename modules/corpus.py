@@ -0,0 +1,481 @@
+"""
+Gemeinsame Parsing-Schicht für die Wissensdateien des Saalbach Tourismus Chatbots.
+Zerlegt die Markdown-Dateien einmal in Dokumente (für Stichwortsuche und ChromaDB)
+und speichert das Ergebnis samt BM25-Index als versionierten Binär-Snapshot.
+Beim nächsten Start werden nur Dateien neu zerlegt, deren Signatur (Änderungszeit,
+Größe) und Inhalts-Hash sich geändert haben; ist alles unverändert, wird nur der
+Snapshot geladen.
+"""
+
+import os
+import copy
+import gc
+import stat
+import pickle
+import hashlib
+import tempfile
+import glob
+from typing import List, Dict, Any, Tuple, Optional
+
+from modules.markdown_chunker import chunk_markdown_file, DEFAULT_MAX_CHUNK_SIZE
+from modules.search_index import BM25Index
+from modules.telemetry import span
+from modules.resources import shared_resources
+
+# Bei Änderungen an Chunking, Dokumentformat oder Index erhöhen, alte Snapshots werden dann verworfen
+SNAPSHOT_VERSION = 2
+
+
+def user_cache_directory(name: str) -> str:
+    """
+    Liefert ein Cache-Verzeichnis des Benutzers (XDG-Cache-Verzeichnis,
+    ohne Home ein eigenes Verzeichnis je Benutzer im Temp-Ordner).
+
+    Args:
+        name: Name des Unterverzeichnisses
+
+    Returns:
+        Der Pfad des Verzeichnisses (wird nicht angelegt)
+    """
+    home = os.path.expanduser("~")
+    cache_home = os.environ.get("XDG_CACHE_HOME") or (os.path.join(home, ".cache") if home != "~" else None)
+    if cache_home:
+        return os.path.join(cache_home, name)
+    user = str(os.getuid()) if hasattr(os, "getuid") else "user"
+    return os.path.join(tempfile.gettempdir(), f"{name}_{user}")
+
+
+# Snapshots werden per pickle geladen und liegen deshalb in einem Verzeichnis des Benutzers
+SNAPSHOT_DIRECTORY = user_cache_directory("saalbach_corpus")
+
+
+def is_private_path(path: str) -> bool:
+    """
+    Prüft, ob eine Datei oder ein Verzeichnis dem eigenen Benutzer gehört und für
+    andere nicht beschreibbar ist (kein symbolischer Link). Nur solchen Snapshots
+    wird beim Laden per pickle vertraut.
+
+    Args:
+        path: Der zu prüfende Pfad
+
+    Returns:
+        True, wenn der Pfad vertrauenswürdig ist (ohne POSIX-Rechte immer True)
+    """
+    if not hasattr(os, "getuid"):
+        return True
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (not stat.S_ISLNK(info.st_mode)
+            and info.st_uid == os.getuid()
+            and not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def make_chunk_id(file_name: str, heading: str, subheading: str, text: str) -> str:
+    """
+    Erzeugt eine deterministische Chunk-ID aus Datei, Überschriften und Inhalt.
+    Unveränderte Chunks behalten beim erneuten Import ihre ID.
+
+    Args:
+        file_name: Name der Quelldatei
+        heading: Überschrift des Chunks
+        subheading: Unterüberschrift des Chunks
+        text: Inhalt des Chunks
+
+    Returns:
+        Die Chunk-ID (Inhalts-Hash)
+    """
+    return hashlib.sha1("\x1f".join([file_name, heading, subheading, text]).encode('utf-8')).hexdigest()[:16]
+
+
+def file_signature(file_path: str) -> Tuple[int, int]:
+    """
+    Liefert die Signatur einer Datei (Änderungszeit in ns, Größe).
+
+    Args:
+        file_path: Pfad zur Datei
+
+    Returns:
+        Tuple (Änderungszeit, Größe)
+    """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def parse_markdown_file(file_path: str, max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Zerlegt eine Markdown-Datei in Dokumente im Format der Wissensbasis.
+    Modulfunktion, damit sie auch in einem Prozesspool laufen kann.
+
+    Args:
+        file_path: Pfad zur Markdown-Datei
+        max_chunk_size: Maximale Anzahl an Zeichen pro Chunk
+
+    Returns:
+        Dictionary mit "file_name", "version" (Inhalts-Hash) und "documents"
+        (je Dokument "id", "content" und "metadata")
+    """
+    file_name = os.path.basename(file_path)
+    theme = os.path.splitext(file_name)[0]  # Theme aus Dateiname ableiten
+
+    # Datei wird zeilenweise gelesen und zerlegt, nie vollständig geladen
+    chunked = chunk_markdown_file(file_path, max_chunk_size)
+
+    documents = []
+    occurrences: Dict[str, int] = {}
+    for chunk in chunked["chunks"]:
+        metadata = {
+            "theme": theme,
+            "source_file": file_name,
+            "heading": chunk["heading"] or "Allgemein",
+            "subheading": chunk["subheading"] or "",  # Leerer String statt None (ChromaDB)
+            "entry": chunk["entry"] or ""
+        }
+
+        # Identische Chunks innerhalb einer Datei durchnummerieren
+        chunk_id = make_chunk_id(file_name, metadata["heading"], metadata["subheading"], chunk["text"])
+        occurrences[chunk_id] = occurrences.get(chunk_id, 0) + 1
+        if occurrences[chunk_id] > 1:
+            chunk_id = f"{chunk_id}-{occurrences[chunk_id] - 1}"
+
+        documents.append({"id": chunk_id, "content": chunk["text"], "metadata": metadata})
+
+    return {"file_name": file_name, "version": chunked["file_hash"], "documents": documents}
+
+
+def snapshot_path(knowledge_dir: str, snapshot_dir: Optional[str] = None) -> str:
+    """
+    Bestimmt den Pfad des Snapshots für ein Wissensverzeichnis.
+
+    Args:
+        knowledge_dir: Das Wissensverzeichnis
+        snapshot_dir: Optional, Verzeichnis der Snapshots (Standard: SNAPSHOT_DIRECTORY)
+
+    Returns:
+        Pfad der Snapshot-Datei
+    """
+    directory_key = hashlib.sha1(os.path.abspath(knowledge_dir).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(snapshot_dir or SNAPSHOT_DIRECTORY, f"corpus_{directory_key}.pkl")
+
+
+def list_markdown_files(knowledge_dir: str) -> List[str]:
+    """
+    Listet die Markdown-Dateien eines Wissensverzeichnisses sortiert auf.
+
+    Args:
+        knowledge_dir: Das Wissensverzeichnis
+
+    Returns:
+        Liste der Dateipfade
+    """
+    return sorted(glob.glob(os.path.join(knowledge_dir, "*.md")))
+
+
+class ParsedCorpus:
+    """
+    Zerlegte Wissensdateien mit BM25-Index.
+    Je Datei werden Signatur, Version (Inhalts-Hash) und Dokumente gehalten.
+    Einmal geteilte Instanzen werden nicht verändert; Änderungen erzeugen einen neuen Korpus.
+    """
+
+    def __init__(self, knowledge_dir: str, files: Dict[str, Dict[str, Any]], max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE):
+        """
+        Initialisiert den Korpus und baut den Index auf.
+
+        Args:
+            knowledge_dir: Das Wissensverzeichnis
+            files: Dateiname -> {"signature", "version", "documents"}
+            max_chunk_size: Maximale Anzahl an Zeichen pro Chunk (Teil des Snapshot-Formats)
+        """
+        self.knowledge_dir = knowledge_dir
+        self.files = files
+        self.max_chunk_size = max_chunk_size
+        self.documents = [doc for file_name in sorted(files) for doc in files[file_name]["documents"]]
+        with span("index_build", documents=len(self.documents)):
+            self.search_index = BM25Index(self.documents)
+
+        # Herkunft (für Logs und Traces): "parsed" oder "snapshot"
+        self.source = "parsed"
+
+    @property
+    def file_versions(self) -> Dict[str, str]:
+        return {file_name: entry["version"] for file_name, entry in self.files.items()}
+
+    @property
+    def file_documents(self) -> Dict[str, List[Dict[str, Any]]]:
+        return {file_name: entry["documents"] for file_name, entry in self.files.items()}
+
+    def is_fresh(self, file_path: str) -> bool:
+        """
+        Prüft, ob der Korpus den aktuellen Stand einer Datei enthält (gleiche Signatur).
+
+        Args:
+            file_path: Pfad zur Datei
+
+        Returns:
+            True, wenn die Datei seit dem Zerlegen nicht verändert wurde
+        """
+        entry = self.files.get(os.path.basename(file_path))
+        if entry is None:
+            return False
+        try:
+            return tuple(entry["signature"]) == file_signature(file_path)
+        except OSError:
+            return False
+
+    def updated(self, changed_paths: List[str], removed_paths: List[str] = None) -> Tuple["ParsedCorpus", List[str]]:
+        """
+        Erzeugt einen neuen Korpus mit geänderten, neuen und gelöschten Dateien.
+
+        Args:
+            changed_paths: Pfade geänderter oder neuer Dateien
+            removed_paths: Optional, Pfade gelöschter Dateien
+
+        Returns:
+            Tuple (neuer Korpus, Namen der tatsächlich geänderten Dateien);
+            ohne Änderungen wird dieser Korpus selbst zurückgegeben, bei nur
+            berührten Dateien eine Kopie mit neuen Signaturen und demselben Index
+        """
+        files = dict(self.files)
+        affected = []
+        signature_changed = False
+
+        for file_path in changed_paths:
+            file_name = os.path.basename(file_path)
+            try:
+                signature = file_signature(file_path)
+                parsed = parse_markdown_file(file_path, self.max_chunk_size)
+            except Exception as e:
+                # Alte Fassung der Datei behalten
+                print(f"Fehler beim Zerlegen von {file_path}: {str(e)}")
+                continue
+            previous = files.get(file_name)
+            if previous is not None and previous["version"] == parsed["version"]:
+                # Nur berührt: Dokumente und Index bleiben gültig
+                if tuple(previous["signature"]) != signature:
+                    files[file_name] = dict(previous, signature=signature)
+                    signature_changed = True
+                continue
+            files[file_name] = {"signature": signature, "version": parsed["version"], "documents": parsed["documents"]}
+            affected.append(file_name)
+
+        for file_path in removed_paths or []:
+            file_name = os.path.basename(file_path)
+            if files.pop(file_name, None) is not None:
+                affected.append(file_name)
+
+        if not affected:
+            if not signature_changed:
+                return self, []
+            refreshed = copy.copy(self)
+            refreshed.files = files
+            return refreshed, []
+        return ParsedCorpus(self.knowledge_dir, files, self.max_chunk_size), affected
+
+    def save(self, snapshot_dir: Optional[str] = None) -> Optional[str]:
+        """
+        Speichert den Korpus atomar als Snapshot (erst temporäre Datei, dann umbenennen).
+
+        Args:
+            snapshot_dir: Optional, Verzeichnis der Snapshots (Standard: SNAPSHOT_DIRECTORY)
+
+        Returns:
+            Pfad des Snapshots oder None bei Fehlern
+        """
+        path = snapshot_path(self.knowledge_dir, snapshot_dir)
+        try:
+            # Nur für den eigenen Benutzer lesbar, da Snapshots per pickle geladen werden
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            if not is_private_path(os.path.dirname(path)):
+                print(f"Snapshot-Verzeichnis {os.path.dirname(path)} gehört nicht dem eigenen Benutzer "
+                      "oder ist für andere beschreibbar, Snapshot wird nicht gespeichert.")
+                return None
+            file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(file_descriptor, 'wb') as file:
+                pickle.dump({
+                    "version": SNAPSHOT_VERSION,
+                    "knowledge_dir": os.path.abspath(self.knowledge_dir),
+                    "max_chunk_size": self.max_chunk_size,
+                    "corpus": self
+                }, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            return path
+        except Exception as e:
+            print(f"Fehler beim Speichern des Korpus-Snapshots: {str(e)}")
+            return None
+
+    @staticmethod
+    def load_snapshot(knowledge_dir: str,
+                      snapshot_dir: Optional[str] = None,
+                      max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE) -> Optional["ParsedCorpus"]:
+        """
+        Lädt den Snapshot eines Wissensverzeichnisses, sofern Format und Einstellungen passen
+        und Verzeichnis und Datei nur dem eigenen Benutzer gehören (siehe is_private_path).
+
+        Args:
+            knowledge_dir: Das Wissensverzeichnis
+            snapshot_dir: Optional, Verzeichnis der Snapshots (Standard: SNAPSHOT_DIRECTORY)
+            max_chunk_size: Erwartete maximale Chunk-Größe
+
+        Returns:
+            Der gespeicherte Korpus oder None
+        """
+        path = snapshot_path(knowledge_dir, snapshot_dir)
+        if not os.path.exists(path):
+            return None
+        if not (is_private_path(os.path.dirname(path)) and is_private_path(path)):
+            print(f"Korpus-Snapshot {path} gehört nicht dem eigenen Benutzer oder ist für andere "
+                  "beschreibbar und wird ignoriert.")
+            return None
+
+        try:
+            # Ohne Garbage Collector lädt pickle viele kleine Objekte etwa doppelt so schnell
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                with open(path, 'rb') as file:
+                    data = pickle.load(file)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            if (data.get("version") != SNAPSHOT_VERSION
+                    or data.get("knowledge_dir") != os.path.abspath(knowledge_dir)
+                    or data.get("max_chunk_size") != max_chunk_size):
+                return None
+            corpus = data["corpus"]
+            corpus.source = "snapshot"
+            return corpus
+        except Exception as e:
+            print(f"Korpus-Snapshot konnte nicht geladen werden, Dateien werden neu zerlegt: {str(e)}")
+            return None
+
+
+def load_corpus(knowledge_dir: str,
+                snapshot_dir: Optional[str] = None,
+                max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+                use_snapshot: bool = True) -> ParsedCorpus:
+    """
+    Lädt die Wissensdateien eines Verzeichnisses, bevorzugt aus dem Snapshot.
+
+    Dateien mit unveränderter Signatur werden aus dem Snapshot übernommen. Bei
+    geänderter Signatur wird die Datei zerlegt; ist ihr Inhalts-Hash gleich geblieben
+    (z.B. nur berührt), bleibt der Rest unverändert. Nur wenn sich etwas geändert hat,
+    werden Index und Snapshot neu geschrieben.
+
+    Args:
+        knowledge_dir: Das Wissensverzeichnis
+        snapshot_dir: Optional, Verzeichnis der Snapshots (Standard: SNAPSHOT_DIRECTORY)
+        max_chunk_size: Maximale Anzahl an Zeichen pro Chunk
+        use_snapshot: Snapshot lesen und schreiben
+
+    Returns:
+        Der Korpus mit Dokumenten und BM25-Index
+    """
+    with span("corpus_load") as load_span:
+        snapshot = ParsedCorpus.load_snapshot(knowledge_dir, snapshot_dir, max_chunk_size) if use_snapshot else None
+        previous_files = snapshot.files if snapshot is not None else {}
+
+        files: Dict[str, Dict[str, Any]] = {}
+        content_changed = False
+        signature_changed = False
+        parsed_files = 0
+
+        for file_path in list_markdown_files(knowledge_dir):
+            file_name = os.path.basename(file_path)
+            try:
+                signature = file_signature(file_path)
+                previous = previous_files.get(file_name)
+                if previous is not None and tuple(previous["signature"]) == signature:
+                    files[file_name] = previous
+                    continue
+
+                parsed = parse_markdown_file(file_path, max_chunk_size)
+                parsed_files += 1
+                if previous is not None and previous["version"] == parsed["version"]:
+                    # Nur berührt: Dokumente und Index bleiben gültig
+                    files[file_name] = dict(previous, signature=signature)
+                    signature_changed = True
+                else:
+                    files[file_name] = {"signature": signature, "version": parsed["version"], "documents": parsed["documents"]}
+                    content_changed = True
+            except Exception as e:
+                print(f"Fehler beim Laden von {file_path}: {str(e)}")
+
+        if set(files) != set(previous_files):
+            content_changed = True
+
+        if snapshot is not None and not content_changed:
+            if signature_changed:
+                snapshot.files = files
+                snapshot.save(snapshot_dir)
+            load_span.set(source="snapshot", files=len(files), parsed_files=parsed_files, documents=len(snapshot.documents))
+            return snapshot
+
+        corpus = ParsedCorpus(knowledge_dir, files, max_chunk_size)
+        if use_snapshot:
+            corpus.save(snapshot_dir)
+        load_span.set(source="parsed", files=len(files), parsed_files=parsed_files, documents=len(corpus.documents))
+        return corpus
+
+
+def _shared_corpus_key(knowledge_dir: str, max_chunk_size: int) -> Tuple[str, str, int]:
+    return ("corpus", os.path.abspath(knowledge_dir), max_chunk_size)
+
+
+def get_shared_corpus(knowledge_dir: str, max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE) -> ParsedCorpus:
+    """
+    Gibt den prozessweit gemeinsamen Korpus eines Wissensverzeichnisses zurück.
+    Der Korpus wird einmal geladen; weitere Aufrufe prüfen nur die Dateisignaturen
+    und übernehmen Änderungen, die noch nicht eingespielt wurden.
+
+    Args:
+        knowledge_dir: Das Wissensverzeichnis
+        max_chunk_size: Maximale Anzahl an Zeichen pro Chunk
+
+    Returns:
+        Der gemeinsam genutzte Korpus
+    """
+    key = _shared_corpus_key(knowledge_dir, max_chunk_size)
+    corpus = shared_resources.get(key, lambda: load_corpus(knowledge_dir, max_chunk_size=max_chunk_size))
+
+    file_paths = list_markdown_files(knowledge_dir)
+    changed_paths = [file_path for file_path in file_paths if not corpus.is_fresh(file_path)]
+    current_files = {os.path.basename(file_path) for file_path in file_paths}
+    removed_paths = [os.path.join(knowledge_dir, name) for name in corpus.files if name not in current_files]
+    if changed_paths or removed_paths:
+        corpus, _ = update_shared_corpus(corpus, changed_paths, removed_paths)
+    return corpus
+
+
+def update_shared_corpus(corpus: ParsedCorpus,
+                         changed_paths: List[str],
+                         removed_paths: List[str] = None) -> Tuple[ParsedCorpus, List[str]]:
+    """
+    Spielt Dateiänderungen in den gemeinsamen Korpus ein und speichert den Snapshot.
+
+    Haben andere Sessions die Änderungen bereits übernommen, wird deren Korpus
+    weiterverwendet statt die Dateien erneut zu zerlegen und den Index neu aufzubauen.
+
+    Args:
+        corpus: Der Korpus des Aufrufers (Grundlage für die geänderten Dateien)
+        changed_paths: Pfade geänderter oder neuer Dateien
+        removed_paths: Optional, Pfade gelöschter Dateien
+
+    Returns:
+        Tuple (aktueller Korpus, Namen der Dateien, die sich gegenüber corpus geändert haben)
+    """
+    key = _shared_corpus_key(corpus.knowledge_dir, corpus.max_chunk_size)
+    with shared_resources.build_lock(key):
+        current = shared_resources.peek(key) or corpus
+        updated, _ = current.updated(changed_paths, removed_paths)
+        if updated is not current:
+            updated.save()
+        shared_resources.put(key, updated)
+
+    previous_versions, versions = corpus.file_versions, updated.file_versions
+    affected = sorted(
+        file_name for file_name in set(previous_versions) | set(versions)
+        if previous_versions.get(file_name) != versions.get(file_name)
+    )
+    return updated, affected
@@ -0,0 +1,471 @@
+"""
+Embedding-Backends für den Saalbach Tourismus Chatbot.
+Alle Backends haben dieselbe Schnittstelle (embed für NumPy-Matrizen, Aufruf als
+Embedding-Funktion für ChromaDB) und werden über die Einstellungen ausgewählt:
+
+- "sentence_transformers": das bisherige sentence-transformers-Modell (Standard)
+- "int8": dasselbe Modell int8-quantisiert für die CPU, bevorzugt als ONNX-Modell mit
+  onnxruntime, sonst per dynamischer Quantisierung in PyTorch
+- "hashing": deterministisches Feature-Hashing von Wörtern und Trigrammen, braucht
+  keine Modelldateien (offline, Tests, Fallback)
+
+Modelle werden über das Ressourcen-Register einmal pro Prozess geladen.
+"""
+
+import re
+import math
+import zlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from modules.resources import shared_resources
+from modules.search_index import tokenize
+from modules.telemetry import QUERY_EMBEDDING_CACHE
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_EMBEDDING_BACKEND = "sentence_transformers"
+
+# Quantisiertes ONNX-Modell aus dem Hugging-Face-Repository des Modells (läuft auf allen AVX2-CPUs)
+DEFAULT_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+ONNX_MAX_LENGTH = 256
+ONNX_BATCH_SIZE = 64
+
+# Feature-Hashing: Dimensionen und Gewicht der Wort-Trigramme relativ zu ganzen Wörtern
+DEFAULT_HASHING_DIMENSIONS = 1024
+TRIGRAM_WEIGHT = 0.5
+
+# Anfrage-Embeddings, die je Backend im Speicher gehalten werden (384 Dimensionen: ca. 1,5 KB je Eintrag)
+DEFAULT_QUERY_CACHE_SIZE = 2048
+
+_COLLECTION_SUFFIX_PATTERN = re.compile(r"[^a-zA-Z0-9_-]+")
+
+
+class EmbeddingBackend:
+    """
+    Basisklasse der Embedding-Backends.
+    Unterklassen implementieren embed; der Aufruf als Funktion entspricht der
+    Embedding-Funktion-Schnittstelle von ChromaDB.
+    """
+
+    name = ""
+
+    # Anhang an den Collection-Namen: Vektoren verschiedener Backends sind nicht vergleichbar
+    # und liegen daher in eigenen Collections (leer = Standard-Collection)
+    collection_suffix = ""
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Berechnet die Embeddings mehrerer Texte.
+
+        Args:
+            texts: Die Texte
+
+        Returns:
+            Matrix (Anzahl Texte x Dimensionen) als float32
+        """
+        raise NotImplementedError
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.embed(list(input)).tolist()
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Beschreibt das Backend (für Statusanzeige und Benchmarks).
+
+        Returns:
+            Dictionary mit Name und Einstellungen des Backends
+        """
+        return {"backend": self.name}
+
+
+def get_shared_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL) -> Any:
+    """
+    Gibt das prozessweit gemeinsame sentence-transformers-Modell zurück.
+    Die Gewichte werden nur beim ersten Zugriff geladen.
+
+    Args:
+        model_name: Name des Modells
+
+    Returns:
+        Das SentenceTransformer-Modell
+    """
+    def load() -> Any:
+        from sentence_transformers import SentenceTransformer
+        print(f"Lade Embedding-Modell {model_name}...")
+        return SentenceTransformer(model_name)
+
+    return shared_resources.get(("embedding_model", model_name), load)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Embeddings mit dem gemeinsam genutzten sentence-transformers-Modell.
+    Liefert dieselben Vektoren wie SentenceTransformerEmbeddingFunction von ChromaDB,
+    lädt das Modell aber nicht je Instanz.
+    """
+
+    name = "sentence_transformers"
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self._model = get_shared_embedding_model(model_name)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(
+            self._model.encode(texts, convert_to_numpy=True, normalize_embeddings=False),
+            dtype=np.float32
+        )
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model_name}
+
+
+def _hub_repository(model_name: str) -> str:
+    # Kurznamen wie "all-MiniLM-L6-v2" liegen im Namensraum sentence-transformers
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class QuantizedBackend(EmbeddingBackend):
+    """
+    int8-quantisiertes Modell für schnellere Inferenz auf der CPU.
+    Bevorzugt das quantisierte ONNX-Modell des Hugging-Face-Repositorys mit onnxruntime
+    (Mean-Pooling und Normalisierung wie im sentence-transformers-Modell); ist onnxruntime
+    nicht installiert, werden die linearen Schichten des Modells dynamisch quantisiert.
+    """
+
+    name = "int8"
+    collection_suffix = "int8"
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, onnx_file: str = DEFAULT_ONNX_FILE):
+        self.model_name = model_name
+        self.onnx_file = onnx_file
+        self.runtime, self._model = shared_resources.get(
+            ("embedding_model", model_name, "int8", onnx_file),
+            functools.partial(self._load, model_name, onnx_file)
+        )
+
+    @staticmethod
+    def _load(model_name: str, onnx_file: str) -> Tuple[str, Any]:
+        """
+        Lädt das quantisierte Modell.
+
+        Returns:
+            Tupel aus Laufzeit ("onnx" oder "torch") und Modell
+        """
+        try:
+            import onnxruntime
+            from huggingface_hub import hf_hub_download
+            from transformers import AutoTokenizer
+
+            repository = _hub_repository(model_name)
+            print(f"Lade quantisiertes ONNX-Modell {repository}/{onnx_file}...")
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = onnxruntime.InferenceSession(
+                hf_hub_download(repository, onnx_file),
+                options,
+                providers=["CPUExecutionProvider"]
+            )
+            return "onnx", (AutoTokenizer.from_pretrained(repository), session)
+        except Exception as e:
+            print(f"ONNX-Modell nicht verfügbar ({str(e)}), quantisiere das PyTorch-Modell...")
+
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_name, device="cpu")
+        return "torch", torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if self.runtime == "torch":
+            return np.asarray(
+                self._model.encode(texts, convert_to_numpy=True, normalize_embeddings=False),
+                dtype=np.float32
+            )
+
+        tokenizer, session = self._model
+        input_names = {node.name for node in session.get_inputs()}
+        batches = []
+        for start in range(0, len(texts), ONNX_BATCH_SIZE):
+            encoded = tokenizer(
+                texts[start:start + ONNX_BATCH_SIZE],
+                padding=True,
+                truncation=True,
+                max_length=ONNX_MAX_LENGTH,
+                return_tensors="np"
+            )
+            inputs = {name: np.asarray(value, dtype=np.int64) for name, value in encoded.items() if name in input_names}
+            if "token_type_ids" in input_names and "token_type_ids" not in inputs:
+                inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+            hidden = session.run(None, inputs)[0]
+
+            # Mean-Pooling über die echten Tokens, danach L2-Normalisierung
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype(np.float32))
+
+        return np.vstack(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model": self.model_name, "runtime": self.runtime}
+
+
+@functools.lru_cache(maxsize=200000)
+def _hashed_feature(feature: str, dimensions: int) -> Tuple[int, float]:
+    """Position und Vorzeichen eines Merkmals (stabil über Prozesse, anders als hash())."""
+    value = zlib.crc32(feature.encode("utf-8"))
+    return value % dimensions, 1.0 if (value // dimensions) & 1 else -1.0
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Deterministische Embeddings per Feature-Hashing, ohne Modelldateien.
+    Merkmale sind die normalisierten Suchbegriffe (wie im BM25-Index) und deren
+    Zeichen-Trigramme, damit auch Teile zusammengesetzter Wörter ("Familienhotel")
+    übereinstimmen. Gewichtung logarithmisch, Vektoren L2-normalisiert.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = DEFAULT_HASHING_DIMENSIONS):
+        self.dimensions = int(dimensions)
+        self.collection_suffix = f"hashing{self.dimensions}"
+
+    def _vector(self, text: str) -> np.ndarray:
+        weights: Dict[int, float] = {}
+        for token in tokenize(text):
+            index, sign = _hashed_feature(token, self.dimensions)
+            weights[index] = weights.get(index, 0.0) + sign
+            padded = f"<{token}>"
+            for start in range(len(padded) - 2):
+                index, sign = _hashed_feature(padded[start:start + 3], self.dimensions)
+                weights[index] = weights.get(index, 0.0) + sign * TRIGRAM_WEIGHT
+
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for index, weight in weights.items():
+            vector[index] = math.copysign(math.log1p(abs(weight)), weight)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+        return np.vstack([self._vector(text) for text in texts])
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "dimensions": self.dimensions}
+
+
+# Name -> Backend-Klasse
+EMBEDDING_BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    QuantizedBackend.name: QuantizedBackend,
+    HashingBackend.name: HashingBackend,
+}
+
+
+def create_embedding_backend(backend: str = DEFAULT_EMBEDDING_BACKEND,
+                             model_name: str = DEFAULT_EMBEDDING_MODEL,
+                             options: Optional[Dict[str, Any]] = None) -> EmbeddingBackend:
+    """
+    Erstellt ein Embedding-Backend.
+
+    Args:
+        backend: Name des Backends (siehe EMBEDDING_BACKENDS)
+        model_name: Name des Modells (für "sentence_transformers" und "int8")
+        options: Optional, weitere Einstellungen ("onnx_file" für "int8", "dimensions" für "hashing")
+
+    Returns:
+        Das Backend
+
+    Raises:
+        ValueError: Wenn das Backend unbekannt ist
+    """
+    options = options or {}
+    if backend == SentenceTransformerBackend.name:
+        return SentenceTransformerBackend(model_name)
+    if backend == QuantizedBackend.name:
+        return QuantizedBackend(model_name, onnx_file=options.get("onnx_file") or DEFAULT_ONNX_FILE)
+    if backend == HashingBackend.name:
+        return HashingBackend(options.get("dimensions") or DEFAULT_HASHING_DIMENSIONS)
+    raise ValueError(f"Unbekanntes Embedding-Backend '{backend}' (verfügbar: {', '.join(EMBEDDING_BACKENDS)})")
+
+
+def get_shared_embedding_backend(backend: str = DEFAULT_EMBEDDING_BACKEND,
+                                 model_name: str = DEFAULT_EMBEDDING_MODEL,
+                                 options: Optional[Dict[str, Any]] = None) -> EmbeddingBackend:
+    """
+    Gibt das prozessweit gemeinsame Embedding-Backend zurück (Modell wird einmal geladen).
+
+    Args:
+        backend: Name des Backends
+        model_name: Name des Modells
+        options: Optional, weitere Einstellungen des Backends
+
+    Returns:
+        Das gemeinsam genutzte Backend
+    """
+    key = ("embedding_backend", backend, model_name, tuple(sorted((options or {}).items())))
+    return shared_resources.get(key, lambda: create_embedding_backend(backend, model_name, options))
+
+
+def collection_name_for(collection_name: str, backend: EmbeddingBackend) -> str:
+    """
+    Name der Collection für ein Backend (Standard-Backend: unverändert).
+
+    Args:
+        collection_name: Name der Standard-Collection
+        backend: Das Embedding-Backend
+
+    Returns:
+        Der Collection-Name
+    """
+    if not backend.collection_suffix:
+        return collection_name
+    return f"{collection_name}_{_COLLECTION_SUFFIX_PATTERN.sub('_', backend.collection_suffix)}"
+
+
+def backend_options(settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Liest die Optionen des gewählten Backends aus den Embedding-Einstellungen
+    (nur die Optionen, die das Backend verwendet, damit gleiche Backends gleich geteilt werden).
+
+    Args:
+        settings: Embedding-Einstellungen (siehe ConfigHandler.get_embedding_settings)
+
+    Returns:
+        Die Optionen oder None
+    """
+    backend = settings.get("backend", DEFAULT_EMBEDDING_BACKEND)
+    if backend == QuantizedBackend.name:
+        return {"onnx_file": settings.get("onnx_file") or DEFAULT_ONNX_FILE}
+    if backend == HashingBackend.name:
+        return {"dimensions": int(settings.get("hashing_dimensions") or DEFAULT_HASHING_DIMENSIONS)}
+    return None
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalisiert eine Anfrage für den Embedding-Cache (Kleinschreibung, einfache Leerzeichen).
+    Das Standardmodell unterscheidet keine Groß-/Kleinschreibung, die Vektoren ändern sich dadurch nicht.
+
+    Args:
+        query: Die Anfrage
+
+    Returns:
+        Die normalisierte Anfrage
+    """
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-sicherer LRU-Cache normalisierte Anfrage -> Embedding für ein Backend.
+    Wiederholte Fragen ("Wo kann ich gut essen?") werden nur einmal eingebettet;
+    Fehlversuche eines Aufrufs werden gemeinsam in einem Batch berechnet.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, capacity: int = DEFAULT_QUERY_CACHE_SIZE):
+        """
+        Args:
+            backend: Das Embedding-Backend, dessen Vektoren zwischengespeichert werden
+            capacity: Maximale Anzahl an Einträgen
+        """
+        self.backend = backend
+        self.capacity = capacity
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Liefert die Embeddings mehrerer Anfragen, bekannte aus dem Cache.
+
+        Args:
+            queries: Die Anfragen
+
+        Returns:
+            Matrix (Anzahl Anfragen x Dimensionen)
+        """
+        keys = [normalize_query(query) for query in queries]
+        vectors: List[Optional[np.ndarray]] = [None] * len(keys)
+        missing: Dict[str, List[int]] = {}
+
+        with self._lock:
+            for position, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[position] = vector
+                else:
+                    missing.setdefault(key, []).append(position)
+            hits = len(keys) - sum(len(positions) for positions in missing.values())
+            self.hits += hits
+            self.misses += len(keys) - hits
+        QUERY_EMBEDDING_CACHE.inc(hits, result="hit")
+        QUERY_EMBEDDING_CACHE.inc(len(keys) - hits, result="miss")
+
+        if missing:
+            # Außerhalb der Sperre einbetten, andere Sessions werden nicht blockiert
+            texts = list(missing)
+            embedded = np.asarray(self.backend.embed(texts), dtype=np.float32)
+            with self._lock:
+                for text, vector in zip(texts, embedded):
+                    vector.setflags(write=False)
+                    for position in missing[text]:
+                        vectors[position] = vector
+                    self._entries[text] = vector
+                    self._entries.move_to_end(text)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def clear(self) -> None:
+        """Leert den Cache (z.B. nachdem das Modell ausgetauscht wurde)."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Gibt die Trefferstatistik des Caches zurück.
+
+        Returns:
+            Dictionary mit Treffern, Fehlversuchen, Trefferquote und Belegung
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "capacity": self.capacity
+            }
+
+
+def get_shared_query_embedding_cache(backend: EmbeddingBackend,
+                                     capacity: int = DEFAULT_QUERY_CACHE_SIZE) -> QueryEmbeddingCache:
+    """
+    Gibt den prozessweit gemeinsamen Anfrage-Cache eines Backends zurück.
+    Der Cache hängt am Backend-Objekt: wird das Modell gewechselt oder neu geladen
+    (neues Backend), beginnt ein neuer, leerer Cache und der alte wird mit dem Backend freigegeben.
+
+    Args:
+        backend: Das Embedding-Backend
+        capacity: Maximale Anzahl an Einträgen (nur beim ersten Aufruf je Backend)
+
+    Returns:
+        Der gemeinsam genutzte Cache
+    """
+    return shared_resources.derived(backend, "query_embedding_cache", lambda: QueryEmbeddingCache(backend, capacity))
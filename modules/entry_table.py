@@ -0,0 +1,589 @@
+"""
+Strukturierte Eintragstabelle für den Saalbach Tourismus Chatbot.
+Liest die Aufzählungsfelder der ###-Einträge (z.B. **Bewertung:**, **Preiskategorie:**,
+**Eignung:**) in eine spaltenorientierte Tabelle (pandas/NumPy) ein. Anfragen wie
+"familienfreundliche Restaurants, höchstens Mittel, Bewertung ab 4,3, Top 5" werden
+darüber exakt und ohne LLM beantwortet. Enthält eine Anfrage weitere Begriffe
+("Welche Hütte hat den besten Kaiserschmarrn?"), gehen die passenden Einträge als
+Kontext an das LLM.
+"""
+
+import re
+import importlib.util
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from modules.search_index import tokenize, normalize_token
+
+# pandas und NumPy sind optional, ohne sie gibt es keine strukturierten Antworten.
+# Importiert wird erst beim Aufbau der ersten Tabelle, damit der Start der App nicht wartet.
+PANDAS_AVAILABLE = importlib.util.find_spec("pandas") is not None and importlib.util.find_spec("numpy") is not None
+np = None
+pd = None
+
+
+def _import_pandas() -> None:
+    """Importiert pandas und NumPy beim ersten Bedarf."""
+    global np, pd
+    if pd is None:
+        import numpy
+        import pandas
+        np, pd = numpy, pandas
+
+# Aufzählungsfeld eines Eintrags: - **Schlüssel:** Wert
+FIELD_PATTERN = re.compile(r"^\s*[-*]\s+\*\*(.+?):\*\*\s*(.*?)\s*$")
+RATING_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*(?:\((\d[\d.]*)\s*Bewertung)?")
+STARS_PATTERN = re.compile(r"(\d)\s*-?\s*Sterne", re.IGNORECASE)
+
+# Preiskategorien als Rangfolge (Zwischenstufen liegen dazwischen)
+PRICE_TIERS = {
+    "günstig": 1.0,
+    "günstig bis mittel": 1.5,
+    "mittel": 2.0,
+    "mittel bis hoch": 2.5,
+    "mittel bis gehoben": 2.5,
+    "hoch": 3.0,
+    "gehoben": 3.0
+}
+
+# Felder, aus denen Eignungs-Tags gelesen werden
+TAG_FIELDS = ("Eignung", "Zielgruppe")
+
+# Art eines Eintrags (Präfix des Dateinamens) -> Bezeichnung in Antworten ("bei den ...")
+KIND_LABELS = {"restaurants": "Restaurants", "unterkuenfte": "Unterkünften"}
+
+# Erkennung der gesuchten Art in einer Anfrage
+KIND_PATTERNS = {
+    "restaurants": re.compile(r"restaurant|lokal|hütte|huette|gasthaus|wirtshaus|einkehr|\bessen\b|\bbars?\b|café|cafe|\balm\b|\balmen\b", re.IGNORECASE),
+    "unterkuenfte": re.compile(r"hotel|unterkunft|unterkünfte|übernacht|pension|chalet|apartment|ferienwohnung", re.IGNORECASE)
+}
+
+# Kategorien (Präfix der Unterüberschrift, kleingeschrieben), die eine Anfrage gezielt anspricht
+CATEGORY_PATTERNS = {
+    "almhütten": re.compile(r"hütte|huette|\balm(?:en)?\b", re.IGNORECASE)
+}
+
+# Umschreibungen von Tags, die nicht per Wortanfang gefunden werden
+TAG_SYNONYMS = {"kind": "famili", "kinder": "famili", "kinderfreundlich": "famili", "pärch": "paar", "zweit": "paar"}
+
+# Wendungen, die wie Tags aussehen, aber keine sind ("ein paar Tipps")
+TAG_FALSE_FRIENDS = re.compile(r"\bein(?:ige)?\s+paar\b", re.IGNORECASE)
+
+RANKING_PATTERN = re.compile(r"\bbeste[nmr]?\b|\btop\b|bestbewertet|höchste[nr]? bewertung|am besten bewertet", re.IGNORECASE)
+# Zahl vor "Sterne" ist eine Sternekategorie, keine Anzahl ("4 Sterne Hotels")
+LIMIT_PATTERN = re.compile(r"\btop\s*(\d{1,2})\b|\b(\d{1,2})\s+(?:(?!sterne)[a-zäöüß]+e[nrs]?\s+)?(?:beste|besten|restaurants?|hotels?|hütten|lokale|unterkünfte|tipps|vorschläge|empfehlungen)\b", re.IGNORECASE)
+LIMIT_WORDS = {"zwei": 2, "drei": 3, "vier": 4, "fünf": 5, "sechs": 6, "sieben": 7, "acht": 8, "neun": 9, "zehn": 10}
+LIMIT_WORD_PATTERN = re.compile(r"\b(" + "|".join(LIMIT_WORDS) + r")\s+(?:(?!sterne)[a-zäöüß]+e[nrs]?\s+)?(?:beste|besten|gute|guten|restaurants?|hotels?|hütten|lokale|unterkünfte|tipps|vorschläge|empfehlungen)\b", re.IGNORECASE)
+MIN_RATING_PATTERN = re.compile(r"(?:bewert|rating|sterne)\D{0,25}?(\d[.,]\d)|(\d[.,]\d)\s*(?:sterne|punkte)?\s*(?:oder|und)\s*(?:mehr|besser|höher)", re.IGNORECASE)
+MIN_STARS_PATTERN = re.compile(r"(\d)\s*-?\s*sterne", re.IGNORECASE)
+CHEAP_PATTERN = re.compile(r"günstig|billig|preiswert|budget|kleine[nm]? geldbeutel", re.IGNORECASE)
+MID_PRICE_PATTERN = re.compile(r"nicht zu teuer|nicht so teuer|(?:höchstens|maximal|max\.?|bis|unter|≤|<=)\s*(?:preiskategorie\s*)?mittel|mittlere[nrs]? preis", re.IGNORECASE)
+UPSCALE_PATTERN = re.compile(r"(?<!nicht )(?<!nicht zu )\b(?:gehoben|luxus|luxuriös|edel|exklusiv|hochpreisig)", re.IGNORECASE)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Füllwörter, die bei der Prüfung auf vollständig erkannte Anfragen nicht zählen
+FILLER_WORDS = frozenset("""
+    ich wir mir uns mich du dir dich ihr euch man bitte mal doch noch auch denn gern gerne
+    zeig zeige zeigt zeigen nenn nenne nennen empfiehl empfiehlst empfehle empfehlen such suche suchen
+    gib gibt geben kennst kennt kannst könnt könntest hast habt hat haben ist sind sein bin
+    möchte möchten würde würden will wollen soll sollte sollten brauche brauchen
+    welche welcher welches welchen welchem wo was wie gibt es
+    ein eine einen einem einer eines der die das den dem des
+    in im an am auf bei beim für mit von vom zu zum zur nach aus um und oder sowie
+    hier dort da alle liste paar einige etwas mindestens höchstens maximal ab bis über unter
+    gut gute guten gutes schön schöne schönen tipp tipps vorschlag vorschläge empfehlung empfehlungen
+    bewertung bewertungen bewertet preis preise preiskategorie sterne sternen mehr besser höher
+    saalbach hinterglemm skicircus region gegend umgebung
+""".split())
+
+# Filter, bei denen eine Anfrage ohne weitere Begriffe direkt aus der Tabelle beantwortet wird
+EXPLICIT_FILTERS = ("tags", "max_price", "min_price", "min_rating", "min_stars")
+
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 20
+
+
+def _tag_key(tag: str) -> str:
+    """Normalisierter Schlüssel eines Tags (z.B. "Familien" -> "famili")."""
+    return " ".join(tokenize(tag))
+
+
+def _split_tags(value: str) -> List[str]:
+    return [tag.strip() for tag in re.split(r",|\bund\b|/|;", value) if tag.strip()]
+
+
+def parse_entry_fields(content: str) -> Dict[str, str]:
+    """
+    Liest die Aufzählungsfelder eines Eintrags.
+
+    Args:
+        content: Text des Eintrags
+
+    Returns:
+        Dictionary Feldname -> Wert (z.B. "Bewertung" -> "4,4 (177 Bewertungen)")
+    """
+    fields = {}
+    for line in content.split("\n"):
+        match = FIELD_PATTERN.match(line)
+        if match and match.group(2):
+            fields.setdefault(match.group(1).strip(), match.group(2))
+    return fields
+
+
+def entry_record(document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Wandelt ein Dokument auf Eintragsebene in eine Tabellenzeile um.
+
+    Args:
+        document: Dokument mit "id", "content" und "metadata" (mit "entry")
+
+    Returns:
+        Die Zeile oder None, wenn das Dokument kein Eintrag mit Feldern ist
+    """
+    metadata = document.get("metadata", {})
+    name = metadata.get("entry")
+    if not name:
+        return None
+    fields = parse_entry_fields(document.get("content", ""))
+    if not fields:
+        return None
+
+    rating = reviews = None
+    match = RATING_PATTERN.search(fields.get("Bewertung", ""))
+    if match:
+        rating = float(match.group(1).replace(",", "."))
+        if match.group(2):
+            reviews = int(match.group(2).replace(".", ""))
+
+    price_label = fields.get("Preiskategorie", "")
+    stars_match = STARS_PATTERN.search(fields.get("Kategorie", ""))
+
+    tags = []
+    for field in TAG_FIELDS:
+        tags.extend(_split_tags(fields.get(field, "")))
+
+    theme = metadata.get("theme", "")
+    return {
+        "doc_id": document.get("id", ""),
+        "name": name,
+        "kind": theme.split("_")[0],
+        "theme": theme,
+        "source_file": metadata.get("source_file", ""),
+        "section": metadata.get("heading", ""),
+        "category": re.sub(r"^\d+\.\s*", "", metadata.get("subheading", "")),
+        "location": fields.get("Ort", "").split(",")[0].strip(),
+        "type": fields.get("Typ", ""),
+        "rating": rating,
+        "review_count": reviews,
+        "price_label": price_label,
+        "price_tier": PRICE_TIERS.get(price_label.strip().lower()),
+        "stars": int(stars_match.group(1)) if stars_match else None,
+        "tags": tags
+    }
+
+
+class EntryTable:
+    """
+    Spaltenorientierte Tabelle über alle Einträge mit Aufzählungsfeldern.
+    Das pandas-DataFrame steht als frame zur Verfügung; Filter und Sortierung
+    laufen direkt auf NumPy-Arrays, damit eine Anfrage nur Mikrosekunden dauert.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], documents: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Baut die Tabelle aus Zeilen (siehe entry_record) auf.
+
+        Args:
+            records: Zeilen der Tabelle
+            documents: Optional, Dokumente der Zeilen nach ID (Kontext für das LLM)
+        """
+        _import_pandas()
+        self.records = records
+        self.documents = documents or {}
+        self.frame = pd.DataFrame.from_records(records, columns=[
+            "doc_id", "name", "kind", "theme", "source_file", "section", "category", "location",
+            "type", "rating", "review_count", "price_label", "price_tier", "stars", "tags"
+        ])
+
+        # Numerische Spalten (fehlende Werte als NaN) und Art als Codes
+        self._rating = self.frame["rating"].to_numpy(dtype=float, na_value=np.nan)
+        self._reviews = self.frame["review_count"].to_numpy(dtype=float, na_value=np.nan)
+        self._price = self.frame["price_tier"].to_numpy(dtype=float, na_value=np.nan)
+        self._stars = self.frame["stars"].to_numpy(dtype=float, na_value=np.nan)
+        self.kinds = sorted(set(self.frame["kind"]))
+        self._kind = np.array([self.kinds.index(kind) for kind in self.frame["kind"]], dtype=np.int16)
+
+        # Tags als boolesche Matrix (Zeile x Tag)
+        self.tag_keys = sorted({_tag_key(tag) for record in records for tag in record["tags"]} - {""})
+        self.tag_labels: Dict[str, str] = {}
+        for record in records:
+            for tag in record["tags"]:
+                self.tag_labels.setdefault(_tag_key(tag), tag)
+        tag_columns = {key: column for column, key in enumerate(self.tag_keys)}
+        self._tags = np.zeros((len(records), len(self.tag_keys)), dtype=bool)
+        for row, record in enumerate(records):
+            for tag in record["tags"]:
+                key = _tag_key(tag)
+                if key in tag_columns:
+                    self._tags[row, tag_columns[key]] = True
+
+        # Orte als Codes (kleingeschrieben)
+        self.locations = sorted({record["location"].lower() for record in records if record["location"]})
+        location_codes = {location: code for code, location in enumerate(self.locations)}
+        self._location = np.array([location_codes.get(record["location"].lower(), -1) for record in records], dtype=np.int32)
+
+        # Kategorien (Unterüberschriften) als Codes
+        self.categories = sorted({record["category"] for record in records if record["category"]})
+        category_codes = {category: code for code, category in enumerate(self.categories)}
+        self._category = np.array([category_codes.get(record["category"], -1) for record in records], dtype=np.int32)
+
+        self._names = [record["name"].lower() for record in records]
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "EntryTable":
+        """
+        Baut die Tabelle aus den Dokumenten der Wissensbasis auf.
+
+        Einträge, die mehrfach in der Wissensbasis stehen (gleiche Art und gleicher Name),
+        werden zu einer Zeile zusammengeführt: Tags werden vereinigt, fehlende Werte aus den
+        weiteren Vorkommen ergänzt. Die Dokumente aller Vorkommen stehen unter "doc_ids".
+
+        Args:
+            documents: Dokumente mit "id", "content" und "metadata"
+
+        Returns:
+            Die Tabelle
+        """
+        records: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        by_id = {}
+        for document in documents:
+            record = entry_record(document)
+            if record is None:
+                continue
+            by_id[record["doc_id"]] = document
+            key = (record["kind"], " ".join(record["name"].lower().split()))
+            existing = records.get(key)
+            if existing is None:
+                record["doc_ids"] = [record["doc_id"]]
+                records[key] = record
+                continue
+            existing["doc_ids"].append(record["doc_id"])
+            for field, value in record.items():
+                if field == "tags":
+                    known = {_tag_key(tag) for tag in existing["tags"]}
+                    existing["tags"] += [tag for tag in value if _tag_key(tag) not in known]
+                elif existing.get(field) in (None, "") and value not in (None, ""):
+                    existing[field] = value
+        return cls(list(records.values()), by_id)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def query(self,
+              kind: Optional[str] = None,
+              tags: Optional[List[str]] = None,
+              max_price: Optional[float] = None,
+              min_price: Optional[float] = None,
+              min_rating: Optional[float] = None,
+              min_reviews: Optional[int] = None,
+              min_stars: Optional[int] = None,
+              location: Optional[str] = None,
+              category: Optional[str] = None,
+              sort_by: str = "rating",
+              limit: Optional[int] = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Filtert und sortiert die Einträge.
+
+        Einträge ohne Wert in einer gefilterten Spalte fallen heraus. Sortiert wird
+        absteigend; bei gleicher Bewertung entscheidet die Anzahl der Bewertungen.
+
+        Args:
+            kind: Optional, Art der Einträge (z.B. "restaurants" oder "unterkuenfte")
+            tags: Optional, Tags, die alle zutreffen müssen (z.B. ["Familien"])
+            max_price: Optional, höchste Preisstufe (siehe PRICE_TIERS, z.B. 2.0 für "Mittel")
+            min_price: Optional, niedrigste Preisstufe
+            min_rating: Optional, Mindestbewertung
+            min_reviews: Optional, Mindestanzahl an Bewertungen
+            min_stars: Optional, Mindestanzahl an Hotelsternen
+            location: Optional, Ort (z.B. "Hinterglemm")
+            category: Optional, Kategorie (z.B. "Almhütten & Hüttenrestaurants")
+            sort_by: "rating", "review_count" oder "stars"
+            limit: Maximale Anzahl an Ergebnissen (None: alle)
+
+        Returns:
+            Die passenden Zeilen, beste zuerst
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+
+        if kind is not None:
+            if kind not in self.kinds:
+                return []
+            mask &= self._kind == self.kinds.index(kind)
+        for tag in tags or []:
+            key = _tag_key(tag)
+            if key not in self.tag_keys:
+                return []
+            mask &= self._tags[:, self.tag_keys.index(key)]
+        # Vergleiche mit NaN sind False, fehlende Werte fallen damit heraus
+        if max_price is not None:
+            mask &= self._price <= max_price
+        if min_price is not None:
+            mask &= self._price >= min_price
+        if min_rating is not None:
+            mask &= self._rating >= min_rating
+        if min_reviews is not None:
+            mask &= self._reviews >= min_reviews
+        if min_stars is not None:
+            mask &= self._stars >= min_stars
+        if location is not None:
+            location = location.lower()
+            if location not in self.locations:
+                return []
+            mask &= self._location == self.locations.index(location)
+        if category is not None:
+            if category not in self.categories:
+                return []
+            mask &= self._category == self.categories.index(category)
+
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return []
+
+        primary = {"rating": self._rating, "review_count": self._reviews, "stars": self._stars}[sort_by]
+        primary = np.nan_to_num(primary[rows], nan=-np.inf)
+        secondary = np.nan_to_num(self._reviews[rows], nan=-np.inf)
+        # lexsort sortiert nach dem letzten Schlüssel zuerst, stabil bei Gleichstand
+        order = np.lexsort((-secondary, -primary))
+        if limit is not None:
+            order = order[:limit]
+        return [self.records[rows[index]] for index in order]
+
+    def mentions_entry(self, query: str) -> bool:
+        """Prüft, ob eine Anfrage einen konkreten Eintrag beim Namen nennt."""
+        query = query.lower()
+        return any(len(name) > 3 and name in query for name in self._names)
+
+
+def _overlaps(span: Tuple[int, int], spans: List[Tuple[int, int]]) -> bool:
+    return any(start < span[1] and span[0] < end for start, end in spans)
+
+
+def _parse_entry_query(query: str, table: EntryTable) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    Erkennt die Filter einer Anfrage und merkt sich, welche Wörter dabei verbraucht wurden.
+
+    Args:
+        query: Die Benutzeranfrage
+        table: Die Eintragstabelle
+
+    Returns:
+        Argumente für EntryTable.query (oder None) und die übrigen Begriffe der Anfrage
+    """
+    kinds = [kind for kind, pattern in KIND_PATTERNS.items() if pattern.search(query)]
+    if len(kinds) != 1 or table.mentions_entry(query):
+        return None, []
+
+    spec: Dict[str, Any] = {"kind": kinds[0]}
+    # Zeichenbereiche der Anfrage, die als Art, Filter oder Rangfolge erkannt wurden
+    spans = [match.span() for match in KIND_PATTERNS[kinds[0]].finditer(query)]
+    ignored = [match.span() for match in TAG_FALSE_FRIENDS.finditer(query)]
+    words = [(match.span(), match.group().lower()) for match in WORD_PATTERN.finditer(query)]
+
+    for prefix, pattern in CATEGORY_PATTERNS.items():
+        categories = [category for category in table.categories if category.lower().startswith(prefix)]
+        matches = list(pattern.finditer(query))
+        if matches and len(categories) == 1:
+            spec["category"] = categories[0]
+            spans.extend(match.span() for match in matches)
+            break
+
+    # Tags über den Wortanfang der normalisierten Begriffe finden
+    tags = []
+    for span, word in words:
+        if _overlaps(span, ignored):
+            continue
+        token = normalize_token(word)
+        candidates = [TAG_SYNONYMS[token]] if token in TAG_SYNONYMS else [
+            key for key in table.tag_keys if len(key) >= 4 and token.startswith(key)
+        ]
+        for key in candidates:
+            if key in table.tag_keys:
+                spans.append(span)
+                if table.tag_labels[key] not in tags:
+                    tags.append(table.tag_labels[key])
+    if tags:
+        spec["tags"] = tags
+
+    price_match = CHEAP_PATTERN.search(query)
+    if price_match:
+        spec["max_price"] = PRICE_TIERS["günstig bis mittel"]
+    else:
+        price_match = MID_PRICE_PATTERN.search(query)
+        if price_match:
+            spec["max_price"] = PRICE_TIERS["mittel"]
+        else:
+            price_match = UPSCALE_PATTERN.search(query)
+            if price_match:
+                spec["min_price"] = PRICE_TIERS["gehoben"]
+    if price_match:
+        spans.append(price_match.span())
+
+    match = MIN_RATING_PATTERN.search(query)
+    if match:
+        spec["min_rating"] = float((match.group(1) or match.group(2)).replace(",", "."))
+        spans.append(match.span())
+    else:
+        stars = MIN_STARS_PATTERN.search(query)
+        if stars:
+            spec["min_stars"] = int(stars.group(1))
+            spec["sort_by"] = "stars"
+            spans.append(stars.span())
+
+    for span, word in words:
+        if normalize_token(word) in table.locations:
+            spec["location"] = normalize_token(word)
+            spans.append(span)
+            break
+
+    limit_match = LIMIT_PATTERN.search(query)
+    word_match = LIMIT_WORD_PATTERN.search(query)
+    if limit_match:
+        spec["limit"] = min(MAX_LIMIT, int(limit_match.group(1) or limit_match.group(2)))
+        spans.append(limit_match.span())
+    elif word_match:
+        spec["limit"] = LIMIT_WORDS[word_match.group(1).lower()]
+        spans.append(word_match.span())
+
+    ranking = [match.span() for match in RANKING_PATTERN.finditer(query)]
+    spans.extend(ranking)
+
+    if not set(EXPLICIT_FILTERS).intersection(spec) and not ranking and "limit" not in spec:
+        return None, []
+
+    remaining = [
+        word for span, word in words
+        if not _overlaps(span, spans + ignored) and word not in FILLER_WORDS and not word.isdigit()
+    ]
+    return spec, remaining
+
+
+def parse_entry_query(query: str, table: EntryTable) -> Optional[Dict[str, Any]]:
+    """
+    Erkennt strukturierte Anfragen (Art plus Filter oder Rangfolge).
+
+    Die Erkennung ist bewusst zurückhaltend: Ohne eindeutige Art, ohne Filter
+    oder bei Fragen zu einem bestimmten Eintrag wird None geliefert und die
+    Anfrage normal über Retrieval und LLM beantwortet.
+
+    Args:
+        query: Die Benutzeranfrage
+        table: Die Eintragstabelle (liefert die bekannten Tags, Orte und Kategorien)
+
+    Returns:
+        Argumente für EntryTable.query oder None
+    """
+    return _parse_entry_query(query, table)[0]
+
+
+def format_entry_answer(rows: List[Dict[str, Any]], spec: Dict[str, Any]) -> str:
+    """
+    Formuliert die Antwort auf eine strukturierte Anfrage im Ton des Chatbots.
+
+    Args:
+        rows: Ergebnis von EntryTable.query
+        spec: Die erkannte Anfrage
+
+    Returns:
+        Die Antwort als Markdown
+    """
+    label = spec.get("category") or KIND_LABELS.get(spec.get("kind"), "Einträge")
+    criteria = []
+    if spec.get("tags"):
+        criteria.append("Eignung: " + ", ".join(spec["tags"]))
+    if spec.get("max_price") is not None:
+        criteria.append("Preiskategorie höchstens " + ("Günstig bis Mittel" if spec["max_price"] < 2 else "Mittel"))
+    if spec.get("min_price") is not None:
+        criteria.append("gehobene Preisklasse")
+    if spec.get("min_rating") is not None:
+        criteria.append(f"Bewertung ab {spec['min_rating']:.1f}".replace(".", ","))
+    if spec.get("min_stars") is not None:
+        criteria.append(f"ab {spec['min_stars']} Sternen")
+    if spec.get("location"):
+        criteria.append(f"in {spec['location'].title()}")
+
+    intro = f"Servus! Hier sind meine Top {len(rows)} bei den {label}" if len(rows) > 1 else f"Servus! Hier ist mein Tipp bei den {label}"
+    lines = [intro + (f" ({'; '.join(criteria)})" if criteria else "") + ": 😊", ""]
+
+    for position, row in enumerate(rows, start=1):
+        details = []
+        if row["rating"] is not None:
+            rating = f"⭐ {row['rating']:.1f}".replace(".", ",")
+            if row["review_count"] is not None:
+                rating += f" ({row['review_count']} Bewertungen)"
+            details.append(rating)
+        if row["stars"] is not None:
+            details.append(f"{row['stars']} Sterne")
+        if row["price_label"]:
+            details.append(f"Preiskategorie: {row['price_label']}")
+        if row["tags"]:
+            details.append("ideal für " + ", ".join(row["tags"]))
+        where = row["location"] or row["category"]
+        lines.append(f"{position}. **{row['name']}**" + (f" – {where}" if where else ""))
+        if details:
+            lines.append(f"   {' · '.join(details)}")
+
+    lines += ["", "Magst du zu einem davon mehr wissen? Frag einfach nach! 🏔️"]
+    return "\n".join(lines)
+
+
+def lookup_entry_query(table: Optional[EntryTable], query: str) -> Optional[Dict[str, Any]]:
+    """
+    Sucht die passenden Einträge einer strukturierten Anfrage in der Eintragstabelle.
+
+    Eine fertige Antwort gibt es nur, wenn die Anfrage mindestens einen echten Filter
+    (Eignung, Preis, Bewertung, Sterne) enthält und jedes inhaltliche Wort als Filter
+    erkannt wurde. Fragen wie "Welche Hütte hat den besten Kaiserschmarrn?" liefern nur
+    die passenden Einträge, die dann als Kontext an das LLM gehen.
+
+    Args:
+        table: Die Eintragstabelle (None: keine strukturierten Anfragen)
+        query: Die Benutzeranfrage
+
+    Returns:
+        Dictionary mit "spec", "rows", "documents" (Dokumente der Zeilen) und "answer"
+        (None, wenn die Anfrage nicht vollständig erkannt wurde) oder None ohne Treffer
+    """
+    if table is None or not len(table):
+        return None
+    spec, remaining = _parse_entry_query(query, table)
+    if spec is None:
+        return None
+    rows = table.query(**{"limit": DEFAULT_LIMIT, **spec})
+    if not rows:
+        return None
+
+    complete = not remaining and bool(set(EXPLICIT_FILTERS).intersection(spec))
+    return {
+        "spec": spec,
+        "rows": rows,
+        "documents": [
+            table.documents[doc_id] for row in rows
+            for doc_id in row.get("doc_ids", [row["doc_id"]]) if doc_id in table.documents
+        ],
+        "answer": format_entry_answer(rows, spec) if complete else None
+    }
+
+
+def answer_structured_query(table: Optional[EntryTable], query: str) -> Optional[str]:
+    """
+    Beantwortet eine strukturierte Anfrage direkt aus der Eintragstabelle.
+
+    Args:
+        table: Die Eintragstabelle (None: keine strukturierten Antworten)
+        query: Die Benutzeranfrage
+
+    Returns:
+        Die Antwort oder None, wenn die Anfrage nicht vollständig strukturiert ist oder nichts passt
+    """
+    lookup = lookup_entry_query(table, query)
+    return lookup["answer"] if lookup is not None else None
@@ -0,0 +1,209 @@
+"""
+Verdichtung des Chat-Verlaufs für den Saalbach Tourismus Chatbot.
+Ältere Gesprächsrunden werden fortlaufend zu einer Zusammenfassung verdichtet,
+nur die letzten Runden gehen wörtlich an das LLM. Damit bleibt die Prompt-Größe
+auch bei langen Gesprächen konstant.
+"""
+
+import re
+import hashlib
+import threading
+from typing import List, Dict, Optional, Callable
+
+from modules.context_packer import count_tokens, truncate_to_tokens
+
+DEFAULT_KEEP_RECENT_TURNS = 2
+DEFAULT_HISTORY_TOKEN_BUDGET = 800
+DEFAULT_SUMMARY_TOKEN_BUDGET = 250
+
+SUMMARY_PREFIX = "Zusammenfassung des bisherigen Gesprächs: "
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def _fingerprint(message: Dict[str, str]) -> str:
+    return hashlib.sha1(f"{message['role']}\x1f{message['content']}".encode('utf-8')).hexdigest()
+
+
+def extractive_summary(messages: List[Dict[str, str]], max_chars_per_message: int = 160) -> str:
+    """
+    Erstellt lokal eine knappe Zusammenfassung aus dem ersten Satz jeder Nachricht.
+    Dient als Fallback, wenn keine LLM-Zusammenfassung verfügbar ist.
+
+    Args:
+        messages: Die zusammenzufassenden Nachrichten
+        max_chars_per_message: Maximale Zeichen je Nachricht
+
+    Returns:
+        Die Zusammenfassung
+    """
+    lines = []
+    for message in messages:
+        text = " ".join(message["content"].split())
+        first_sentence = _SENTENCE_END.split(text, maxsplit=1)[0][:max_chars_per_message]
+        speaker = "Gast" if message["role"] == "user" else "Assistent"
+        lines.append(f"{speaker}: {first_sentence}")
+    return " | ".join(lines)
+
+
+class HistoryCompactor:
+    """
+    Hält pro Session eine laufende Zusammenfassung älterer Gesprächsrunden.
+    Die Zusammenfassung wird nach jeder Antwort im Hintergrund inkrementell
+    erweitert, sodass die nächste Anfrage nicht auf das LLM warten muss.
+    """
+
+    def __init__(self,
+                 summarize_fn: Optional[Callable[[str, List[Dict[str, str]]], str]] = None,
+                 keep_recent_turns: int = DEFAULT_KEEP_RECENT_TURNS,
+                 history_token_budget: int = DEFAULT_HISTORY_TOKEN_BUDGET,
+                 summary_token_budget: int = DEFAULT_SUMMARY_TOKEN_BUDGET,
+                 model: str = "gpt-3.5-turbo"):
+        """
+        Initialisiert den Compactor.
+
+        Args:
+            summarize_fn: Optional, Funktion (bisherige Zusammenfassung, neue Nachrichten) -> neue Zusammenfassung
+            keep_recent_turns: Anzahl der letzten Runden (Gast + Antwort), die wörtlich bleiben
+            history_token_budget: Maximale Tokens für Zusammenfassung und Verlauf zusammen
+            summary_token_budget: Maximale Tokens der Zusammenfassung
+            model: Name des OpenAI-Modells (für die Token-Zählung)
+        """
+        self.summarize_fn = summarize_fn
+        self.keep_recent_messages = keep_recent_turns * 2
+        self.history_token_budget = history_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.model = model
+
+        self._lock = threading.Lock()
+        self._summary = ""
+        self._summarized_tail: Optional[str] = None
+        self._worker: Optional[threading.Thread] = None
+
+    def _split(self, chat_history: List[Dict[str, str]]):
+        """
+        Teilt den Verlauf in bereits zusammengefasste, noch offene und wörtliche Nachrichten.
+        (Lock muss gehalten werden.)
+
+        Returns:
+            Tuple (offene ältere Nachrichten, wörtliche Nachrichten)
+        """
+        cutoff = max(0, len(chat_history) - self.keep_recent_messages)
+        older = chat_history[:cutoff]
+        recent = chat_history[cutoff:]
+
+        # Position der zuletzt zusammengefassten Nachricht suchen
+        start = 0
+        if self._summarized_tail is not None:
+            for index in range(len(older) - 1, -1, -1):
+                if _fingerprint(older[index]) == self._summarized_tail:
+                    start = index + 1
+                    break
+
+        return older[start:], recent
+
+    def compact(self, chat_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Liefert den zu sendenden Verlauf: Zusammenfassung plus die letzten Runden wörtlich,
+        begrenzt auf das Token-Budget.
+
+        Args:
+            chat_history: Der vollständige bisherige Chat-Verlauf
+
+        Returns:
+            Nachrichten für das LLM
+        """
+        if not chat_history:
+            return []
+
+        with self._lock:
+            pending, recent = self._split(chat_history)
+            summary = self._summary
+
+        # Noch nicht verdichtete ältere Nachrichten lokal und ohne LLM zusammenfassen
+        if pending:
+            gap = extractive_summary(pending)
+            summary = f"{summary} | {gap}" if summary else gap
+
+        messages: List[Dict[str, str]] = []
+        used = 0
+        if summary:
+            summary = truncate_to_tokens(summary, self.summary_token_budget, self.model)
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + summary})
+            used += count_tokens(messages[0]["content"], self.model)
+
+        # Wörtliche Nachrichten von hinten einpacken, lange Antworten kürzen
+        kept: List[Dict[str, str]] = []
+        per_message_cap = max(1, (self.history_token_budget - used) // max(1, len(recent)))
+        for message in reversed(recent):
+            remaining = self.history_token_budget - used
+            if remaining <= 0:
+                break
+            content = truncate_to_tokens(message["content"], min(per_message_cap, remaining), self.model)
+            kept.append({"role": message["role"], "content": content})
+            used += count_tokens(content, self.model)
+        kept.reverse()
+
+        return messages + kept
+
+    def schedule_update(self, chat_history: List[Dict[str, str]]) -> None:
+        """
+        Verdichtet im Hintergrund alle Nachrichten, die aus dem wörtlichen Fenster gefallen sind.
+        Läuft bereits eine Verdichtung, wird die nächste Runde sie nachholen.
+
+        Args:
+            chat_history: Der vollständige Chat-Verlauf inklusive der letzten Antwort
+        """
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            pending, _ = self._split(chat_history)
+            if not pending:
+                return
+            previous_summary = self._summary
+            self._worker = threading.Thread(
+                target=self._update,
+                args=(previous_summary, list(pending)),
+                daemon=True
+            )
+            self._worker.start()
+
+    def _update(self, previous_summary: str, pending: List[Dict[str, str]]) -> None:
+        """Erweitert die Zusammenfassung um die offenen Nachrichten (läuft im Hintergrund-Thread)."""
+        summary = None
+        if self.summarize_fn is not None:
+            try:
+                summary = self.summarize_fn(previous_summary, pending)
+            except Exception as e:
+                print(f"Fehler bei der Verdichtung des Chat-Verlaufs: {str(e)}")
+
+        if not summary:
+            gap = extractive_summary(pending)
+            summary = f"{previous_summary} | {gap}" if previous_summary else gap
+
+        summary = truncate_to_tokens(summary.strip(), self.summary_token_budget, self.model)
+
+        with self._lock:
+            self._summary = summary
+            self._summarized_tail = _fingerprint(pending[-1])
+
+    def wait(self, timeout: float = None) -> None:
+        """
+        Wartet auf eine laufende Hintergrund-Verdichtung.
+
+        Args:
+            timeout: Optional, maximale Wartezeit in Sekunden
+        """
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def get_summary(self) -> str:
+        """
+        Gibt die aktuelle Zusammenfassung zurück.
+
+        Returns:
+            Die Zusammenfassung (leer, solange nichts verdichtet wurde)
+        """
+        with self._lock:
+            return self._summary
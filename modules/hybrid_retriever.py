@@ -0,0 +1,200 @@
+"""
+Hybride Suche für den Saalbach Tourismus Chatbot.
+Führt die BM25-Stichwortsuche und die Vektorsuche in ChromaDB parallel aus und
+kombiniert beide Ranglisten mit Reciprocal Rank Fusion. Die Stichwortsuche läuft im
+aufrufenden Thread, nur die Vektorsuche in einem eigenen, begrenzten Thread-Pool. Fällt
+ein Zweig aus oder ist die Vektorsuche zu langsam, wird mit dem verfügbaren Zweig
+weitergearbeitet. Beide Zweige lassen
+sich auf einzelne Themen beschränken (Partitionen des Index bzw. where-Filter in ChromaDB).
+"""
+
+import time
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Callable
+
+from modules.telemetry import span
+from modules.theme_router import theme_filter
+
+# Konstante k der Reciprocal Rank Fusion (Standardwert aus der Literatur)
+RRF_K = 60
+
+DEFAULT_LEG_TIMEOUT = 1.5
+
+# Gemeinsamer Thread-Pool für die Vektorsuche aller Sessions. Hängende Vektorsuchen
+# belegen höchstens diese Threads; die Stichwortsuche ist davon nie betroffen.
+VECTOR_SEARCH_WORKERS = 8
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=VECTOR_SEARCH_WORKERS, thread_name_prefix="vector-search")
+        return _executor
+
+
+def _fusion_key(doc: Dict[str, Any]) -> str:
+    """
+    Schlüssel, über den Treffer beider Zweige zusammengeführt werden.
+    Identischer Text gilt als derselbe Treffer, auch wenn die IDs verschieden sind.
+    """
+    normalized = " ".join(doc.get("content", "").split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def chroma_results_to_documents(results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Wandelt ein Chroma-Suchergebnis (eine Anfrage) in Dokumente im Format der Wissensbasis um.
+
+    Args:
+        results: Ergebnis von ChromaManager.search
+
+    Returns:
+        Liste von Dokumenten mit "id", "content" und "metadata"
+    """
+    documents = (results.get("documents") or [[]])[0]
+    metadatas = (results.get("metadatas") or [[]])[0]
+    ids = (results.get("ids") or [[]])[0]
+
+    converted = []
+    for index, text in enumerate(documents):
+        metadata = dict(metadatas[index]) if index < len(metadatas) and metadatas[index] else {}
+        metadata.setdefault("theme", "Unbekannt")
+        metadata.setdefault("source_file", "")
+        metadata.setdefault("heading", "")
+        metadata.setdefault("subheading", "")
+        metadata.setdefault("entry", "")
+        converted.append({
+            "id": ids[index] if index < len(ids) else _fusion_key({"content": text}),
+            "content": text,
+            "metadata": metadata
+        })
+    return converted
+
+
+class HybridRetriever:
+    """
+    Kombiniert Stichwort- und Vektorsuche.
+    Die Vektorsuche läuft mit Timeout im Hintergrund, während die Stichwortsuche im
+    aufrufenden Thread arbeitet; die Ranglisten werden mit Reciprocal Rank Fusion zusammengeführt.
+    """
+
+    def __init__(self,
+                 keyword_search: Callable[[str, int, Optional[List[str]]], List[Dict[str, Any]]],
+                 chroma_manager: Any = None,
+                 leg_timeout: float = DEFAULT_LEG_TIMEOUT,
+                 candidate_factor: int = 2):
+        """
+        Initialisiert den hybriden Retriever.
+
+        Args:
+            keyword_search: Funktion (Anfrage, Anzahl, Themen) -> Dokumente, z.B. SimpleRAG._simple_search
+            chroma_manager: Optional, ChromaManager für die Vektorsuche
+            leg_timeout: Maximale Wartezeit auf die Vektorsuche in Sekunden
+            candidate_factor: Jeder Zweig liefert n_results * candidate_factor Kandidaten
+        """
+        self.keyword_search = keyword_search
+        self.chroma_manager = chroma_manager
+        self.leg_timeout = leg_timeout
+        self.candidate_factor = candidate_factor
+
+    @property
+    def vector_search_available(self) -> bool:
+        return self.chroma_manager is not None and getattr(self.chroma_manager, "is_functional", False)
+
+    def _keyword_search(self,
+                        query: str,
+                        n_results: int,
+                        themes: Optional[List[str]] = None,
+                        keyword_search: Optional[Callable[..., List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        with span("keyword_search") as leg_span:
+            results = (keyword_search or self.keyword_search)(query, n_results, themes)
+            leg_span.set(results=len(results))
+        return results
+
+    def _vector_search(self, query: str, n_results: int, themes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        with span("vector_search") as leg_span:
+            results = chroma_results_to_documents(
+                self.chroma_manager.search(query, n_results=n_results, filter_criteria=theme_filter(themes))
+            )
+            leg_span.set(results=len(results))
+        return results
+
+    def search(self,
+               query: str,
+               n_results: int = 3,
+               themes: Optional[List[str]] = None,
+               keyword_search: Optional[Callable[..., List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """
+        Durchsucht beide Zweige parallel und liefert die fusionierte Rangliste.
+        Die Wartezeit auf die Vektorsuche zählt ab ihrem Start, die Stichwortsuche läuft währenddessen.
+
+        Args:
+            query: Die Suchanfrage
+            n_results: Anzahl der zurückzugebenden Ergebnisse
+            themes: Optional, Suche auf diese Themen beschränken (z.B. vom ThemeRouter)
+            keyword_search: Optional, Stichwortsuche für diese Anfrage (Standard: die des Retrievers)
+
+        Returns:
+            Liste der relevantesten Dokumente
+        """
+        candidates = n_results * self.candidate_factor
+
+        if not self.vector_search_available:
+            return self._keyword_search(query, n_results, themes, keyword_search)
+
+        # Der Vektorzweig bekommt eine Kopie des Kontexts, damit seine Spans im Trace der Anfrage landen
+        vector_future = _get_executor().submit(
+            contextvars.copy_context().run, self._vector_search, query, candidates, themes
+        )
+        deadline = time.perf_counter() + self.leg_timeout
+
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            results["keyword"] = self._keyword_search(query, candidates, themes, keyword_search)
+        except Exception as e:
+            print(f"Suchzweig 'keyword' fehlgeschlagen: {str(e)}")
+
+        try:
+            results["vector"] = vector_future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            # Der Zweig läuft im Pool zu Ende, sein Ergebnis wird verworfen
+            print(f"Suchzweig 'vector' nach {self.leg_timeout}s abgebrochen.")
+        except Exception as e:
+            print(f"Suchzweig 'vector' fehlgeschlagen: {str(e)}")
+
+        # Feste Reihenfolge der Zweige, damit Gleichstände stabil aufgelöst werden
+        rankings = [results[leg] for leg in ("keyword", "vector") if leg in results]
+        return self.fuse(rankings, n_results)
+
+    @staticmethod
+    def fuse(rankings: List[List[Dict[str, Any]]], n_results: int) -> List[Dict[str, Any]]:
+        """
+        Führt mehrere Ranglisten mit Reciprocal Rank Fusion zusammen.
+
+        Args:
+            rankings: Ranglisten der einzelnen Zweige
+            n_results: Anzahl der zurückzugebenden Ergebnisse
+
+        Returns:
+            Die fusionierte Rangliste
+        """
+        scores: Dict[str, float] = {}
+        first_seen: Dict[str, int] = {}
+        documents: Dict[str, Dict[str, Any]] = {}
+
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking):
+                key = _fusion_key(doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+                if key not in documents:
+                    documents[key] = doc
+                    first_seen[key] = len(first_seen)
+
+        ordered = sorted(scores, key=lambda key: (-scores[key], first_seen[key]))
+        return [documents[key] for key in ordered[:n_results]]
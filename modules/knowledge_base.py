@@ -6,10 +6,167 @@ Streamlit Cloud-kompatibel mit verbesserter Fehlerbehandlung.
 
 import os
 import re
+import json
+import queue
 import tempfile
+import multiprocessing
+import threading
+import contextvars
 import streamlit as st
-from typing import List, Dict, Any, Tuple, Optional, Union
-from modules.chroma_manager import ChromaManager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Tuple, Optional, Union, Callable, Iterator
+from modules.chroma_manager import ChromaManager, get_shared_chroma_manager, COLLECTION_NAME
+from modules.markdown_chunker import iter_markdown_chunks, chunk_markdown_file, DEFAULT_MAX_CHUNK_SIZE
+from modules.corpus import ParsedCorpus, make_chunk_id, parse_markdown_file
+from modules.telemetry import span
+from modules.resources import shared_resources
+
+DEFAULT_KNOWLEDGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge")
+
+# Manifest der importierten Chunks je Datei (liegt neben der ChromaDB)
+MANIFEST_FILE_NAME = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+# Zähler je Datei und Thema (klein, ohne Chunk-IDs; wird mit dem Manifest fortgeschrieben)
+STATISTICS_FILE_NAME = "knowledge_stats.json"
+STATISTICS_VERSION = 1
+
+# Import-Pipeline: Chunks je Embedding-Batch (guter Durchsatz für Sentence-Transformers
+# auf der CPU) und Anzahl der Batches, die zwischen Chunking und Embedding warten dürfen
+DEFAULT_EMBED_BATCH_SIZE = 64
+DEFAULT_QUEUE_BATCHES = 4
+MIN_FILES_FOR_PROCESS_POOL = 2
+
+# Fortschritt: Funktion (Zähler wie files_done, files_total, chunks_written)
+ProgressCallback = Callable[[Dict[str, int]], None]
+
+
+def collection_file_path(chroma_manager: ChromaManager, file_name: str) -> str:
+    """
+    Pfad einer Begleitdatei (Manifest, Statistik) zur Collection eines ChromaManagers.
+    Die Standard-Collection verwendet den bisherigen Dateinamen, Collections anderer
+    Embedding-Backends eigene Dateien mit ihrem Namen als Präfix.
+    
+    Args:
+        chroma_manager: Der ChromaManager
+        file_name: Name der Begleitdatei
+        
+    Returns:
+        Der Pfad der Datei neben der ChromaDB
+    """
+    if chroma_manager.collection_name != COLLECTION_NAME:
+        file_name = f"{chroma_manager.collection_name}.{file_name}"
+    return os.path.join(chroma_manager.db_directory, file_name)
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    """
+    Schreibt JSON atomar: erst eine eindeutige temporäre Datei im Zielverzeichnis, dann umbenennen.
+    
+    Args:
+        path: Zielpfad
+        data: Zu schreibende Daten
+    """
+    file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def split_markdown_into_chunks(content: str, max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Teilt einen Markdown-Text in sinnvolle Chunks für die Vektordatenbank (ein Chunk je ###-Eintrag).
+    
+    Args:
+        content: Der Markdown-Inhalt
+        max_chunk_size: Maximale Anzahl an Zeichen pro Chunk
+        
+    Returns:
+        Liste von Tuples (chunk_text, metadata)
+    """
+    return [
+        (chunk["text"], {"heading": chunk["heading"], "subheading": chunk["subheading"], "entry": chunk["entry"]})
+        for chunk in iter_markdown_chunks(content.split('\n'), max_chunk_size)
+    ]
+
+
+def documents_to_prepared(file_path: str, version: str, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Wandelt die Dokumente einer Datei in das Format der Import-Pipeline um.
+    
+    Args:
+        file_path: Pfad zur Markdown-Datei
+        version: Inhalts-Hash der Datei
+        documents: Dokumente der Datei ("id", "content", "metadata")
+        
+    Returns:
+        Dictionary mit file_name, file_hash, texts, metadatas und ids
+    """
+    return {
+        "file_name": os.path.basename(file_path),
+        "file_path": file_path,
+        "file_hash": version,
+        "texts": [doc["content"] for doc in documents],
+        "metadatas": [dict(doc["metadata"]) for doc in documents],
+        "ids": [doc["id"] for doc in documents]
+    }
+
+
+def prepare_markdown_file(file_path: str, max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Liest eine Markdown-Datei und bereitet ihre Chunks für ChromaDB vor (Texte,
+    Metadaten, Chunk-IDs). Modulfunktion, damit sie in einem Prozesspool laufen kann.
+    
+    Args:
+        file_path: Pfad zur Markdown-Datei
+        max_chunk_size: Maximale Anzahl an Zeichen pro Chunk
+        
+    Returns:
+        Dictionary mit file_name, file_hash, texts, metadatas und ids
+        (bei Fehlern mit "error" und leeren Listen)
+    """
+    try:
+        parsed = parse_markdown_file(file_path, max_chunk_size)
+    except Exception as e:
+        return {"file_name": os.path.basename(file_path), "file_path": file_path,
+                "texts": [], "metadatas": [], "ids": [], "error": str(e)}
+    return documents_to_prepared(file_path, parsed["version"], parsed["documents"])
+
+
+def file_theme(file_name: str) -> str:
+    """
+    Thema einer Wissensdatei (Dateiname ohne Endung, wie im Metadatum "theme").
+    
+    Args:
+        file_name: Name der Datei
+        
+    Returns:
+        Das Thema
+    """
+    return os.path.splitext(file_name)[0]
+
+
+class _ImportJob:
+    """
+    Zustand einer Datei in der Import-Pipeline (noch ausstehende Chunks, Fehler).
+    Ohne file_hash wird das Manifest beim Abschluss nicht fortgeschrieben.
+    """
+    
+    __slots__ = ("file_name", "file_hash", "ids", "stale_ids", "pending", "failed")
+    
+    def __init__(self, file_name: str, file_hash: Optional[str], ids: List[str], stale_ids: List[str], pending: int):
+        self.file_name = file_name
+        self.file_hash = file_hash
+        self.ids = ids
+        self.stale_ids = stale_ids
+        self.pending = pending
+        self.failed = False
+
 
 class KnowledgeBase:
     """
@@ -17,21 +174,26 @@ class KnowledgeBase:
     Lädt Markdown-Dateien und speichert sie in ChromaDB.
     """
     
-    def __init__(self, knowledge_dir: str = None):
+    def __init__(self, knowledge_dir: str = None, chroma_manager: Optional[ChromaManager] = None):
         """
         Initialisiert die Wissensbasis.
         
         Args:
             knowledge_dir: Verzeichnis mit den Markdown-Wissensquellen
+            chroma_manager: Optional, vorhandener ChromaManager (Standard: der gemeinsame ChromaManager)
         """
+        # Schützt Manifest und Fortschritt während eines parallelen Imports
+        self._import_lock = threading.Lock()
+        # Serialisiert Import, Aktualisierung und Löschen (Watcher und Sessions teilen sich die Instanz)
+        self._write_lock = threading.RLock()
+        
         try:
             # Prüfen, ob wir in Streamlit Cloud sind
             self.using_streamlit_cloud = "STREAMLIT_SHARING" in os.environ or "STREAMLIT_RUN_TARGET" in os.environ
             
             # Standard-Verzeichnis, wenn nicht angegeben
             if knowledge_dir is None:
-                project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                knowledge_dir = os.path.join(project_root, "knowledge")
+                knowledge_dir = DEFAULT_KNOWLEDGE_DIR
             
             self.knowledge_dir = knowledge_dir
             
@@ -46,7 +208,13 @@ class KnowledgeBase:
                     print(f"Verwende alternatives Wissensverzeichnis: {alt_knowledge_dir}")
             
             # ChromaDB Manager initialisieren
-            self.chroma_manager = ChromaManager()
+            self.chroma_manager = chroma_manager if chroma_manager is not None else get_shared_chroma_manager()
+            
+            # Manifest der bereits importierten Chunks und Zähler je Datei/Thema laden
+            self.manifest_path = collection_file_path(self.chroma_manager, MANIFEST_FILE_NAME)
+            self.manifest = self._load_manifest()
+            self.statistics_path = collection_file_path(self.chroma_manager, STATISTICS_FILE_NAME)
+            self.statistics = self._load_statistics()
             
             # Vorhandene Wissensdateien auflisten
             self.available_files = self._list_knowledge_files()
@@ -59,6 +227,104 @@ class KnowledgeBase:
             print(traceback.format_exc())
             self.knowledge_dir = None
             self.available_files = []
+            self.manifest_path = None
+            self.manifest = {}
+            self.statistics_path = None
+            self.statistics = {"files": {}, "themes": {}, "total_documents": 0}
+    
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Lädt das Manifest der importierten Chunks (Dateiname -> Datei-Hash und Chunk-IDs).
+        Ist die Collection leer (z.B. neue Datenbank), wird das Manifest verworfen.
+        
+        Returns:
+            Das Manifest
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}
+        
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get("version") != MANIFEST_VERSION:
+                return {}
+            files = data.get("files", {})
+            if files and self.chroma_manager.is_functional and self.chroma_manager.get_document_count() == 0:
+                print("Collection ist leer, Import-Manifest wird verworfen.")
+                return {}
+            return files
+        except Exception as e:
+            print(f"Fehler beim Laden des Import-Manifests: {str(e)}")
+            return {}
+    
+    def _save_manifest(self) -> None:
+        """Speichert Manifest und Statistik atomar (erst temporäre Datei, dann umbenennen)."""
+        try:
+            write_json_atomic(self.manifest_path, {"version": MANIFEST_VERSION, "files": self.manifest})
+        except Exception as e:
+            print(f"Fehler beim Speichern des Import-Manifests: {str(e)}")
+        
+        try:
+            write_json_atomic(self.statistics_path, {"version": STATISTICS_VERSION, **self.statistics})
+        except Exception as e:
+            print(f"Fehler beim Speichern der Wissensbasis-Statistik: {str(e)}")
+    
+    def _load_statistics(self) -> Dict[str, Any]:
+        """
+        Lädt die Zähler je Datei und Thema. Passen sie nicht zum Manifest (fehlende Datei,
+        ältere Version, verworfenes Manifest), werden sie einmalig aus dem Manifest berechnet.
+        
+        Returns:
+            Dictionary mit "files" (Datei -> Thema, Dokumente), "themes" (Thema -> Dokumente)
+            und "total_documents"
+        """
+        try:
+            if os.path.exists(self.statistics_path):
+                with open(self.statistics_path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                expected = {name: len(entry["chunks"]) for name, entry in self.manifest.items() if entry["chunks"]}
+                counted = {name: entry["documents"] for name, entry in data.get("files", {}).items()}
+                if data.get("version") == STATISTICS_VERSION and counted == expected:
+                    return {"files": data["files"], "themes": data["themes"], "total_documents": data["total_documents"]}
+        except Exception as e:
+            print(f"Fehler beim Laden der Wissensbasis-Statistik: {str(e)}")
+        
+        self.statistics = {"files": {}, "themes": {}, "total_documents": 0}
+        for file_name, entry in self.manifest.items():
+            self._count_file(file_name, len(entry["chunks"]))
+        return self.statistics
+    
+    def _count_file(self, file_name: str, documents: Optional[int]) -> None:
+        """
+        Schreibt die Zähler einer Datei fort (alter Stand wird abgezogen, neuer addiert).
+        
+        Args:
+            file_name: Name der Datei
+            documents: Aktuelle Anzahl der Chunks oder None, wenn die Datei entfernt wurde
+        """
+        files, themes = self.statistics["files"], self.statistics["themes"]
+        previous = files.pop(file_name, None)
+        if previous is not None:
+            themes[previous["theme"]] -= previous["documents"]
+            self.statistics["total_documents"] -= previous["documents"]
+            if themes[previous["theme"]] <= 0:
+                del themes[previous["theme"]]
+        
+        if documents:
+            theme = file_theme(file_name)
+            files[file_name] = {"theme": theme, "documents": documents}
+            themes[theme] = themes.get(theme, 0) + documents
+            self.statistics["total_documents"] += documents
+    
+    def _set_manifest_entry(self, file_name: str, file_hash: str, chunk_ids: List[str]) -> None:
+        """Trägt den Import einer Datei ins Manifest ein und schreibt die Zähler fort."""
+        self.manifest[file_name] = {"file_hash": file_hash, "chunks": chunk_ids}
+        self._count_file(file_name, len(chunk_ids))
+    
+    def _remove_manifest_entry(self, file_name: str) -> Optional[Dict[str, Any]]:
+        """Entfernt eine Datei aus Manifest und Zählern und liefert den bisherigen Eintrag."""
+        self._count_file(file_name, None)
+        return self.manifest.pop(file_name, None)
     
     def _list_knowledge_files(self) -> List[str]:
         """
@@ -78,7 +344,7 @@ class KnowledgeBase:
         
         return files
     
-    def _split_markdown_into_chunks(self, content: str, max_chunk_size: int = 1000) -> List[Tuple[str, Dict[str, Any]]]:
+    def _split_markdown_into_chunks(self, content: str, max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE) -> List[Tuple[str, Dict[str, Any]]]:
         """
         Teilt einen Markdown-Text in sinnvolle Chunks für die Vektordatenbank.
         
@@ -89,72 +355,7 @@ class KnowledgeBase:
         Returns:
             Liste von Tuples (chunk_text, metadata)
         """
-        # Überschriften als Trennpunkte verwenden
-        chunks = []
-        current_section = ""
-        current_heading = "Allgemein"
-        current_subheading = ""  # Leerer String statt None
-        
-        lines = content.split('\n')
-        
-        for line in lines:
-            # Hauptüberschrift erkennen (# Titel)
-            if line.startswith('# '):
-                # Vorherigen Abschnitt speichern, wenn vorhanden
-                if current_section.strip():
-                    chunks.append((
-                        current_section.strip(),
-                        {
-                            "heading": current_heading,
-                            "subheading": current_subheading
-                        }
-                    ))
-                
-                current_heading = line.lstrip('# ').strip()
-                current_subheading = ""  # Leerer String statt None
-                current_section = ""
-            
-            # Unterüberschrift erkennen (## Titel)
-            elif line.startswith('## '):
-                # Vorherigen Abschnitt speichern, wenn vorhanden
-                if current_section.strip():
-                    chunks.append((
-                        current_section.strip(),
-                        {
-                            "heading": current_heading,
-                            "subheading": current_subheading
-                        }
-                    ))
-                
-                current_subheading = line.lstrip('## ').strip()
-                current_section = ""
-            
-            # Inhalt zum aktuellen Abschnitt hinzufügen
-            else:
-                current_section += line + '\n'
-                
-                # Chunk splitten, wenn er zu groß wird
-                if len(current_section) > max_chunk_size:
-                    chunks.append((
-                        current_section.strip(),
-                        {
-                            "heading": current_heading,
-                            "subheading": current_subheading
-                        }
-                    ))
-                    current_section = ""
-        
-        # Letzten Abschnitt speichern, wenn vorhanden
-        if current_section.strip():
-            chunks.append((
-                current_section.strip(),
-                {
-                    "heading": current_heading,
-                    "subheading": current_subheading
-                }
-            ))
-        
-        return chunks
+        return split_markdown_into_chunks(content, max_chunk_size)
     
     def load_markdown_file(self, file_path: str) -> Dict[str, Any]:
         """
@@ -170,15 +371,17 @@ class KnowledgeBase:
             file_name = os.path.basename(file_path)
             theme = os.path.splitext(file_name)[0]  # Theme aus Dateiname ableiten
             
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-            
-            chunks = self._split_markdown_into_chunks(content)
+            chunked = chunk_markdown_file(file_path)
+            chunks = [
+                (chunk["text"], {"heading": chunk["heading"], "subheading": chunk["subheading"], "entry": chunk["entry"]})
+                for chunk in chunked["chunks"]
+            ]
             
             result = {
                 "theme": theme,
                 "chunks": chunks,
-                "file_path": file_path
+                "file_path": file_path,
+                "file_hash": chunked["file_hash"]
             }
             
             return result
@@ -191,108 +394,407 @@ class KnowledgeBase:
                 "error": str(e)
             }
     
-    def import_markdown_to_chroma(self, file_path: str) -> List[str]:
+    def import_markdown_to_chroma(self, file_path: str, force: bool = False) -> List[str]:
         """
-        Importiert eine Markdown-Datei in ChromaDB.
+        Importiert eine Markdown-Datei inkrementell in ChromaDB.
+        
+        Chunk-IDs sind Inhalts-Hashes. Mit dem Manifest des letzten Imports werden
+        nur neue oder geänderte Chunks eingebettet und geschrieben; Chunks, die es
+        nicht mehr gibt, werden gelöscht. Unveränderte Dateien werden übersprungen.
         
         Args:
             file_path: Pfad zur Markdown-Datei
+            force: Datei auch dann verarbeiten, wenn sie laut Manifest unverändert ist
             
         Returns:
-            Liste der erstellten Dokument-IDs
+            Liste der aktuellen Dokument-IDs der Datei
         """
-        try:
-            markdown_data = self.load_markdown_file(file_path)
-            
-            if "error" in markdown_data:
-                print(f"Fehler beim Importieren von {file_path}: {markdown_data['error']}")
-                return []
+        # Prüfung gegen das Manifest und dessen Fortschreibung dürfen sich nicht überschneiden
+        with self._write_lock:
+            try:
+                file_name = os.path.basename(file_path)
+                prepared = prepare_markdown_file(file_path)
                 
-            theme = markdown_data["theme"]
-            
-            texts = []
-            metadatas = []
-            
-            for chunk_text, chunk_metadata in markdown_data["chunks"]:
-                texts.append(chunk_text)
+                if "error" in prepared:
+                    print(f"Fehler beim Importieren von {file_path}: {prepared['error']}")
+                    return []
+                
+                entry = self.manifest.get(file_name)
+                if (not force and entry is not None and self.chroma_manager.is_functional
+                        and entry["file_hash"] == prepared["file_hash"]):
+                    print(f"{file_name} ist unverändert, Import übersprungen.")
+                    return list(entry["chunks"])
+                
+                texts, metadatas, ids = prepared["texts"], prepared["metadatas"], prepared["ids"]
+                
+                if not self.chroma_manager.is_functional:
+                    return self.chroma_manager.add_documents_batch(texts, metadatas, ids) if texts else []
+                
+                # Bisherige Chunks aus dem Manifest, sonst aus der Collection (z.B. ältere Importe mit Zufalls-IDs)
+                if entry is not None:
+                    previous_ids = set(entry["chunks"])
+                else:
+                    previous_ids = set(self.chroma_manager.get_document_ids({"source_file": file_name}))
+                
+                # Nur neue oder geänderte Chunks einbetten
+                new_positions = [index for index, chunk_id in enumerate(ids) if chunk_id not in previous_ids]
+                for start in range(0, len(new_positions), DEFAULT_EMBED_BATCH_SIZE):
+                    batch = new_positions[start:start + DEFAULT_EMBED_BATCH_SIZE]
+                    if not self._write_chunks([texts[index] for index in batch],
+                                              [metadatas[index] for index in batch],
+                                              [ids[index] for index in batch]):
+                        # Manifest nicht fortschreiben, der nächste Import versucht es erneut
+                        print(f"Import von {file_path} unvollständig, Manifest bleibt unverändert.")
+                        return []
                 
-                # Metadaten zusammenstellen und sicherstellen, dass keine None-Werte enthalten sind
-                metadata = {
-                    "theme": theme,
-                    "source_file": os.path.basename(file_path),
-                    "heading": chunk_metadata.get("heading", "Allgemein"),
-                    "subheading": chunk_metadata.get("subheading", "")  # Leerer String als Fallback
-                }
+                stale_ids = sorted(previous_ids - set(ids))
+                self.chroma_manager.delete_documents(stale_ids)
                 
-                # Sicherstellen, dass alle Metadaten-Werte gültige Typen sind
-                for key, value in metadata.items():
-                    if value is None:
-                        metadata[key] = ""  # None-Werte durch leere Strings ersetzen
+                self._set_manifest_entry(file_name, prepared["file_hash"], ids)
+                self._save_manifest()
                 
-                metadatas.append(metadata)
+                print(f"{file_name}: {len(new_positions)} neue/geänderte Chunks eingebettet, "
+                      f"{len(stale_ids)} entfernt, {len(ids) - len(new_positions)} unverändert.")
+                return ids
+                
+            except Exception as e:
+                print(f"Fehler beim Importieren von {file_path} in ChromaDB: {str(e)}")
+                return []
+    
+    def _write_chunks(self, texts: List[str], metadatas: List[Dict[str, Any]], ids: List[str]) -> bool:
+        """
+        Bettet einen Batch von Chunks ein und schreibt ihn per Upsert in ChromaDB.
+        
+        Args:
+            texts: Texte der Chunks
+            metadatas: Metadaten der Chunks
+            ids: IDs der Chunks
+            
+        Returns:
+            True, wenn alle Chunks geschrieben wurden
+        """
+        with span("knowledge_embed_batch", chunks=len(texts)):
+            embeddings = self.chroma_manager.embed_texts(texts)
+            written = self.chroma_manager.upsert_documents_batch(texts, metadatas, ids, embeddings=embeddings)
+        return len(written) == len(ids)
+    
+    def _prepare_files(self, file_paths: List[str], workers: int) -> Iterator[Dict[str, Any]]:
+        """
+        Liest und zerlegt Dateien parallel in einem Prozesspool. Es sind höchstens
+        2 * workers Dateien gleichzeitig in Arbeit, damit der Speicher begrenzt bleibt.
+        Dateien, die der Korpus-Snapshot bereits aktuell enthält, werden nicht neu zerlegt.
+        
+        Args:
+            file_paths: Pfade der zu importierenden Dateien
+            workers: Anzahl der Prozesse
             
-            # Batch-Import in ChromaDB, nur wenn wirklich Daten vorhanden sind
-            if texts:
-                doc_ids = self.chroma_manager.add_documents_batch(texts, metadatas)
-                print(f"{len(texts)} Dokumente aus {file_path} zur Collection hinzugefügt.")
-                return doc_ids
+        Returns:
+            Iterator über die vorbereiteten Dateien (in Fertigstellungsreihenfolge)
+        """
+        # Seit dem letzten Zerlegen unveränderte Dateien aus dem Korpus-Snapshot übernehmen
+        snapshot = ParsedCorpus.load_snapshot(self.knowledge_dir) if file_paths else None
+        if snapshot is not None:
+            stale_paths = []
+            for file_path in file_paths:
+                if snapshot.is_fresh(file_path):
+                    entry = snapshot.files[os.path.basename(file_path)]
+                    yield documents_to_prepared(file_path, entry["version"], entry["documents"])
+                else:
+                    stale_paths.append(file_path)
+            file_paths = stale_paths
+        
+        if workers <= 1 or len(file_paths) < MIN_FILES_FOR_PROCESS_POOL:
+            for file_path in file_paths:
+                yield prepare_markdown_file(file_path)
+            return
+        
+        try:
+            # Streamlit, Watcher und ChromaDB laufen in eigenen Threads, fork würde deren
+            # Sperren im gesperrten Zustand kopieren; die Worker starten deshalb frisch
+            executor = ProcessPoolExecutor(max_workers=min(workers, len(file_paths)),
+                                           mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError) as e:
+            # z.B. ohne /dev/shm oder in eingeschränkten Umgebungen
+            print(f"Prozesspool nicht verfügbar, Dateien werden nacheinander verarbeitet: {str(e)}")
+            for file_path in file_paths:
+                yield prepare_markdown_file(file_path)
+            return
+        
+        with executor:
+            remaining = iter(file_paths)
+            in_flight = {}
+            for file_path in remaining:
+                in_flight[executor.submit(prepare_markdown_file, file_path)] = file_path
+                if len(in_flight) >= 2 * workers:
+                    break
+            
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path = in_flight.pop(future)
+                    try:
+                        yield future.result()
+                    except Exception as e:
+                        # Fehler im Arbeitsprozess betrifft nur diese Datei
+                        yield {"file_name": os.path.basename(file_path), "file_path": file_path,
+                               "texts": [], "metadatas": [], "ids": [], "error": str(e)}
+                    next_path = next(remaining, None)
+                    if next_path is not None:
+                        in_flight[executor.submit(prepare_markdown_file, next_path)] = next_path
+    
+    def _finish_job(self, job: _ImportJob, results: Dict[str, int], progress: Dict[str, int],
+                    progress_callback: Optional[ProgressCallback]) -> None:
+        """Schließt eine Datei ab: veraltete Chunks löschen, Manifest fortschreiben, Fortschritt melden."""
+        if not job.failed:
+            self.chroma_manager.delete_documents(job.stale_ids)
+        
+        with self._import_lock:
+            if job.failed:
+                print(f"Import von {job.file_name} fehlgeschlagen, Manifest bleibt unverändert.")
+                results[job.file_name] = 0
+                progress["files_failed"] += 1
             else:
-                print(f"Keine Dokumente in {file_path} gefunden.")
-                return []
-                
-        except Exception as e:
-            print(f"Fehler beim Importieren von {file_path} in ChromaDB: {str(e)}")
-            return []
+                if job.file_hash is not None:
+                    self._set_manifest_entry(job.file_name, job.file_hash, job.ids)
+                results[job.file_name] = len(job.ids)
+            progress["files_done"] += 1
+            state = dict(progress)
+        
+        if progress_callback is not None:
+            progress_callback(state)
     
-    def import_all_knowledge(self) -> Dict[str, int]:
+    def _write_batches(self, batches: "queue.Queue", results: Dict[str, int], progress: Dict[str, int],
+                       progress_callback: Optional[ProgressCallback]) -> None:
+        """
+        Schreib-Stufe der Import-Pipeline: bettet Batches fester Größe ein und schreibt sie in ChromaDB.
+        Schlägt ein Batch fehl, wird er je Datei wiederholt, sodass nur die betroffenen Dateien scheitern.
+        
+        Args:
+            batches: Warteschlange mit Tuples (Chunks, Dateien ohne neue Chunks); None beendet die Stufe
+            results: Ergebnisse (Dateiname -> Anzahl Dokumente), werden hier befüllt
+            progress: Fortschrittszähler
+            progress_callback: Optional, wird nach jeder abgeschlossenen Datei aufgerufen
+        """
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            chunks, finished_jobs = item
+            
+            try:
+                if chunks and not self._write_chunks([chunk[1] for chunk in chunks],
+                                                     [chunk[2] for chunk in chunks],
+                                                     [chunk[3] for chunk in chunks]):
+                    by_job: Dict[str, List[Tuple[_ImportJob, str, Dict[str, Any], str]]] = {}
+                    for chunk in chunks:
+                        by_job.setdefault(chunk[0].file_name, []).append(chunk)
+                    for job_chunks in by_job.values():
+                        if not self._write_chunks([chunk[1] for chunk in job_chunks],
+                                                  [chunk[2] for chunk in job_chunks],
+                                                  [chunk[3] for chunk in job_chunks]):
+                            job_chunks[0][0].failed = True
+            except Exception as e:
+                print(f"Fehler beim Schreiben eines Import-Batches: {str(e)}")
+                for chunk in chunks:
+                    chunk[0].failed = True
+            
+            with self._import_lock:
+                progress["chunks_written"] += len(chunks)
+            for chunk in chunks:
+                chunk[0].pending -= 1
+                if chunk[0].pending == 0:
+                    finished_jobs.append(chunk[0])
+            for job in finished_jobs:
+                try:
+                    self._finish_job(job, results, progress, progress_callback)
+                except Exception as e:
+                    print(f"Fehler beim Abschließen des Imports von {job.file_name}: {str(e)}")
+    
+    def import_all_knowledge(self,
+                             workers: Optional[int] = None,
+                             embed_batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+                             force: bool = False,
+                             progress_callback: Optional[ProgressCallback] = None) -> Dict[str, int]:
         """
         Importiert alle verfügbaren Markdown-Dateien in ChromaDB.
         
+        Die Dateien werden in einem Prozesspool gelesen und zerlegt. Neue Chunks
+        werden dateiübergreifend zu Batches fester Größe gebündelt und über eine
+        begrenzte Warteschlange an einen Schreib-Thread übergeben, der sie einbettet
+        und schreibt. Ist die Warteschlange voll, wartet das Zerlegen (Gegendruck).
+        Fehler in einer Datei brechen den Import der anderen nicht ab.
+        
+        Args:
+            workers: Anzahl der Prozesse für das Zerlegen (Standard: Anzahl der CPU-Kerne)
+            embed_batch_size: Chunks je Embedding-Batch
+            force: Auch laut Manifest unveränderte Dateien neu verarbeiten
+            progress_callback: Optional, erhält nach jeder Datei die Fortschrittszähler
+                (files_done, files_total, files_failed, chunks_queued, chunks_written)
+            
         Returns:
             Ergebnisse des Imports (Dateiname -> Anzahl importierter Dokumente)
         """
-        results = {}
+        results: Dict[str, int] = {}
+        file_paths = list(self.available_files)
+        workers = max(1, workers or os.cpu_count() or 1)
+        progress = {"files_total": len(file_paths), "files_done": 0, "files_failed": 0,
+                    "chunks_queued": 0, "chunks_written": 0}
         
-        for file_path in self.available_files:
+        if progress_callback is None:
+            report_every = max(1, len(file_paths) // 10)
+            
+            def progress_callback(state: Dict[str, int]) -> None:
+                if state["files_done"] % report_every == 0 or state["files_done"] == state["files_total"]:
+                    print(f"Import: {state['files_done']}/{state['files_total']} Dateien, "
+                          f"{state['chunks_written']}/{state['chunks_queued']} Chunks geschrieben.")
+        
+        with self._write_lock, span("knowledge_import", files=len(file_paths), workers=workers) as import_span:
+            batches: "queue.Queue" = queue.Queue(maxsize=DEFAULT_QUEUE_BATCHES)
+            # Der Schreib-Thread bekommt eine Kopie des Kontexts, damit seine Spans im Trace landen
+            writer = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._write_batches, batches, results, progress, progress_callback),
+                name="knowledge-import-writer",
+                daemon=True
+            )
+            writer.start()
+            pending_chunks: List[Tuple[_ImportJob, str, Dict[str, Any], str]] = []
+            
             try:
-                doc_ids = self.import_markdown_to_chroma(file_path)
-                results[os.path.basename(file_path)] = len(doc_ids)
-            except Exception as e:
-                print(f"Fehler beim Importieren von {file_path}: {str(e)}")
-                results[os.path.basename(file_path)] = 0
+                for prepared in self._prepare_files(file_paths, workers):
+                    file_name = prepared["file_name"]
+                    
+                    if "error" in prepared:
+                        print(f"Fehler beim Importieren von {prepared['file_path']}: {prepared['error']}")
+                        job = _ImportJob(file_name, None, [], [], 0)
+                        job.failed = True
+                        self._finish_job(job, results, progress, progress_callback)
+                        continue
+                    
+                    if not self.chroma_manager.is_functional:
+                        # Ohne ChromaDB nur zählen, kein Manifest schreiben
+                        self._finish_job(_ImportJob(file_name, None, prepared["ids"], [], 0),
+                                         results, progress, progress_callback)
+                        continue
+                    
+                    with self._import_lock:
+                        entry = self.manifest.get(file_name)
+                    if not force and entry is not None and entry["file_hash"] == prepared["file_hash"]:
+                        self._finish_job(_ImportJob(file_name, None, list(entry["chunks"]), [], 0),
+                                         results, progress, progress_callback)
+                        continue
+                    
+                    # Bisherige Chunks aus dem Manifest, sonst aus der Collection
+                    if entry is not None:
+                        previous_ids = set(entry["chunks"])
+                    else:
+                        previous_ids = set(self.chroma_manager.get_document_ids({"source_file": file_name}))
+                    
+                    ids = prepared["ids"]
+                    new_positions = [index for index, chunk_id in enumerate(ids) if chunk_id not in previous_ids]
+                    job = _ImportJob(file_name, prepared["file_hash"], ids,
+                                     sorted(previous_ids - set(ids)), len(new_positions))
+                    with self._import_lock:
+                        progress["chunks_queued"] += len(new_positions)
+                    
+                    if not new_positions:
+                        batches.put(([], [job]))
+                        continue
+                    
+                    for index in new_positions:
+                        pending_chunks.append((job, prepared["texts"][index], prepared["metadatas"][index], ids[index]))
+                        if len(pending_chunks) >= embed_batch_size:
+                            batches.put((pending_chunks, []))
+                            pending_chunks = []
+            finally:
+                if pending_chunks:
+                    batches.put((pending_chunks, []))
+                batches.put(None)
+                writer.join()
+                self._save_manifest()
+            
+            # Chunks gelöschter Dateien entfernen
+            current_files = {os.path.basename(file_path) for file_path in file_paths}
+            for file_name in [name for name in self.manifest if name not in current_files]:
+                self.remove_file(file_name)
+            import_span.set(documents=sum(results.values()), failed=progress["files_failed"])
         
         return results
     
+    def remove_file(self, file_name: str) -> int:
+        """
+        Entfernt alle Chunks einer gelöschten Wissensdatei aus ChromaDB.
+        
+        Args:
+            file_name: Name der Datei
+            
+        Returns:
+            Anzahl der gelöschten Chunks
+        """
+        with self._write_lock:
+            entry = self._remove_manifest_entry(file_name)
+            if entry is not None:
+                chunk_ids = entry["chunks"]
+            else:
+                chunk_ids = self.chroma_manager.get_document_ids({"source_file": file_name})
+            
+            self.chroma_manager.delete_documents(chunk_ids)
+            self._save_manifest()
+        print(f"{file_name} wurde entfernt, {len(chunk_ids)} Chunks gelöscht.")
+        return len(chunk_ids)
+    
+    def sync_files(self, changed_paths: List[str], removed_paths: List[str] = None) -> Dict[str, int]:
+        """
+        Übernimmt Änderungen einzelner Wissensdateien in ChromaDB (z.B. vom KnowledgeWatcher).
+        Neue Chunks werden zuerst geschrieben und veraltete erst danach gelöscht,
+        sodass Suchanfragen währenddessen keine Lücken sehen.
+        
+        Args:
+            changed_paths: Pfade geänderter oder neuer Dateien
+            removed_paths: Optional, Pfade gelöschter Dateien
+            
+        Returns:
+            Ergebnisse (Dateiname -> Anzahl aktueller Dokumente, 0 für gelöschte Dateien)
+        """
+        results = {}
+        with self._write_lock, span("knowledge_sync", files=len(changed_paths) + len(removed_paths or [])):
+            for file_path in changed_paths:
+                results[os.path.basename(file_path)] = len(self.import_markdown_to_chroma(file_path))
+            for file_path in removed_paths or []:
+                self.remove_file(os.path.basename(file_path))
+                results[os.path.basename(file_path)] = 0
+            self.available_files = self._list_knowledge_files()
+        return results
+    
     def get_knowledge_statistics(self) -> Dict[str, Any]:
         """
         Gibt Statistiken über die Wissensbasis zurück.
         
+        Die Zahlen stammen aus den Zählern, die Import, Aktualisierung und Löschen
+        fortschreiben; die Collection selbst wird dafür nicht gelesen.
+        
         Returns:
             Statistiken zur Wissensbasis
         """
         try:
-            all_docs = self.chroma_manager.get_all_documents()
-            
-            # Wenn keine Dokumente vorhanden sind, importiere alle verfügbaren
-            if not all_docs.get("metadatas", []) and self.available_files:
-                print("Keine Dokumente in der Wissensbasis gefunden. Importiere verfügbare Dateien...")
-                self.import_all_knowledge()
-                all_docs = self.chroma_manager.get_all_documents()
+            # Wenn keine Dokumente importiert sind, importiere alle verfügbaren
+            if (not self.statistics["total_documents"] and self.available_files
+                    and self.chroma_manager.is_functional):
+                with self._write_lock:
+                    # Eine andere Session kann den Import inzwischen abgeschlossen haben
+                    if not self.statistics["total_documents"]:
+                        print("Keine Dokumente in der Wissensbasis gefunden. Importiere verfügbare Dateien...")
+                        self.import_all_knowledge()
             
-            # Anzahl der Dokumente nach Thema gruppieren
-            themes = {}
-            for metadata in all_docs.get("metadatas", []):
-                theme = metadata.get("theme", "Unbekannt")
-                if theme not in themes:
-                    themes[theme] = 0
-                themes[theme] += 1
-            
-            # Gesamtanzahl der Dokumente
-            total_docs = self.chroma_manager.get_document_count()
+            with self._import_lock:
+                themes = dict(self.statistics["themes"])
+                files = {name: entry["documents"] for name, entry in self.statistics["files"].items()}
+                total_docs = self.statistics["total_documents"]
             
             return {
                 "total_documents": total_docs,
                 "documents_by_theme": themes,
+                "documents_by_file": files,
                 "themes": list(themes.keys()),
                 "available_files": [os.path.basename(f) for f in self.available_files]
             }
@@ -301,7 +803,33 @@ class KnowledgeBase:
             return {
                 "total_documents": 0,
                 "documents_by_theme": {},
+                "documents_by_file": {},
                 "themes": [],
                 "available_files": [os.path.basename(f) for f in self.available_files],
                 "error": str(e)
             }
+
+
+def get_shared_knowledge_base(knowledge_dir: Optional[str] = None,
+                              chroma_manager: Optional[ChromaManager] = None) -> KnowledgeBase:
+    """
+    Gibt die prozessweit gemeinsame Wissensbasis eines Verzeichnisses und einer Collection zurück
+    (Manifest und Statistik werden nur einmal geladen).
+    
+    Args:
+        knowledge_dir: Optional, Verzeichnis mit den Markdown-Wissensquellen (Standard: knowledge/)
+        chroma_manager: Optional, ChromaManager des gewählten Embedding-Backends
+            (Standard: der gemeinsame ChromaManager mit Standard-Backend)
+        
+    Returns:
+        Die gemeinsam genutzte Wissensbasis
+    """
+    if chroma_manager is None:
+        chroma_manager = get_shared_chroma_manager()
+    key = ("knowledge_base", os.path.abspath(knowledge_dir or DEFAULT_KNOWLEDGE_DIR),
+           os.path.abspath(chroma_manager.db_directory), chroma_manager.collection_name)
+    return shared_resources.get(
+        key,
+        lambda: KnowledgeBase(knowledge_dir, chroma_manager=chroma_manager),
+        keep=lambda knowledge_base: knowledge_base.chroma_manager.is_functional
+    )
@@ -0,0 +1,214 @@
+"""
+Überwachung des Wissensverzeichnisses für den Saalbach Tourismus Chatbot.
+Erkennt geänderte, neue und gelöschte Markdown-Dateien per Polling (Änderungszeit
+und Größe) und benachrichtigt angemeldete Empfänger, damit Stichwortindex und
+ChromaDB ohne Neustart der App aktualisiert werden. Ist watchdog installiert,
+lösen Dateisystem-Ereignisse (inotify) den nächsten Durchlauf sofort aus.
+"""
+
+import os
+import glob
+import weakref
+import threading
+from typing import List, Dict, Tuple, Callable, Optional
+
+# watchdog ist optional, ohne wird nur im festen Intervall gepollt
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Empfänger: Funktion (geänderte Pfade, gelöschte Pfade)
+ChangeCallback = Callable[[List[str], List[str]], None]
+
+_shared_watchers: Dict[str, "KnowledgeWatcher"] = {}
+_shared_watchers_lock = threading.Lock()
+
+
+class _WakeHandler(FileSystemEventHandler):
+    """Weckt den Watcher bei jedem Dateisystem-Ereignis im Verzeichnis."""
+
+    def __init__(self, wake: threading.Event):
+        super().__init__()
+        self._wake = wake
+
+    def on_any_event(self, event) -> None:
+        self._wake.set()
+
+
+class KnowledgeWatcher:
+    """
+    Pollt ein Verzeichnis im Hintergrund-Thread und meldet Änderungen an Markdown-Dateien.
+    Geänderte Dateien werden erst gemeldet, wenn sie zwei Durchläufe lang unverändert
+    waren, damit halb gespeicherte Dateien nicht eingelesen werden.
+    """
+
+    def __init__(self, knowledge_dir: str, poll_interval: float = DEFAULT_POLL_INTERVAL, pattern: str = "*.md"):
+        """
+        Initialisiert den Watcher (der aktuelle Stand gilt als bekannt).
+
+        Args:
+            knowledge_dir: Das zu überwachende Verzeichnis
+            poll_interval: Abstand zwischen zwei Durchläufen in Sekunden
+            pattern: Glob-Muster der überwachten Dateien
+        """
+        self.knowledge_dir = knowledge_dir
+        self.poll_interval = poll_interval
+        self.pattern = pattern
+
+        self._lock = threading.Lock()
+        self._subscribers: Dict[object, Callable] = {}
+        self._snapshot = self._scan()
+        self._pending: Dict[str, Tuple[int, int]] = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Liest Änderungszeit und Größe aller überwachten Dateien.
+
+        Returns:
+            Dictionary Pfad -> (Änderungszeit in ns, Größe)
+        """
+        signatures = {}
+        for file_path in glob.glob(os.path.join(self.knowledge_dir, self.pattern)):
+            try:
+                stat = os.stat(file_path)
+                signatures[file_path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                # Datei wurde zwischen glob und stat gelöscht
+                continue
+        return signatures
+
+    def subscribe(self, callback: ChangeCallback, key: Optional[str] = None, weak: bool = False) -> bool:
+        """
+        Meldet einen Empfänger für Änderungen an.
+
+        Args:
+            callback: Funktion (geänderte Pfade, gelöschte Pfade)
+            key: Optional, eindeutiger Schlüssel; ist er schon vergeben, wird nichts angemeldet
+            weak: Gebundene Methoden nur schwach referenzieren (z.B. für RAG-Systeme einzelner Sessions)
+
+        Returns:
+            True, wenn der Empfänger neu angemeldet wurde
+        """
+        if weak and hasattr(callback, "__self__"):
+            reference = weakref.WeakMethod(callback)
+        else:
+            reference = lambda: callback
+        with self._lock:
+            subscriber_key = key if key is not None else id(callback.__self__ if hasattr(callback, "__self__") else callback)
+            if subscriber_key in self._subscribers and self._subscribers[subscriber_key]() is not None:
+                return False
+            self._subscribers[subscriber_key] = reference
+            return True
+
+    def has_subscriber(self, key: str) -> bool:
+        with self._lock:
+            reference = self._subscribers.get(key)
+            return reference is not None and reference() is not None
+
+    def poll(self) -> Tuple[List[str], List[str]]:
+        """
+        Führt einen Durchlauf aus und benachrichtigt die Empfänger.
+
+        Returns:
+            Tuple (geänderte oder neue Pfade, gelöschte Pfade)
+        """
+        current = self._scan()
+        with self._lock:
+            candidates = [path for path, signature in current.items() if self._snapshot.get(path) != signature]
+            changed = sorted(path for path in candidates if self._pending.get(path) == current[path])
+            removed = sorted(path for path in self._snapshot if path not in current)
+            self._pending = {path: current[path] for path in candidates if path not in changed}
+
+            for path in changed:
+                self._snapshot[path] = current[path]
+            for path in removed:
+                del self._snapshot[path]
+
+            callbacks = []
+            for key, reference in list(self._subscribers.items()):
+                callback = reference()
+                if callback is None:
+                    # Session wurde beendet, Empfänger abmelden
+                    del self._subscribers[key]
+                else:
+                    callbacks.append(callback)
+
+        if changed or removed:
+            print(f"Änderungen im Wissensverzeichnis: {len(changed)} geändert/neu, {len(removed)} gelöscht.")
+            for callback in callbacks:
+                try:
+                    callback(changed, removed)
+                except Exception as e:
+                    print(f"Fehler beim Verarbeiten der Änderungen im Wissensverzeichnis: {str(e)}")
+
+        return changed, removed
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Fehler beim Überwachen des Wissensverzeichnisses: {str(e)}")
+
+    def start(self) -> "KnowledgeWatcher":
+        """Startet den Hintergrund-Thread (und ggf. den watchdog-Observer)."""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="knowledge-watcher", daemon=True)
+            self._thread.start()
+
+            if WATCHDOG_AVAILABLE:
+                try:
+                    self._observer = Observer()
+                    self._observer.schedule(_WakeHandler(self._wake), self.knowledge_dir, recursive=False)
+                    self._observer.daemon = True
+                    self._observer.start()
+                except Exception as e:
+                    print(f"watchdog nicht verfügbar, Wissensverzeichnis wird nur gepollt: {str(e)}")
+                    self._observer = None
+        return self
+
+    def stop(self) -> None:
+        """Beendet den Hintergrund-Thread."""
+        self._stopped.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+
+def get_shared_knowledge_watcher(knowledge_dir: str, poll_interval: float = DEFAULT_POLL_INTERVAL) -> KnowledgeWatcher:
+    """
+    Gibt den prozessweit gemeinsamen (bereits gestarteten) Watcher für ein Verzeichnis zurück.
+
+    Args:
+        knowledge_dir: Das zu überwachende Verzeichnis
+        poll_interval: Abstand zwischen zwei Durchläufen in Sekunden (nur beim ersten Aufruf wirksam)
+
+    Returns:
+        Der gemeinsam genutzte Watcher
+    """
+    key = os.path.abspath(knowledge_dir)
+    with _shared_watchers_lock:
+        watcher = _shared_watchers.get(key)
+        if watcher is None:
+            watcher = KnowledgeWatcher(key, poll_interval).start()
+            _shared_watchers[key] = watcher
+        return watcher
@@ -0,0 +1,125 @@
+"""
+Markdown-Chunker für den Saalbach Tourismus Chatbot.
+Zerlegt die Wissensdateien in einem Durchlauf in Chunks auf Eintragsebene:
+jede ###-Überschrift (z.B. ein Restaurant oder eine Wanderung) beginnt einen
+eigenen Chunk, der Überschriftenpfad (#, ##, ###) wird als Metadaten mitgeführt.
+Zeilen werden in Listen gesammelt und erst am Chunk-Ende verbunden (lineare
+Laufzeit); Dateien werden zeilenweise gelesen und nie vollständig geladen.
+"""
+
+import re
+import hashlib
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+# Überschriften bis Ebene 3 trennen Chunks, tiefere Ebenen gehören zum Inhalt
+HEADING_PATTERN = re.compile(r"^(#{1,3})\s+(.*?)\s*#*\s*$")
+DEFAULT_HEADING = "Allgemein"
+DEFAULT_MAX_CHUNK_SIZE = 1000
+
+# Trennlinien zwischen Einträgen tragen keinen Inhalt
+SEPARATOR_LINES = {"---", "***", "___"}
+
+
+def iter_markdown_chunks(lines: Iterable[str], max_chunk_size: Optional[int] = DEFAULT_MAX_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Zerlegt Markdown-Zeilen in Chunks auf Eintragsebene.
+
+    Text vor dem ersten Eintrag eines ##-Abschnitts (Einleitung) wird ein eigener
+    Chunk. Die ###-Zeile bleibt als erste Zeile im Text des Eintrags, damit der
+    Name auch für Stichwort- und Vektorsuche sichtbar ist. Wird ein Chunk größer
+    als max_chunk_size, wird er an der nächsten Zeilengrenze geteilt.
+
+    Args:
+        lines: Zeilen des Markdown-Textes (z.B. ein geöffnetes Dateiobjekt)
+        max_chunk_size: Maximale Anzahl an Zeichen pro Chunk (None: nicht teilen)
+
+    Returns:
+        Iterator über Chunks mit "text", "heading" (#), "subheading" (##) und "entry" (###)
+    """
+    heading = DEFAULT_HEADING
+    subheading = ""
+    entry = ""
+    buffer: List[str] = []
+    size = 0
+
+    def flush() -> Optional[Dict[str, Any]]:
+        text = "\n".join(buffer).strip()
+        buffer.clear()
+        if not text:
+            return None
+        return {"text": text, "heading": heading, "subheading": subheading, "entry": entry}
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        stripped = line.strip()
+        match = HEADING_PATTERN.match(stripped) if stripped.startswith("#") else None
+
+        if match:
+            chunk = flush()
+            size = 0
+            if chunk is not None:
+                yield chunk
+
+            level, title = len(match.group(1)), match.group(2)
+            if level == 1:
+                heading, subheading, entry = title, "", ""
+            elif level == 2:
+                subheading, entry = title, ""
+            else:
+                entry = title
+                buffer.append(stripped)
+                size = len(stripped) + 1
+            continue
+
+        if stripped in SEPARATOR_LINES:
+            continue
+
+        buffer.append(line)
+        size += len(line) + 1
+
+        # Chunk teilen, wenn er zu groß wird
+        if max_chunk_size is not None and size > max_chunk_size:
+            chunk = flush()
+            size = 0
+            if chunk is not None:
+                yield chunk
+
+    # Letzten Chunk ausgeben, wenn vorhanden
+    chunk = flush()
+    if chunk is not None:
+        yield chunk
+
+
+def iter_file_lines(file_path: str, hasher: Any = None) -> Iterator[str]:
+    """
+    Liest eine Textdatei zeilenweise (UTF-8) und aktualisiert optional einen Hash.
+    Der Hash entspricht dem des vollständig gelesenen Inhalts.
+
+    Args:
+        file_path: Pfad zur Datei
+        hasher: Optional, hashlib-Objekt, das mit jeder Zeile aktualisiert wird
+
+    Returns:
+        Iterator über die Zeilen (mit Zeilenumbruch)
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if hasher is not None:
+                hasher.update(line.encode('utf-8'))
+            yield line
+
+
+def chunk_markdown_file(file_path: str, max_chunk_size: Optional[int] = DEFAULT_MAX_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Zerlegt eine Markdown-Datei im Streaming-Verfahren und berechnet ihren Inhalts-Hash.
+
+    Args:
+        file_path: Pfad zur Markdown-Datei
+        max_chunk_size: Maximale Anzahl an Zeichen pro Chunk (None: nicht teilen)
+
+    Returns:
+        Dictionary mit "file_hash" (SHA-1 des Inhalts) und "chunks"
+    """
+    hasher = hashlib.sha1()
+    chunks = list(iter_markdown_chunks(iter_file_lines(file_path, hasher), max_chunk_size))
+    return {"file_hash": hasher.hexdigest(), "chunks": chunks}
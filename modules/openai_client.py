@@ -0,0 +1,162 @@
+"""
+Prozessweiter Pool von OpenAI-Clients für den Saalbach Tourismus Chatbot.
+Clients werden pro API-Key und Basis-URL einmalig erstellt und von allen
+Streamlit-Sessions und Threads gemeinsam genutzt, sodass Keep-Alive-Verbindungen
+wiederverwendet werden und nicht jede Anfrage einen neuen TLS-Handshake bezahlt.
+"""
+
+import asyncio
+import weakref
+import threading
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+# openai und httpx werden erst beim ersten Client importiert (der Import dauert spürbar
+# und verzögert sonst den Start der App, bevor überhaupt eine Anfrage gestellt wurde)
+if TYPE_CHECKING:
+    import openai
+
+# Standardwerte für Verbindungspool und Timeouts
+DEFAULT_CLIENT_SETTINGS: Dict[str, Any] = {
+    "timeout": 60.0,
+    "connect_timeout": 5.0,
+    "max_connections": 50,
+    "max_keepalive_connections": 20,
+    "keepalive_expiry": 30.0,
+    "max_retries": 2
+}
+
+_clients: Dict[Tuple, "openai.OpenAI"] = {}
+_clients_lock = threading.Lock()
+
+# Async-Clients sind an ihren Event-Loop gebunden und werden daher je Loop gepoolt
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, openai.AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+
+
+def _resolve_settings(overrides: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Kombiniert die Standardwerte mit übergebenen Einstellungen.
+
+    Args:
+        overrides: Optional, abweichende Einstellungen (None-Werte werden ignoriert)
+
+    Returns:
+        Vollständige Client-Einstellungen
+    """
+    settings = dict(DEFAULT_CLIENT_SETTINGS)
+    for key, value in (overrides or {}).items():
+        if key in settings and value is not None:
+            settings[key] = value
+    return settings
+
+
+def _http_client_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Erstellt Timeout- und Pool-Optionen für den HTTP-Client eines OpenAI-Clients.
+
+    Args:
+        settings: Vollständige Client-Einstellungen
+
+    Returns:
+        Keyword-Argumente für den httpx-Client
+    """
+    import httpx
+
+    return {
+        "timeout": httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+        "limits": httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"]
+        )
+    }
+
+
+def _client_key(api_key: str, base_url: Optional[str], settings: Dict[str, Any]) -> Tuple:
+    return (api_key, base_url or "", tuple(sorted(settings.items())))
+
+
+def get_openai_client(api_key: str,
+                      base_url: Optional[str] = None,
+                      client_settings: Optional[Dict[str, Any]] = None) -> "openai.OpenAI":
+    """
+    Gibt den gemeinsamen OpenAI-Client für API-Key und Basis-URL zurück.
+    Existiert noch keiner, wird er erstellt und im Pool abgelegt.
+
+    Args:
+        api_key: OpenAI API-Schlüssel
+        base_url: Optional, abweichende Basis-URL der API
+        client_settings: Optional, Pool-Limits und Timeouts (siehe DEFAULT_CLIENT_SETTINGS)
+
+    Returns:
+        Der gemeinsam genutzte OpenAI-Client
+    """
+    settings = _resolve_settings(client_settings)
+    key = _client_key(api_key, base_url, settings)
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        # Erneut prüfen, ein anderer Thread könnte den Client inzwischen erstellt haben
+        client = _clients.get(key)
+        if client is None:
+            import openai
+
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=settings["max_retries"],
+                http_client=openai.DefaultHttpxClient(**_http_client_options(settings))
+            )
+            _clients[key] = client
+            print(f"Neuer OpenAI-Client im Pool erstellt (Clients im Pool: {len(_clients)})")
+        return client
+
+
+def get_async_openai_client(api_key: str,
+                            base_url: Optional[str] = None,
+                            client_settings: Optional[Dict[str, Any]] = None) -> "openai.AsyncOpenAI":
+    """
+    Gibt den gemeinsamen AsyncOpenAI-Client für den laufenden Event-Loop zurück.
+    Alle Coroutinen eines Loops teilen sich damit einen Verbindungspool.
+
+    Args:
+        api_key: OpenAI API-Schlüssel
+        base_url: Optional, abweichende Basis-URL der API
+        client_settings: Optional, Pool-Limits und Timeouts (siehe DEFAULT_CLIENT_SETTINGS)
+
+    Returns:
+        Der gemeinsam genutzte AsyncOpenAI-Client
+    """
+    loop = asyncio.get_running_loop()
+    settings = _resolve_settings(client_settings)
+    key = _client_key(api_key, base_url, settings)
+
+    with _clients_lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            import openai
+
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=settings["max_retries"],
+                http_client=openai.DefaultAsyncHttpxClient(**_http_client_options(settings))
+            )
+            loop_clients[key] = client
+        return client
+
+
+def close_all_clients() -> None:
+    """Schließt alle gepoolten Clients und leert den Pool."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"Fehler beim Schließen eines OpenAI-Clients: {str(e)}")
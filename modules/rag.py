@@ -1,14 +1,60 @@
 """
 Einfache RAG-Implementierung (Retrieval Augmented Generation) für den Saalbach Tourismus Chatbot.
-Diese Implementierung funktioniert ohne ChromaDB und verwendet einfache Textsuche.
-Dient als Fallback, wenn ChromaDB nicht funktioniert.
+Diese Implementierung funktioniert ohne ChromaDB und verwendet eine BM25-Stichwortsuche.
+Ist ein funktionsfähiger ChromaManager vorhanden, wird zusätzlich parallel die
+Vektorsuche genutzt (hybride Suche), ansonsten dient die Stichwortsuche als Fallback.
 """
 
 import os
 import re
-import glob
-import openai
-from typing import List, Dict, Any, Optional, Union
+import json
+import asyncio
+import hashlib
+import functools
+import threading
+import contextvars
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional, Union, Iterator, Tuple, NamedTuple
+from modules.search_index import BM25Index
+from modules.openai_client import get_openai_client, get_async_openai_client
+from modules.answer_cache import AnswerCache, make_cache_key
+from modules.semantic_cache import SemanticAnswerCache
+from modules.rate_limiter import LLMRateLimiter, RateLimitExceeded
+from modules.context_packer import ContextPacker, count_tokens
+from modules.history_compactor import HistoryCompactor
+from modules.hybrid_retriever import HybridRetriever, DEFAULT_LEG_TIMEOUT
+from modules.markdown_chunker import iter_markdown_chunks
+from modules.corpus import ParsedCorpus, get_shared_corpus, update_shared_corpus
+from modules.resources import shared_resources
+from modules.entry_table import EntryTable, lookup_entry_query, PANDAS_AVAILABLE
+from modules.theme_router import ThemeRouter, DEFAULT_MIN_CONFIDENCE
+from modules.telemetry import Trace, start_trace, span, record_token_usage
+
+# Maximale Länge einer generierten Antwort in Tokens
+MAX_ANSWER_TOKENS = 1000
+
+MISSING_API_KEY_MESSAGE = "Servus! Ich brauche einen API-Schlüssel, um dir helfen zu können. Bitte gib einen OpenAI API-Schlüssel in den Einstellungen ein. Danke! 😊"
+
+# Freundliche Antworten für den Fehlerfall
+CONNECTION_ERROR_MESSAGE = "Servus! Aktuell hab ich leider ein kleines technisches Problem mit meiner Verbindung. Könntest du es in ein paar Minuten nochmal probieren? Danke für dein Verständnis! 😊"
+OVERLOAD_ERROR_MESSAGE = "Grüß dich! Leider bin ich gerade ein bisserl überfordert - zu viele Gäste auf einmal! 😅 Kannst du in 5 Minuten nochmal vorbeischauen? Dann kann ich dir sicher weiterhelfen!"
+GENERIC_ERROR_MESSAGE = "Servus! Entschuldige bitte, aktuell kann ich deine Anfrage nicht richtig beantworten. Magst du deine Frage vielleicht anders formulieren? Oder frag mich einfach nach konkreten Tipps zu Wandern, Biken, Skifahren oder guten Restaurants in Saalbach-Hinterglemm!"
+FALLBACK_MESSAGES = (CONNECTION_ERROR_MESSAGE, OVERLOAD_ERROR_MESSAGE, GENERIC_ERROR_MESSAGE)
+
+
+class KnowledgeState(NamedTuple):
+    """
+    Unveränderlicher Stand der Wissensbasis einer RAG-Instanz.
+    Beim Neuladen wird er als Ganzes ersetzt; eine Anfrage liest ihn einmal zu Beginn
+    und arbeitet durchgehend mit Index, Tabelle, Router und Versionen desselben Stands.
+    """
+    corpus: Optional[ParsedCorpus]
+    documents: List[Dict[str, Any]]
+    file_versions: Dict[str, str]
+    search_index: Optional[BM25Index]
+    entry_table: Optional[EntryTable]
+    theme_router: Optional[ThemeRouter]
+
 
 class SimpleRAG:
     """
@@ -16,19 +62,79 @@ class SimpleRAG:
     Verwendet einfache Textsuche für das Retrieval.
     """
     
-    def __init__(self, openai_api_key: str = None, model: str = "gpt-3.5-turbo"):
+    def __init__(self,
+                 openai_api_key: str = None,
+                 model: str = "gpt-3.5-turbo",
+                 base_url: Optional[str] = None,
+                 client_settings: Optional[Dict[str, Any]] = None,
+                 answer_cache: Optional[AnswerCache] = None,
+                 semantic_cache: Optional[SemanticAnswerCache] = None,
+                 rate_limiter: Optional[LLMRateLimiter] = None,
+                 context_packer: Optional[ContextPacker] = None,
+                 history_compactor: Optional[HistoryCompactor] = None,
+                 chroma_manager: Any = None,
+                 retrieval_leg_timeout: float = DEFAULT_LEG_TIMEOUT,
+                 knowledge_dir: Optional[str] = None,
+                 structured_answers: bool = True,
+                 theme_routing: bool = True,
+                 theme_routing_confidence: float = DEFAULT_MIN_CONFIDENCE):
         """
         Initialisiert das Simple RAG-System.
         
         Args:
             openai_api_key: OpenAI API-Schlüssel
             model: Zu verwendendes OpenAI-Modell
+            base_url: Optional, abweichende Basis-URL der OpenAI-API
+            client_settings: Optional, Pool-Limits und Timeouts für den OpenAI-Client
+            answer_cache: Optional, Cache für bereits beantwortete Anfragen
+            semantic_cache: Optional, semantischer Cache für umformulierte Anfragen
+            rate_limiter: Optional, prozessweite Begrenzung für LLM-Aufrufe
+            context_packer: Optional, Packer mit eigenem Prompt-Budget (Standard: DEFAULT_PROMPT_TOKEN_BUDGET)
+            history_compactor: Optional, Verdichtung des Chat-Verlaufs (Standard: LLM-Zusammenfassung)
+            chroma_manager: Optional, ChromaManager für die zusätzliche Vektorsuche
+            retrieval_leg_timeout: Maximale Wartezeit auf die Vektorsuche der hybriden Suche in Sekunden
+            knowledge_dir: Optional, Verzeichnis mit den Markdown-Wissensquellen
+            structured_answers: Filter-Anfragen (z.B. "günstige Restaurants für Familien")
+                direkt aus der Eintragstabelle beantworten
+            theme_routing: Suche auf die vorhergesagten Themen der Anfrage beschränken
+            theme_routing_confidence: Mindestwahrscheinlichkeit der Themen, sonst wird alles durchsucht
         """
         self.api_key = openai_api_key
         self.model = model
+        self.base_url = base_url
+        self.client_settings = client_settings
+        self.answer_cache = answer_cache
+        self.semantic_cache = semantic_cache
+        self.rate_limiter = rate_limiter
+        self.context_packer = context_packer or ContextPacker(model=model)
         
-        # Wissensquellen laden
-        self.knowledge_base = self._load_knowledge_base()
+        # Verlauf pro Session verdichten, ältere Runden werden im Hintergrund zusammengefasst
+        self.history_compactor = history_compactor or HistoryCompactor(model=model)
+        if self.history_compactor.summarize_fn is None:
+            self.history_compactor.summarize_fn = self._summarize_history
+        
+        self.knowledge_dir: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        
+        # Trace der letzten Anfrage (für die Debug-Ansicht)
+        self.last_trace: Optional[Trace] = None
+        
+        # Tabelle der Einträge mit Bewertung, Preis und Eignung für exakte Filter-Anfragen
+        self.structured_answers = structured_answers and PANDAS_AVAILABLE
+        
+        # Themen-Router: schränkt die Suche auf Restaurants, Unterkünfte, Wandern, ... ein
+        self.theme_routing = theme_routing
+        self.theme_routing_confidence = theme_routing_confidence
+        
+        # Wissensquellen laden (bevorzugt aus dem Korpus-Snapshot, samt Index) und mit
+        # Eintragstabelle und Themen-Router zu einem gemeinsam austauschbaren Stand bündeln
+        with span("knowledge_load") as load_span:
+            corpus = self._load_corpus(knowledge_dir)
+            self.state = self._build_state(corpus)
+            load_span.set(documents=len(self.state.documents), files=len(self.state.file_versions))
+        
+        # Hybride Suche: Stichwort- und Vektorsuche parallel, Fallback auf den verfügbaren Zweig
+        self.retriever = HybridRetriever(self._simple_search, chroma_manager, leg_timeout=retrieval_leg_timeout)
         
         # Base prompt für LLM-Anfragen
         self.base_system_prompt = """
@@ -56,235 +162,775 @@ Sprachliche Besonderheiten:
 - Beende Nachrichten gerne mit "Servus!", "Bis bald!" oder ähnlichen Grußformeln
 """
     
-    def _load_knowledge_base(self) -> List[Dict[str, Any]]:
+    def _resolve_knowledge_dir(self, knowledge_dir: Optional[str] = None) -> Optional[str]:
+        """
+        Bestimmt das Wissensverzeichnis.
+        
+        Args:
+            knowledge_dir: Optional, gewünschtes Verzeichnis (Standard: knowledge/)
+            
+        Returns:
+            Das Verzeichnis oder None, wenn keines gefunden wurde
+        """
+        if knowledge_dir is None:
+            knowledge_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge")
+        if os.path.exists(knowledge_dir):
+            return knowledge_dir
+        
+        # Alternativen ausprobieren
+        alternative_dir = os.path.join(os.getcwd(), "knowledge")
+        if os.path.exists(alternative_dir):
+            return alternative_dir
+        return None
+    
+    def _load_corpus(self, knowledge_dir: Optional[str] = None) -> Optional[ParsedCorpus]:
         """
         Lädt Markdown-Dateien und extrahiert deren Inhalte.
+        Der Korpus wird von allen Sessions des Prozesses gemeinsam genutzt und nur
+        beim ersten Zugriff geladen (bevorzugt aus dem Snapshot).
+        
+        Args:
+            knowledge_dir: Optional, Verzeichnis mit den Markdown-Dateien (Standard: knowledge/)
         
         Returns:
-            Liste von Dokumenten mit Metadaten
-        """
-        documents = []
-        knowledge_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge")
-        if not os.path.exists(knowledge_dir):
-            # Alternativen ausprobieren
-            alternative_dir = os.path.join(os.getcwd(), "knowledge")
-            if os.path.exists(alternative_dir):
-                knowledge_dir = alternative_dir
-            else:
-                print("Wissensverzeichnis nicht gefunden.")
-                return documents
-        
-        # Alle Markdown-Dateien im Wissensverzeichnis finden
-        markdown_files = glob.glob(os.path.join(knowledge_dir, "*.md"))
-        
-        for file_path in markdown_files:
-            try:
-                file_name = os.path.basename(file_path)
-                theme = os.path.splitext(file_name)[0]
-                
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    content = file.read()
-                
-                # Dokument in Abschnitte aufteilen
-                sections = self._split_into_sections(content)
-                
-                for section in sections:
-                    heading = section.get("heading", "Allgemein")
-                    subheading = section.get("subheading", "")
-                    text = section.get("text", "")
-                    
-                    if text.strip():
-                        documents.append({
-                            "content": text,
-                            "metadata": {
-                                "theme": theme,
-                                "source_file": file_name,
-                                "heading": heading,
-                                "subheading": subheading
-                            }
-                        })
-            except Exception as e:
-                print(f"Fehler beim Laden von {file_path}: {str(e)}")
+            Der Korpus mit Dokumenten, Versionen und Index oder None ohne Wissensverzeichnis
+        """
+        self.knowledge_dir = self._resolve_knowledge_dir(knowledge_dir)
+        if self.knowledge_dir is None:
+            print("Wissensverzeichnis nicht gefunden.")
+            return None
         
-        print(f"{len(documents)} Dokumente aus {len(markdown_files)} Dateien geladen.")
-        return documents
+        corpus = get_shared_corpus(self.knowledge_dir)
+        print(f"{len(corpus.documents)} Dokumente aus {len(corpus.files)} Dateien geladen "
+              f"({'Snapshot' if corpus.source == 'snapshot' else 'neu zerlegt'}).")
+        return corpus
     
-    def _split_into_sections(self, content: str) -> List[Dict[str, Any]]:
+    def _build_state(self, corpus: Optional[ParsedCorpus]) -> KnowledgeState:
         """
-        Teilt einen Markdown-Text in Abschnitte.
+        Stellt den Stand der Wissensbasis zu einem Korpus zusammen.
         
         Args:
-            content: Der Markdown-Inhalt
+            corpus: Der Korpus der Wissensbasis (None: leere Wissensbasis)
             
         Returns:
-            Liste von Abschnitten mit Überschriften und Text
+            Der neue Stand
         """
-        sections = []
-        current_section = {
-            "heading": "Allgemein",
-            "subheading": "",
-            "text": ""
-        }
+        if corpus is None:
+            return KnowledgeState(None, [], {}, BM25Index([]), None, None)
+        return KnowledgeState(
+            corpus=corpus,
+            documents=corpus.documents,
+            file_versions=corpus.file_versions,
+            search_index=corpus.search_index,
+            entry_table=self._build_entry_table(corpus),
+            theme_router=self._build_theme_router(corpus)
+        )
+    
+    # Lesezugriff auf den aktuellen Stand (jeder Zugriff kann nach einem Neuladen einen neueren Stand sehen)
+    @property
+    def corpus(self) -> Optional[ParsedCorpus]:
+        return self.state.corpus
+    
+    @property
+    def knowledge_base(self) -> List[Dict[str, Any]]:
+        return self.state.documents
+    
+    @property
+    def file_versions(self) -> Dict[str, str]:
+        return self.state.file_versions
+    
+    @property
+    def search_index(self) -> Optional[BM25Index]:
+        return self.state.search_index
+    
+    @property
+    def entry_table(self) -> Optional[EntryTable]:
+        return self.state.entry_table
+    
+    @property
+    def theme_router(self) -> Optional[ThemeRouter]:
+        return self.state.theme_router
+    
+    def _build_entry_table(self, corpus: Optional[ParsedCorpus]) -> Optional[EntryTable]:
+        """
+        Liefert die Eintragstabelle eines Korpus (nur wenn strukturierte Antworten aktiv sind).
+        Sie wird je Korpus einmal aufgebaut und von allen Sessions geteilt.
+        
+        Args:
+            corpus: Der Korpus der Wissensbasis
+            
+        Returns:
+            Die Tabelle oder None
+        """
+        if not self.structured_answers or corpus is None:
+            return None
         
-        lines = content.split('\n')
+        def build() -> EntryTable:
+            with span("entry_table_build") as build_span:
+                table = EntryTable.from_documents(corpus.documents)
+                build_span.set(entries=len(table))
+            return table
         
-        for line in lines:
-            # Hauptüberschrift erkennen (# Titel)
-            if line.strip().startswith('# '):
-                # Vorherigen Abschnitt speichern, wenn vorhanden
-                if current_section["text"].strip():
-                    sections.append(current_section.copy())
-                
-                current_section = {
-                    "heading": line.lstrip('# ').strip(),
-                    "subheading": "",
-                    "text": ""
-                }
+        try:
+            return shared_resources.derived(corpus, "entry_table", build)
+        except Exception as e:
+            print(f"Fehler beim Aufbau der Eintragstabelle: {str(e)}")
+            return None
+    
+    def _build_theme_router(self, corpus: Optional[ParsedCorpus]) -> Optional[ThemeRouter]:
+        """
+        Liefert den Themen-Router eines Korpus (nur wenn das Routing aktiv ist).
+        Er wird je Korpus und Schwellwert einmal aufgebaut und von allen Sessions geteilt.
+        
+        Args:
+            corpus: Der Korpus der Wissensbasis
             
-            # Unterüberschrift erkennen (## Titel)
-            elif line.strip().startswith('## '):
-                # Vorherigen Abschnitt speichern, wenn vorhanden
-                if current_section["text"].strip():
-                    sections.append(current_section.copy())
-                
-                current_section = {
-                    "heading": current_section["heading"],
-                    "subheading": line.lstrip('## ').strip(),
-                    "text": ""
-                }
+        Returns:
+            Der Router oder None
+        """
+        if not self.theme_routing or corpus is None or not corpus.search_index:
+            return None
+        
+        def build() -> ThemeRouter:
+            with span("theme_router_build") as build_span:
+                router = ThemeRouter(corpus.search_index, min_confidence=self.theme_routing_confidence)
+                build_span.set(kinds=len(router.kinds), vocabulary=len(router.log_likelihoods))
+            return router
+        
+        try:
+            return shared_resources.derived(corpus, ("theme_router", self.theme_routing_confidence), build)
+        except Exception as e:
+            print(f"Fehler beim Aufbau des Themen-Routers: {str(e)}")
+            return None
+    
+    def reload_files(self, changed_paths: List[str], removed_paths: List[str] = None) -> List[str]:
+        """
+        Übernimmt Änderungen an einzelnen Wissensdateien ohne Neustart.
+        
+        Nur die geänderten Dateien werden neu eingelesen und zerlegt. Index, Abschnitte,
+        Versionen, Eintragstabelle und Themen-Router werden als neuer Stand vollständig
+        aufgebaut und mit einer einzigen Zuweisung ausgetauscht; laufende Anfragen arbeiten
+        mit dem Stand zu Ende, den sie zu Beginn gelesen haben.
+        Hat eine andere Session die Änderungen bereits übernommen, wird deren Korpus
+        verwendet. Betroffene Einträge der Antwort-Caches werden anschließend verworfen.
+        
+        Args:
+            changed_paths: Pfade geänderter oder neuer Dateien
+            removed_paths: Optional, Pfade gelöschter Dateien
+            
+        Returns:
+            Namen der Dateien, deren Inhalt sich tatsächlich geändert hat
+        """
+        if self.state.corpus is None:
+            return []
+        
+        with self._reload_lock, span("knowledge_reload") as reload_span:
+            state = self.state
+            corpus, affected = update_shared_corpus(state.corpus, changed_paths, removed_paths)
+            reload_span.set(files=len(affected))
+            if not affected:
+                # Inhalt unverändert: nur den aktuellen Korpus als Grundlage übernehmen
+                self.state = state._replace(corpus=corpus)
+                return []
             
-            # Inhalt zum aktuellen Abschnitt hinzufügen
-            else:
-                current_section["text"] += line + '\n'
+            # Austausch des gesamten Stands mit einer Zuweisung
+            self.state = self._build_state(corpus)
         
-        # Letzten Abschnitt speichern, wenn vorhanden
-        if current_section["text"].strip():
-            sections.append(current_section.copy())
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_files(affected)
+        if self.semantic_cache is not None:
+            self.semantic_cache.invalidate_files(affected)
         
-        return sections
+        print(f"Wissensbasis aktualisiert ({', '.join(affected)}): {len(corpus.documents)} Dokumente.")
+        return affected
     
-    def _simple_search(self, query: str, n_results: int = 3) -> List[Dict[str, Any]]:
+    def _split_into_sections(self, content: str) -> List[Dict[str, Any]]:
         """
-        Einfache Textsuche nach relevanten Dokumenten.
+        Teilt einen Markdown-Text in Abschnitte (ein Abschnitt je ###-Eintrag).
+        
+        Args:
+            content: Der Markdown-Inhalt
+            
+        Returns:
+            Liste von Abschnitten mit Überschriften ("heading", "subheading", "entry") und Text
+        """
+        return list(iter_markdown_chunks(content.split('\n')))
+    
+    def _simple_search(self,
+                       query: str,
+                       n_results: int = 3,
+                       themes: Optional[List[str]] = None,
+                       state: Optional[KnowledgeState] = None) -> List[Dict[str, Any]]:
+        """
+        Stichwortsuche nach relevanten Dokumenten über den BM25-Index.
         
         Args:
             query: Die Suchanfrage
             n_results: Anzahl der zurückzugebenden Ergebnisse
+            themes: Optional, nur Abschnitte dieser Themen durchsuchen
+            state: Optional, Stand der Wissensbasis der laufenden Anfrage (Standard: aktueller Stand)
             
         Returns:
             Liste mit relevanten Dokumenten
         """
-        if not self.knowledge_base:
+        index = (state or self.state).search_index
+        if not index:
             return []
         
-        # Suchanfrage in Schlüsselwörter aufteilen
-        keywords = re.findall(r'\w+', query.lower())
-        if not keywords:
-            return []
+        # BM25-Ranking über den invertierten Index
+        top_results = index.search(query, n_results=n_results, partitions=themes)
         
-        results = []
+        return [index.documents[doc_index] for doc_index, _ in top_results]
+    
+    def _recent_history(self, chat_history: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
+        """
+        Wählt den Teil des Chat-Verlaufs aus, der an das LLM geschickt wird:
+        die laufende Zusammenfassung älterer Runden und die letzten Runden wörtlich.
         
-        # Für jedes Dokument berechnen, wie viele Schlüsselwörter enthalten sind
-        for doc in self.knowledge_base:
-            content = doc["content"].lower()
-            matches = 0
+        Args:
+            chat_history: Optional, bisheriger Chat-Verlauf
             
-            for keyword in keywords:
-                if keyword in content:
-                    matches += 1
+        Returns:
+            Die zu sendenden Nachrichten des Verlaufs
+        """
+        if not chat_history:
+            return []
+        return self.history_compactor.compact(chat_history)
+    
+    def _summarize_history(self, previous_summary: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Erweitert die Zusammenfassung des Gesprächs per LLM um neue Nachrichten.
+        Wird vom HistoryCompactor im Hintergrund aufgerufen.
+        
+        Args:
+            previous_summary: Die bisherige Zusammenfassung
+            messages: Die neu zusammenzufassenden Nachrichten
             
-            # Nur Dokumente mit mindestens einem Treffer berücksichtigen
-            if matches > 0:
-                results.append({
-                    "document": doc,
-                    "matches": matches
-                })
+        Returns:
+            Die neue Zusammenfassung
+        """
+        if not self.api_key:
+            return ""
         
-        # Nach Anzahl der Treffer sortieren
-        results.sort(key=lambda x: x["matches"], reverse=True)
+        transcript = "\n".join(
+            f"{'Gast' if message['role'] == 'user' else 'Assistent'}: {message['content']}"
+            for message in messages
+        )
+        prompt = (
+            "Fasse das bisherige Gespräch zwischen einem Gast und dem Tourismus-Assistenten für "
+            "Saalbach-Hinterglemm knapp auf Deutsch zusammen. Behalte Wünsche, Reisedaten, "
+            "Personen (z.B. Kinder) und bereits empfohlene Orte. Höchstens 5 Sätze.\n\n"
+            f"Bisherige Zusammenfassung:\n{previous_summary or '(noch keine)'}\n\n"
+            f"Neue Nachrichten:\n{transcript}"
+        )
+        messages = [{"role": "user", "content": prompt}]
+        request = {"messages": messages, "token_usage": {"total": count_tokens(prompt, self.model)}}
         
-        # Nur die gewünschte Anzahl an Ergebnissen zurückgeben
-        top_results = results[:n_results]
+        client = get_openai_client(self.api_key, self.base_url, self.client_settings)
+        with span("history_summary"), self._llm_slot(request) as usage:
+            response = client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=self.history_compactor.summary_token_budget
+            )
+            self._record_usage(response.usage, usage, purpose="summary")
         
-        return [result["document"] for result in top_results]
+        return response.choices[0].message.content or ""
     
-    def answer_query(self, query: str, chat_history: List[Dict[str, str]] = None) -> str:
+    def _build_messages(self,
+                        query: str,
+                        relevant_docs: List[Dict[str, Any]],
+                        chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
-        Beantwortet eine Benutzeranfrage.
+        Erstellt die Nachrichtenliste für das LLM aus Wissenskontext, Verlauf und Anfrage.
+        Der ContextPacker hält dabei das Prompt-Budget ein.
         
         Args:
             query: Die Benutzeranfrage
+            relevant_docs: Die abgerufenen Abschnitte der Wissensbasis
             chat_history: Optional, bisheriger Chat-Verlauf
             
         Returns:
-            Die generierte Antwort
+            Ergebnis des ContextPackers mit Nachrichten und Token-Verbrauch je Bestandteil
         """
-        try:
-            print(f"\n--- Neue Anfrage: '{query}' ---")
-            
-            # Prüfen, ob der API-Key gesetzt ist
-            if not self.api_key:
-                return "Servus! Ich brauche einen API-Schlüssel, um dir helfen zu können. Bitte gib einen OpenAI API-Schlüssel in den Einstellungen ein. Danke! 😊"
-            
-            # Relevante Informationen abrufen
-            relevant_docs = self._simple_search(query, n_results=3)
-            
-            # Prompt erstellen
-            context = ""
-            if relevant_docs:
-                context_parts = []
-                for i, doc in enumerate(relevant_docs):
-                    context_part = f"INFORMATION {i+1} (Thema: {doc['metadata']['theme']}):\n"
-                    if doc['metadata']['heading']:
-                        context_part += f"Überschrift: {doc['metadata']['heading']}\n"
-                    if doc['metadata']['subheading']:
-                        context_part += f"Unterüberschrift: {doc['metadata']['subheading']}\n"
-                    context_part += f"{doc['content']}\n\n"
-                    context_parts.append(context_part)
-                
-                context = "\n".join(context_parts)
-            else:
-                context = "Keine spezifischen Informationen verfügbar. Nutze dein eigenes Wissen über die Region Saalbach-Hinterglemm."
-            
-            system_prompt = f"{self.base_system_prompt}\n\nZUSÄTZLICHE INFORMATIONEN:\n{context}"
-            
-            # Chat-Verlauf vorbereiten
-            messages = [{"role": "system", "content": system_prompt}]
+        # Abschnitte in Rangfolge formatieren
+        context_parts = []
+        for i, doc in enumerate(relevant_docs):
+            context_part = f"INFORMATION {i+1} (Thema: {doc['metadata']['theme']}):\n"
+            if doc['metadata']['heading']:
+                context_part += f"Überschrift: {doc['metadata']['heading']}\n"
+            if doc['metadata']['subheading']:
+                context_part += f"Unterüberschrift: {doc['metadata']['subheading']}\n"
+            context_part += f"{doc['content']}\n\n"
+            context_parts.append(context_part)
+        
+        with span("prompt_build") as build_span:
+            packed = self.context_packer.pack(
+                system_prompt=self.base_system_prompt,
+                sections=context_parts,
+                history=self._recent_history(chat_history),
+                query=query,
+                empty_context="Keine spezifischen Informationen verfügbar. Nutze dein eigenes Wissen über die Region Saalbach-Hinterglemm."
+            )
+            build_span.set(
+                prompt_tokens_estimated=packed["token_usage"]["total"],
+                truncated_sections=len(packed["truncated_sections"]),
+                skipped_sections=len(packed["skipped_sections"])
+            )
+        
+        usage = packed["token_usage"]
+        print(
+            f"Prompt: {usage['total']}/{usage['budget']} Tokens (System {usage['system']}, "
+            f"Kontext {usage['context']}, Verlauf {usage['history']}, Anfrage {usage['query']}); "
+            f"Abschnitte gekürzt: {len(packed['truncated_sections'])}, übersprungen: {len(packed['skipped_sections'])}"
+        )
+        
+        return packed
+    
+    def _cache_key(self,
+                   query: str,
+                   relevant_docs: List[Dict[str, Any]],
+                   chat_history: List[Dict[str, str]] = None,
+                   file_versions: Optional[Dict[str, str]] = None) -> str:
+        """
+        Erstellt den Schlüssel für den Antwort-Cache.
+        
+        Der Schlüssel enthält die IDs der abgerufenen Abschnitte und die Versionen
+        ihrer Quelldateien. Eine geänderte Wissensdatei betrifft dadurch nur Einträge,
+        deren Kontext aus dieser Datei stammt.
+        
+        Args:
+            query: Die Benutzeranfrage
+            relevant_docs: Die abgerufenen Abschnitte der Wissensbasis
+            chat_history: Optional, bisheriger Chat-Verlauf
+            file_versions: Optional, Dateiversionen des Stands der Anfrage (Standard: aktueller Stand)
             
-            # Chat-Verlauf hinzufügen, falls vorhanden
-            if chat_history:
-                recent_history = chat_history[-5:] if len(chat_history) > 5 else chat_history
-                messages.extend(recent_history)
+        Returns:
+            Der Cache-Schlüssel
+        """
+        file_versions = self.state.file_versions if file_versions is None else file_versions
+        source_files = {doc["metadata"]["source_file"] for doc in relevant_docs}
+        history_digest = hashlib.sha1(
+            json.dumps(self._recent_history(chat_history), ensure_ascii=False, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        prompt_digest = hashlib.sha1(
+            f"{self.base_system_prompt}|{self.context_packer.prompt_token_budget}|{self.context_packer.max_section_tokens}".encode('utf-8')
+        ).hexdigest()
+        
+        return make_cache_key(
+            query,
+            self.model,
+            [doc["id"] for doc in relevant_docs],
+            {name: file_versions.get(name, "") for name in source_files},
+            extra=f"{prompt_digest}:{history_digest}"
+        )
+    
+    def _prepare_request(self, query: str, chat_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Führt Retrieval und Cache-Prüfung aus und erstellt die Nachrichten für das LLM.
+        
+        Args:
+            query: Die Benutzeranfrage
+            chat_history: Optional, bisheriger Chat-Verlauf
             
-            # Aktuelle Anfrage hinzufügen
-            messages.append({"role": "user", "content": query})
+        Returns:
+            Dictionary mit abgerufenen Abschnitten, Cache-Schlüssel, ggf. gecachter oder
+            strukturierter Antwort (und deren Quelle), den Nachrichten für das LLM und deren Token-Verbrauch
+            sowie dem Stand der Wissensbasis, mit dem die Anfrage bearbeitet wurde
+        """
+        # Stand der Wissensbasis einmal lesen, ein paralleles Neuladen betrifft erst die nächste Anfrage
+        state = self.state
+        request = {
+            "relevant_docs": [],
+            "cache_key": None,
+            "cached_answer": None,
+            "cache_source": None,
+            "query_embedding": None,
+            "messages": None,
+            "token_usage": None,
+            "chat_history": chat_history or [],
+            "knowledge_state": state
+        }
+        
+        # Filter-Anfragen exakt aus der Eintragstabelle beantworten (ohne Retrieval und LLM);
+        # Folgefragen beziehen sich auf den Verlauf und gehen immer an das LLM
+        structured = None
+        if state.entry_table is not None and not chat_history:
+            with span("structured_lookup") as lookup_span:
+                structured = lookup_entry_query(state.entry_table, query)
+                lookup_span.set(
+                    hit=structured is not None and structured["answer"] is not None,
+                    rows=len(structured["rows"]) if structured is not None else 0
+                )
+            if structured is not None and structured["answer"] is not None:
+                print("Antwort aus der Eintragstabelle geliefert.")
+                request["cached_answer"] = structured["answer"]
+                request["cache_source"] = "structured"
+                return request
+        
+        # Semantischer Cache nur für eigenständige Fragen ohne Gesprächskontext
+        if self.semantic_cache is not None and not chat_history:
+            with span("semantic_cache_lookup") as lookup_span:
+                request["query_embedding"] = self.semantic_cache.embed(query)
+                match = self.semantic_cache.lookup(request["query_embedding"], self._semantic_scope())
+                lookup_span.set(hit=match is not None)
+            if match is not None:
+                print(f"Antwort aus dem semantischen Cache geliefert (Ähnlichkeit {match['similarity']:.3f} zu '{match['matched_query']}').")
+                request["cached_answer"] = match["answer"]
+                request["cache_source"] = "semantic_cache"
+                return request
+        
+        # Themen der Anfrage vorhersagen, bei unsicherer Zuordnung wird alles durchsucht
+        themes = None
+        theme_router = state.theme_router
+        if theme_router is not None:
+            with span("theme_routing") as routing_span:
+                route = theme_router.route(query)
+                themes = route["themes"]
+                routing_span.set(kinds=route["kinds"], confidence=route["confidence"], routed=themes is not None)
+        
+        keyword_search = functools.partial(self._simple_search, state=state)
+        with span("retrieval") as retrieval_span:
+            request["relevant_docs"] = self.retriever.search(query, n_results=3, themes=themes, keyword_search=keyword_search)
+            if themes is not None and not request["relevant_docs"]:
+                # Keine Treffer in den vorhergesagten Themen: ohne Einschränkung suchen
+                request["relevant_docs"] = self.retriever.search(query, n_results=3, keyword_search=keyword_search)
+            if structured is not None:
+                # Passende Einträge der Tabelle als zusätzlicher Kontext nach den Suchtreffern
+                found = {doc["id"] for doc in request["relevant_docs"]}
+                request["relevant_docs"] += [doc for doc in structured["documents"] if doc["id"] not in found]
+            retrieval_span.set(results=len(request["relevant_docs"]))
+        
+        # Antwort-Cache prüfen
+        if self.answer_cache is not None:
+            with span("answer_cache_lookup") as lookup_span:
+                request["cache_key"] = self._cache_key(query, request["relevant_docs"], chat_history, state.file_versions)
+                request["cached_answer"] = self.answer_cache.get(request["cache_key"])
+                lookup_span.set(hit=request["cached_answer"] is not None)
+            if request["cached_answer"] is not None:
+                print("Antwort aus dem Cache geliefert.")
+                request["cache_source"] = "answer_cache"
+                return request
+        
+        packed = self._build_messages(query, request["relevant_docs"], chat_history)
+        request["messages"] = packed["messages"]
+        request["token_usage"] = packed["token_usage"]
+        return request
+    
+    def _semantic_scope(self) -> str:
+        """
+        Gültigkeitsbereich für den semantischen Cache: das Modell.
+        Einträge zu geänderten Wissensdateien entfernt reload_files gezielt per invalidate_files,
+        Antworten zu anderen Dateien bleiben dadurch gültig.
+        
+        Returns:
+            Der Gültigkeitsbereich als String
+        """
+        return self.model
+    
+    def _store_answer(self, request: Dict[str, Any], query: str, answer: str) -> None:
+        """
+        Legt eine erfolgreich generierte Antwort in den Antwort-Caches ab und
+        stößt die Verdichtung des Verlaufs an.
+        
+        Args:
+            request: Die vorbereitete Anfrage aus _prepare_request
+            query: Die Benutzeranfrage
+            answer: Die generierte Antwort
+        """
+        if not answer:
+            return
+        
+        # Aus dem wörtlichen Fenster gefallene Runden im Hintergrund verdichten
+        self.history_compactor.schedule_update(
+            request["chat_history"] + [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+        )
+        
+        source_files = [doc["metadata"]["source_file"] for doc in request["relevant_docs"]]
+        
+        with span("cache_store"):
+            if self.answer_cache is not None and request["cache_key"] is not None:
+                self.answer_cache.set(request["cache_key"], answer, source_files)
             
-            print(f"Sende Anfrage an OpenAI ({self.model})...")
+            # Hat sich eine Quelldatei während der Generierung geändert, wurden ihre Einträge
+            # bereits entfernt; die veraltete Antwort darf dann nicht neu abgelegt werden
+            request_versions = request["knowledge_state"].file_versions
+            current_versions = self.state.file_versions
+            unchanged = all(request_versions.get(name) == current_versions.get(name) for name in source_files)
+            if self.semantic_cache is not None and request["query_embedding"] is not None and unchanged:
+                self.semantic_cache.add(
+                    request["query_embedding"], query, answer,
+                    self._semantic_scope(), source_files
+                )
+    
+    def _estimate_tokens(self, request: Dict[str, Any]) -> int:
+        """
+        Schätzt den Token-Bedarf einer Anfrage (Prompt plus maximale Antwortlänge).
+        
+        Args:
+            request: Die vorbereitete Anfrage aus _prepare_request
             
-            # OpenAI-Client konfigurieren
-            client = openai.OpenAI(api_key=self.api_key)
+        Returns:
+            Geschätzte Anzahl an Tokens
+        """
+        return request["token_usage"]["total"] + MAX_ANSWER_TOKENS
+    
+    def _llm_slot(self, request: Dict[str, Any]):
+        """
+        Gibt den Kontextmanager zurück, der einen LLM-Aufruf beim Rate-Limiter anmeldet.
+        Ohne Rate-Limiter wird ein leerer Kontextmanager geliefert.
+        
+        Args:
+            request: Die vorbereitete Anfrage aus _prepare_request
+        """
+        if self.rate_limiter is None:
+            return nullcontext({"used_tokens": None})
+        return self.rate_limiter.limit(self._estimate_tokens(request))
+    
+    def _record_usage(self, api_usage: Any, limiter_usage: Dict[str, Any], purpose: str = "answer") -> None:
+        """
+        Übernimmt den Token-Verbrauch laut API-Antwort in Rate-Limiter und Metriken.
+        
+        Args:
+            api_usage: usage-Objekt der API-Antwort (kann None sein)
+            limiter_usage: Usage-Dictionary des Rate-Limiter-Slots
+            purpose: Zweck des Aufrufs für die Metriken
+        """
+        if api_usage is None:
+            return
+        limiter_usage["used_tokens"] = api_usage.total_tokens
+        record_token_usage(self.model, api_usage.prompt_tokens, api_usage.completion_tokens, purpose=purpose)
+    
+    def _fallback_message(self, error: Exception) -> str:
+        """
+        Liefert eine freundliche Antwort für den Fehlerfall.
+        
+        Args:
+            error: Die aufgetretene Ausnahme
             
-            # Anfrage an das LLM senden
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.8,
-                max_tokens=1000
-            )
+        Returns:
+            Die Fallback-Antwort für den Gast
+        """
+        if isinstance(error, RateLimitExceeded):
+            return OVERLOAD_ERROR_MESSAGE
+        elif "API key" in str(error).lower():
+            return CONNECTION_ERROR_MESSAGE
+        elif "quota" in str(error).lower() or "billing" in str(error).lower():
+            return OVERLOAD_ERROR_MESSAGE
+        else:
+            return GENERIC_ERROR_MESSAGE
+    
+    def answer_query(self, query: str, chat_history: List[Dict[str, str]] = None) -> str:
+        """
+        Beantwortet eine Benutzeranfrage.
+        
+        Args:
+            query: Die Benutzeranfrage
+            chat_history: Optional, bisheriger Chat-Verlauf
             
-            # Antwort zurückgeben
-            answer = response.choices[0].message.content
-            print(f"Antwort erhalten (Länge: {len(answer)} Zeichen)")
-            return answer
+        Returns:
+            Die generierte Antwort
+        """
+        with start_trace("answer_query", path="sync", model=self.model) as trace:
+            self.last_trace = trace
+            try:
+                print(f"\n--- Neue Anfrage: '{query}' ---")
+                
+                # Prüfen, ob der API-Key gesetzt ist
+                if not self.api_key:
+                    trace.outcome = "no_api_key"
+                    return MISSING_API_KEY_MESSAGE
+                
+                request = self._prepare_request(query, chat_history)
+                if request["cached_answer"] is not None:
+                    trace.outcome = request["cache_source"]
+                    return request["cached_answer"]
+                
+                print(f"Sende Anfrage an OpenAI ({self.model})...")
+                
+                # Gemeinsamen OpenAI-Client aus dem Pool verwenden
+                client = get_openai_client(self.api_key, self.base_url, self.client_settings)
+                
+                # Anfrage an das LLM senden (wartet bei Bedarf auf freies Kontingent)
+                with span("llm"), self._llm_slot(request) as usage:
+                    response = client.chat.completions.create(
+                        model=self.model,
+                        messages=request["messages"],
+                        temperature=0.8,
+                        max_tokens=MAX_ANSWER_TOKENS
+                    )
+                    self._record_usage(response.usage, usage)
+                
+                # Antwort zurückgeben
+                answer = response.choices[0].message.content
+                print(f"Antwort erhalten (Länge: {len(answer)} Zeichen)")
+                
+                self._store_answer(request, query, answer)
+                trace.outcome = "llm"
+                
+                return answer
+                
+            except Exception as e:
+                error_msg = f"Fehler bei der Anfrage an OpenAI: {str(e)}"
+                print(error_msg)
+                trace.outcome = "error"
+                
+                # Im Fehlerfall trotzdem eine freundliche, persönliche Antwort geben
+                return self._fallback_message(e)
+    
+    def answer_query_stream(self, query: str, chat_history: List[Dict[str, str]] = None) -> Iterator[str]:
+        """
+        Beantwortet eine Benutzeranfrage und liefert die Antwort Token für Token.
+        
+        Fehler werden nicht weitergereicht: Tritt ein Fehler vor dem ersten Token auf,
+        wird die passende Fallback-Antwort geliefert. Bricht der Stream mittendrin ab,
+        bleibt der bisherige Text stehen und die Fallback-Antwort wird als eigener
+        Absatz angehängt.
+        
+        Args:
+            query: Die Benutzeranfrage
+            chat_history: Optional, bisheriger Chat-Verlauf
             
-        except Exception as e:
-            error_msg = f"Fehler bei der Anfrage an OpenAI: {str(e)}"
-            print(error_msg)
+        Yields:
+            Textfragmente der Antwort in Reihenfolge
+        """
+        streamed_chars = 0
+        
+        with start_trace("answer_query", path="stream", model=self.model) as trace:
+            self.last_trace = trace
+            try:
+                print(f"\n--- Neue Anfrage (Stream): '{query}' ---")
+                
+                # Prüfen, ob der API-Key gesetzt ist
+                if not self.api_key:
+                    trace.outcome = "no_api_key"
+                    yield MISSING_API_KEY_MESSAGE
+                    return
+                
+                # Ein Cache-Treffer wird in einem Stück geliefert
+                request = self._prepare_request(query, chat_history)
+                if request["cached_answer"] is not None:
+                    trace.outcome = request["cache_source"]
+                    yield request["cached_answer"]
+                    return
+                
+                print(f"Sende Stream-Anfrage an OpenAI ({self.model})...")
+                
+                # Gemeinsamen OpenAI-Client aus dem Pool verwenden
+                client = get_openai_client(self.api_key, self.base_url, self.client_settings)
+                
+                # Slot bleibt belegt, bis der Stream vollständig gelesen ist. Der Span enthält
+                # auch die Zeit, die der Aufrufer zwischen zwei Fragmenten braucht.
+                answer_parts = []
+                with span("llm", stream=True) as llm_span, self._llm_slot(request) as usage:
+                    stream = client.chat.completions.create(
+                        model=self.model,
+                        messages=request["messages"],
+                        temperature=0.8,
+                        max_tokens=MAX_ANSWER_TOKENS,
+                        stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    
+                    for chunk in stream:
+                        # Der letzte Chunk enthält nur den Token-Verbrauch
+                        self._record_usage(getattr(chunk, "usage", None), usage)
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not streamed_chars:
+                                llm_span.set(ttft_ms=round(trace.offset_ms() - llm_span.start_ms, 3))
+                                trace.attributes["ttft_ms"] = round(trace.offset_ms(), 3)
+                            streamed_chars += len(delta)
+                            answer_parts.append(delta)
+                            yield delta
+                
+                print(f"Stream beendet (Länge: {streamed_chars} Zeichen)")
+                
+                # Nur vollständig empfangene Antworten cachen
+                self._store_answer(request, query, "".join(answer_parts))
+                trace.outcome = "llm"
+                
+            except Exception as e:
+                print(f"Fehler beim Stream von OpenAI nach {streamed_chars} Zeichen: {str(e)}")
+                trace.outcome = "error"
+                
+                # Bereits gelieferten Text nicht verwerfen, sondern Fallback anhängen
+                if streamed_chars:
+                    yield "\n\n"
+                yield self._fallback_message(e)
+
+    
+    async def answer_query_async(self, query: str, chat_history: List[Dict[str, str]] = None) -> str:
+        """
+        Beantwortet eine Benutzeranfrage asynchron.
+        
+        Retrieval und Cache-Prüfung laufen im Thread-Pool des Event-Loops, der
+        LLM-Aufruf über den gemeinsamen AsyncOpenAI-Client. Der Rate-Limiter lässt
+        Anfragen bei ausgeschöpftem Kontingent kurz warten, statt sie scheitern zu lassen.
+        
+        Args:
+            query: Die Benutzeranfrage
+            chat_history: Optional, bisheriger Chat-Verlauf
             
-            # Im Fehlerfall trotzdem eine freundliche, persönliche Antwort geben
-            if "API key" in str(e).lower():
-                return "Servus! Aktuell hab ich leider ein kleines technisches Problem mit meiner Verbindung. Könntest du es in ein paar Minuten nochmal probieren? Danke für dein Verständnis! 😊"
-            elif "quota" in str(e).lower() or "billing" in str(e).lower():
-                return "Grüß dich! Leider bin ich gerade ein bisserl überfordert - zu viele Gäste auf einmal! 😅 Kannst du in 5 Minuten nochmal vorbeischauen? Dann kann ich dir sicher weiterhelfen!"
-            else:
-                return "Servus! Entschuldige bitte, aktuell kann ich deine Anfrage nicht richtig beantworten. Magst du deine Frage vielleicht anders formulieren? Oder frag mich einfach nach konkreten Tipps zu Wandern, Biken, Skifahren oder guten Restaurants in Saalbach-Hinterglemm!"
+        Returns:
+            Die generierte Antwort
+        """
+        with start_trace("answer_query", path="async", model=self.model) as trace:
+            self.last_trace = trace
+            try:
+                print(f"\n--- Neue Anfrage (async): '{query}' ---")
+                
+                # Prüfen, ob der API-Key gesetzt ist
+                if not self.api_key:
+                    trace.outcome = "no_api_key"
+                    return MISSING_API_KEY_MESSAGE
+                
+                # Kontext mitgeben, damit die Spans im Thread-Pool im Trace landen
+                loop = asyncio.get_running_loop()
+                prepare = functools.partial(contextvars.copy_context().run, self._prepare_request, query, chat_history)
+                request = await loop.run_in_executor(None, prepare)
+                if request["cached_answer"] is not None:
+                    trace.outcome = request["cache_source"]
+                    return request["cached_answer"]
+                
+                print(f"Sende async Anfrage an OpenAI ({self.model})...")
+                
+                # Gemeinsamen AsyncOpenAI-Client des Event-Loops verwenden
+                client = get_async_openai_client(self.api_key, self.base_url, self.client_settings)
+                
+                if self.rate_limiter is None:
+                    slot = nullcontext({"used_tokens": None})
+                else:
+                    slot = self.rate_limiter.limit_async(self._estimate_tokens(request))
+                
+                with span("llm"):
+                    async with slot as usage:
+                        response = await client.chat.completions.create(
+                            model=self.model,
+                            messages=request["messages"],
+                            temperature=0.8,
+                            max_tokens=MAX_ANSWER_TOKENS
+                        )
+                        self._record_usage(response.usage, usage)
+                
+                answer = response.choices[0].message.content
+                print(f"Antwort erhalten (Länge: {len(answer)} Zeichen)")
+                
+                self._store_answer(request, query, answer)
+                trace.outcome = "llm"
+                
+                return answer
+                
+            except Exception as e:
+                print(f"Fehler bei der async Anfrage an OpenAI: {str(e)}")
+                trace.outcome = "error"
+                
+                # Im Fehlerfall trotzdem eine freundliche, persönliche Antwort geben
+                return self._fallback_message(e)
+
+
+# Kompatibilität: app.py verwendet den Namen RAGSystem
+RAGSystem = SimpleRAG
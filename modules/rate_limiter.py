@@ -0,0 +1,280 @@
+"""
+Ratenbegrenzung für LLM-Aufrufe des Saalbach Tourismus Chatbots.
+Begrenzt gleichzeitige Anfragen und hält Requests- und Tokens-pro-Minute-Limits
+über Token-Buckets ein, sodass Anfragen zur Hochsaison kurz warten statt mit
+Quota-Fehlern abzubrechen. Funktioniert sowohl aus Threads (Streamlit) als
+auch aus beliebigen asyncio-Event-Loops.
+"""
+
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Tuple, Iterator, AsyncIterator
+
+from modules.telemetry import span
+
+# Wartezeit zwischen zwei Versuchen, einen freien Slot zu bekommen
+_POLL_INTERVAL = 0.02
+
+_shared_limiters: Dict[Tuple, "LLMRateLimiter"] = {}
+_shared_limiters_lock = threading.Lock()
+
+
+class RateLimitExceeded(Exception):
+    """Wird ausgelöst, wenn eine Anfrage länger als erlaubt auf ihr Kontingent warten müsste."""
+
+
+class TokenBucket:
+    """Thread-sicherer Token-Bucket, der sich kontinuierlich bis zur Kapazität auffüllt."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        """
+        Initialisiert den Bucket (anfangs voll).
+
+        Args:
+            capacity: Maximale Anzahl an Tokens im Bucket
+            refill_per_second: Nachfüllrate in Tokens pro Sekunde
+        """
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """Füllt den Bucket seit der letzten Aktualisierung auf (Lock muss gehalten werden)."""
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+            self._updated = now
+
+    def try_acquire(self, amount: float) -> float:
+        """
+        Versucht, Tokens zu entnehmen.
+
+        Args:
+            amount: Benötigte Anzahl an Tokens (wird auf die Kapazität begrenzt)
+
+        Returns:
+            0.0 bei Erfolg, sonst die voraussichtliche Wartezeit in Sekunden
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.refill_per_second
+
+    def refund(self, amount: float) -> None:
+        """
+        Gibt zu viel reservierte Tokens zurück.
+
+        Args:
+            amount: Anzahl der zurückzugebenden Tokens
+        """
+        if amount <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class LLMRateLimiter:
+    """
+    Prozessweite Begrenzung für LLM-Aufrufe: maximale Anzahl gleichzeitiger
+    Anfragen sowie Token-Buckets für Requests und Tokens pro Minute.
+    """
+
+    def __init__(self,
+                 max_concurrent: int = 8,
+                 requests_per_minute: int = 500,
+                 tokens_per_minute: int = 200000,
+                 max_wait_seconds: float = 30.0):
+        """
+        Initialisiert den Rate-Limiter.
+
+        Args:
+            max_concurrent: Maximale Anzahl gleichzeitig laufender LLM-Aufrufe
+            requests_per_minute: Erlaubte Anfragen pro Minute
+            tokens_per_minute: Erlaubte Tokens (Prompt + Antwort) pro Minute
+            max_wait_seconds: Maximale Wartezeit, bevor RateLimitExceeded ausgelöst wird
+        """
+        self.max_concurrent = max_concurrent
+        self.max_wait_seconds = max_wait_seconds
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+
+    def _try_reserve(self, estimated_tokens: int) -> float:
+        """
+        Versucht, einen Slot sowie Request- und Token-Kontingent zu reservieren.
+
+        Returns:
+            0.0 bei Erfolg, sonst die empfohlene Wartezeit in Sekunden
+        """
+        if not self._slots.acquire(blocking=False):
+            return _POLL_INTERVAL
+
+        wait = self._requests.try_acquire(1)
+        if wait:
+            self._slots.release()
+            return wait
+
+        wait = self._tokens.try_acquire(estimated_tokens)
+        if wait:
+            self._requests.refund(1)
+            self._slots.release()
+            return wait
+
+        return 0.0
+
+    def _on_acquired(self, waited: float) -> None:
+        with self._stats_lock:
+            self.in_flight += 1
+            self.total_wait_seconds += waited
+
+    def _reject(self, estimated_tokens: int) -> None:
+        with self._stats_lock:
+            self.rejected += 1
+        raise RateLimitExceeded(
+            f"Lokales Rate-Limit: kein Kontingent (quota) für {estimated_tokens} Tokens "
+            f"innerhalb von {self.max_wait_seconds:.0f}s verfügbar"
+        )
+
+    def release(self, estimated_tokens: int = 0, used_tokens: int = None) -> None:
+        """
+        Gibt den Slot frei und verrechnet die tatsächlich verbrauchten Tokens.
+
+        Args:
+            estimated_tokens: Beim Reservieren geschätzte Tokens
+            used_tokens: Optional, tatsächlich verbrauchte Tokens laut API
+        """
+        if used_tokens is not None:
+            self._tokens.refund(estimated_tokens - used_tokens)
+        with self._stats_lock:
+            self.in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def acquire(self, estimated_tokens: int) -> None:
+        """
+        Wartet blockierend auf Slot und Kontingent.
+
+        Args:
+            estimated_tokens: Geschätzte Tokens der Anfrage (Prompt + maximale Antwort)
+
+        Raises:
+            RateLimitExceeded: Wenn die maximale Wartezeit überschritten würde
+        """
+        start = time.monotonic()
+        with span("rate_limit_wait", estimated_tokens=estimated_tokens):
+            while True:
+                wait = self._try_reserve(estimated_tokens)
+                if not wait:
+                    self._on_acquired(time.monotonic() - start)
+                    return
+                if time.monotonic() - start + wait > self.max_wait_seconds:
+                    self._reject(estimated_tokens)
+                time.sleep(max(wait, _POLL_INTERVAL))
+
+    async def acquire_async(self, estimated_tokens: int) -> None:
+        """
+        Wartet asynchron auf Slot und Kontingent, ohne den Event-Loop zu blockieren.
+
+        Args:
+            estimated_tokens: Geschätzte Tokens der Anfrage (Prompt + maximale Antwort)
+
+        Raises:
+            RateLimitExceeded: Wenn die maximale Wartezeit überschritten würde
+        """
+        start = time.monotonic()
+        with span("rate_limit_wait", estimated_tokens=estimated_tokens):
+            while True:
+                wait = self._try_reserve(estimated_tokens)
+                if not wait:
+                    self._on_acquired(time.monotonic() - start)
+                    return
+                if time.monotonic() - start + wait > self.max_wait_seconds:
+                    self._reject(estimated_tokens)
+                await asyncio.sleep(max(wait, _POLL_INTERVAL))
+
+    @contextmanager
+    def limit(self, estimated_tokens: int) -> Iterator[Dict[str, int]]:
+        """
+        Kontextmanager für einen blockierenden LLM-Aufruf.
+        Die tatsächlichen Tokens können über usage["used_tokens"] gemeldet werden.
+
+        Args:
+            estimated_tokens: Geschätzte Tokens der Anfrage
+        """
+        self.acquire(estimated_tokens)
+        usage = {"used_tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(estimated_tokens, usage["used_tokens"])
+
+    @asynccontextmanager
+    async def limit_async(self, estimated_tokens: int) -> AsyncIterator[Dict[str, int]]:
+        """
+        Asynchroner Kontextmanager für einen LLM-Aufruf.
+        Die tatsächlichen Tokens können über usage["used_tokens"] gemeldet werden.
+
+        Args:
+            estimated_tokens: Geschätzte Tokens der Anfrage
+        """
+        await self.acquire_async(estimated_tokens)
+        usage = {"used_tokens": None}
+        try:
+            yield usage
+        finally:
+            self.release(estimated_tokens, usage["used_tokens"])
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Gibt Auslastung und Wartezeiten des Limiters zurück.
+
+        Returns:
+            Dictionary mit laufenden, abgeschlossenen und abgelehnten Anfragen
+        """
+        with self._stats_lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_concurrent": self.max_concurrent,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_seconds": (self.total_wait_seconds / self.completed) if self.completed else 0.0
+            }
+
+
+def get_shared_rate_limiter(max_concurrent: int = 8,
+                            requests_per_minute: int = 500,
+                            tokens_per_minute: int = 200000,
+                            max_wait_seconds: float = 30.0) -> LLMRateLimiter:
+    """
+    Gibt den prozessweit gemeinsamen Rate-Limiter für die angegebenen Limits zurück.
+
+    Args:
+        max_concurrent: Maximale Anzahl gleichzeitig laufender LLM-Aufrufe
+        requests_per_minute: Erlaubte Anfragen pro Minute
+        tokens_per_minute: Erlaubte Tokens pro Minute
+        max_wait_seconds: Maximale Wartezeit pro Anfrage
+
+    Returns:
+        Der gemeinsam genutzte Rate-Limiter
+    """
+    key = (max_concurrent, requests_per_minute, tokens_per_minute, max_wait_seconds)
+    with _shared_limiters_lock:
+        limiter = _shared_limiters.get(key)
+        if limiter is None:
+            limiter = LLMRateLimiter(max_concurrent, requests_per_minute, tokens_per_minute, max_wait_seconds)
+            _shared_limiters[key] = limiter
+        return limiter
@@ -0,0 +1,212 @@
+"""
+Prozessweites Register für aufwendige Ressourcen des Saalbach Tourismus Chatbots.
+ChromaManager, Embedding-Modell, zerlegter Korpus und daraus abgeleitete Strukturen
+werden beim ersten Zugriff einmal erstellt und von allen Streamlit-Sessions, Reruns
+und Threads gemeinsam genutzt. Ungültig gemachte Einträge werden beim nächsten
+Zugriff neu erstellt; bereits verteilte Referenzen bleiben bis dahin nutzbar.
+"""
+
+import time
+import threading
+import weakref
+from typing import Dict, Any, Optional, Callable, Hashable, Tuple
+
+
+class ResourceRegistry:
+    """
+    Thread-sicheres Register mit verzögerter Erstellung.
+    Jeder Schlüssel wird höchstens einmal gleichzeitig erstellt: weitere Aufrufer
+    warten auf das Ergebnis, statt die Ressource doppelt zu laden. Verschiedene
+    Schlüssel werden unabhängig voneinander erstellt.
+    Schlüssel sind Tupel, deren erstes Element die Art der Ressource ist
+    (z.B. ("chroma_manager", Verzeichnis, Collection, Modell)).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Any] = {}
+        # Nicht behaltene Ressourcen mit Zeitpunkt der Erstellung (für die Wartezeit bis zum nächsten Versuch)
+        self._failed: Dict[Hashable, Tuple[Any, float]] = {}
+        self._build_locks: Dict[Hashable, threading.Lock] = {}
+
+        # Abgeleitete Strukturen je Besitzer (z.B. je Korpus), verschwinden mit dem Besitzer
+        self._derived: "weakref.WeakKeyDictionary[Any, Dict[Hashable, Any]]" = weakref.WeakKeyDictionary()
+
+        # Statistik
+        self.hits = 0
+        self.created = 0
+        self.invalidated = 0
+
+    def build_lock(self, key: Hashable) -> threading.Lock:
+        """
+        Liefert die Sperre, unter der die Ressource eines Schlüssels erstellt oder ersetzt wird.
+
+        Args:
+            key: Schlüssel der Ressource
+
+        Returns:
+            Die Sperre des Schlüssels
+        """
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def get(self,
+            key: Hashable,
+            factory: Callable[[], Any],
+            keep: Optional[Callable[[Any], bool]] = None,
+            retry_after: Optional[float] = None) -> Any:
+        """
+        Liefert die Ressource eines Schlüssels und erstellt sie beim ersten Zugriff.
+
+        Args:
+            key: Schlüssel der Ressource
+            factory: Funktion ohne Argumente, die die Ressource erstellt
+            keep: Optional, nur Ressourcen behalten, für die diese Funktion True liefert
+                (z.B. nur funktionsfähige Verbindungen); andere werden beim nächsten Zugriff neu erstellt
+            retry_after: Optional, Sekunden, in denen eine nicht behaltene Ressource weiter
+                ausgeliefert wird, bevor sie erneut erstellt wird (None: bei jedem Zugriff neu erstellen)
+
+        Returns:
+            Die gemeinsam genutzte Ressource
+        """
+        cached = self._lookup(key, retry_after)
+        if cached is not None:
+            return cached[0]
+
+        with self.build_lock(key):
+            cached = self._lookup(key, retry_after)
+            if cached is not None:
+                return cached[0]
+
+            # Fehler der Erstellung werden an den Aufrufer weitergegeben, nichts wird gespeichert
+            value = factory()
+            with self._lock:
+                if keep is None or keep(value):
+                    self._entries[key] = value
+                    self._failed.pop(key, None)
+                    self.created += 1
+                elif retry_after is not None:
+                    self._failed[key] = (value, time.monotonic())
+            return value
+
+    def _lookup(self, key: Hashable, retry_after: Optional[float]) -> Optional[Tuple[Any]]:
+        """Liefert die gespeicherte Ressource als 1-Tupel oder None, wenn sie (erneut) zu erstellen ist."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return (self._entries[key],)
+            failed = self._failed.get(key)
+            if failed is not None and retry_after is not None and time.monotonic() - failed[1] < retry_after:
+                self.hits += 1
+                return (failed[0],)
+            return None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Liefert die Ressource eines Schlüssels, ohne sie zu erstellen (sonst None)."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Ersetzt die Ressource eines Schlüssels (z.B. einen aktualisierten Korpus).
+
+        Args:
+            key: Schlüssel der Ressource
+            value: Die neue Ressource
+        """
+        with self._lock:
+            self._entries[key] = value
+
+    def derived(self, owner: Any, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Liefert eine aus einem Besitzer abgeleitete Struktur (z.B. Eintragstabelle eines Korpus).
+        Sie wird je Besitzer einmal erstellt und mit ihm freigegeben.
+
+        Args:
+            owner: Besitzer (muss schwache Referenzen unterstützen)
+            key: Schlüssel der Struktur beim Besitzer (inklusive relevanter Einstellungen)
+            factory: Funktion ohne Argumente, die die Struktur erstellt
+
+        Returns:
+            Die gemeinsam genutzte Struktur
+        """
+        with self._lock:
+            structures = self._derived.setdefault(owner, {})
+            if key in structures:
+                self.hits += 1
+                return structures[key]
+
+        with self.build_lock(("derived", id(owner), key)):
+            with self._lock:
+                structures = self._derived.setdefault(owner, {})
+                if key in structures:
+                    self.hits += 1
+                    return structures[key]
+
+            value = factory()
+            with self._lock:
+                self._derived.setdefault(owner, {})[key] = value
+                self.created += 1
+            return value
+
+    def invalidate(self, kind: Optional[str] = None) -> int:
+        """
+        Verwirft Ressourcen, sodass sie beim nächsten Zugriff neu erstellt werden.
+
+        Args:
+            kind: Optional, nur Ressourcen dieser Art (erstes Element des Schlüssels); None verwirft alle
+
+        Returns:
+            Anzahl der verworfenen Ressourcen
+        """
+        with self._lock:
+            keys = [key for key in self._entries
+                    if kind is None or (isinstance(key, tuple) and key and key[0] == kind)]
+            for key in keys:
+                del self._entries[key]
+            # Auch nicht behaltene Ressourcen verwerfen, damit ein erneutes Laden sofort versucht wird
+            for key in [key for key in self._failed
+                        if kind is None or (isinstance(key, tuple) and key and key[0] == kind)]:
+                del self._failed[key]
+            if kind is None:
+                self._derived = weakref.WeakKeyDictionary()
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Gibt Statistiken des Registers zurück.
+
+        Returns:
+            Dictionary mit Treffern, erstellten und verworfenen Ressourcen sowie den Einträgen je Art
+        """
+        with self._lock:
+            kinds: Dict[str, int] = {}
+            for key in self._entries:
+                kind = key[0] if isinstance(key, tuple) and key else str(key)
+                kinds[kind] = kinds.get(kind, 0) + 1
+            return {
+                "hits": self.hits,
+                "created": self.created,
+                "invalidated": self.invalidated,
+                "entries": kinds,
+                "failed": len(self._failed)
+            }
+
+
+# Gemeinsames Register des Prozesses
+shared_resources = ResourceRegistry()
+
+
+def invalidate_shared_resources(kind: Optional[str] = None) -> int:
+    """
+    Verwirft gemeinsam genutzte Ressourcen (z.B. nach dem Zurücksetzen der Datenbank).
+
+    Args:
+        kind: Optional, Art der Ressourcen ("chroma_manager", "embedding_model", "embedding_backend",
+            "corpus", "knowledge_base"); None verwirft alle
+
+    Returns:
+        Anzahl der verworfenen Ressourcen
+    """
+    return shared_resources.invalidate(kind)
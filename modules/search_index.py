@@ -0,0 +1,234 @@
+"""
+Invertierter Suchindex mit BM25-Ranking für den Saalbach Tourismus Chatbot.
+Wird einmalig beim Laden der Wissensbasis aufgebaut und ersetzt die lineare
+Textsuche über alle Dokumente. Die Suche lässt sich auf Partitionen (z.B. Themen)
+beschränken und berührt dann nur die Posting-Einträge dieser Partitionen.
+"""
+
+import re
+import math
+import heapq
+from bisect import bisect_left
+from array import array
+from typing import List, Dict, Any, Tuple, Iterable, Optional
+
+# Standardparameter für BM25 (Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+# Häufige deutsche Endungen, die für die Suche abgeschnitten werden
+# (z.B. "Familien" -> "famili", "Restaurants" -> "restaurant")
+_SUFFIXES = ("ern", "en", "er", "es", "e", "n", "s")
+
+# Metadatenfeld, nach dem der Index partitioniert wird
+DEFAULT_PARTITION_FIELD = "theme"
+
+
+def normalize_token(token: str) -> str:
+    """
+    Normalisiert ein einzelnes Token mit einem sehr einfachen Stemming.
+
+    Args:
+        token: Das bereits kleingeschriebene Token
+
+    Returns:
+        Das normalisierte Token
+    """
+    if len(token) > 4:
+        for suffix in _SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+                return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Zerlegt einen Text in normalisierte Suchbegriffe.
+
+    Args:
+        text: Der zu zerlegende Text
+
+    Returns:
+        Liste der Tokens
+    """
+    return [normalize_token(token) for token in _TOKEN_PATTERN.findall(text.lower())]
+
+
+class BM25Index:
+    """
+    Invertierter Index über die Abschnitte der Wissensbasis.
+    Hält Posting-Listen, vorberechnete Dokumentlängen und IDF-Werte,
+    sodass eine Suche nur die Dokumente der Suchbegriffe berührt.
+    Posting-Listen sind kompakte Arrays und lassen sich schnell speichern und laden.
+    Je Partition (Wert eines Metadatenfelds) werden die zusammenhängenden Bereiche
+    der Dokumentindizes gespeichert, sodass eine eingeschränkte Suche die Posting-Listen
+    per Binärsuche auf diese Bereiche zuschneidet.
+    """
+
+    def __init__(self,
+                 documents: List[Dict[str, Any]],
+                 k1: float = BM25_K1,
+                 b: float = BM25_B,
+                 partition_field: str = DEFAULT_PARTITION_FIELD):
+        """
+        Baut den Index über die übergebenen Dokumente auf.
+
+        Args:
+            documents: Liste von Dokumenten mit "content" und "metadata"
+            k1: BM25-Parameter für die Sättigung der Termfrequenz
+            b: BM25-Parameter für die Längennormalisierung
+            partition_field: Metadatenfeld, nach dem die Suche eingeschränkt werden kann
+        """
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.partition_field = partition_field
+
+        # Partition -> Bereiche [start, end) der Dokumentindizes (Dokumente einer Datei liegen am Stück)
+        self.partitions: Dict[str, List[Tuple[int, int]]] = {}
+
+        # Begriff -> Dokumentindizes (aufsteigend) und parallel dazu die Termfrequenzen
+        self.postings: Dict[str, array] = {}
+        self.frequencies: Dict[str, array] = {}
+        self.doc_lengths: List[int] = []
+
+        for doc_index, doc in enumerate(documents):
+            partition = doc.get("metadata", {}).get(partition_field, "")
+            ranges = self.partitions.setdefault(partition, [])
+            if ranges and ranges[-1][1] == doc_index:
+                ranges[-1] = (ranges[-1][0], doc_index + 1)
+            else:
+                ranges.append((doc_index, doc_index + 1))
+
+            tokens = tokenize(self._indexed_text(doc))
+            self.doc_lengths.append(len(tokens))
+
+            term_frequencies: Dict[str, int] = {}
+            for token in tokens:
+                term_frequencies[token] = term_frequencies.get(token, 0) + 1
+
+            for term, frequency in term_frequencies.items():
+                if term not in self.postings:
+                    self.postings[term] = array('I')
+                    self.frequencies[term] = array('I')
+                self.postings[term].append(doc_index)
+                self.frequencies[term].append(frequency)
+
+        doc_count = len(documents)
+        self.avg_doc_length = (sum(self.doc_lengths) / doc_count) if doc_count else 0.0
+
+        # IDF je Begriff (BM25+-Variante ohne negative Werte)
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+        # Längennormalisierung je Dokument vorberechnen
+        if self.avg_doc_length:
+            self._length_norms = [
+                k1 * (1 - b + b * length / self.avg_doc_length) for length in self.doc_lengths
+            ]
+        else:
+            self._length_norms = [k1 for _ in self.doc_lengths]
+
+    @staticmethod
+    def _indexed_text(doc: Dict[str, Any]) -> str:
+        """
+        Liefert den Text, der für ein Dokument indexiert wird (Überschriften und Inhalt).
+
+        Args:
+            doc: Das Dokument
+
+        Returns:
+            Der zu indexierende Text
+        """
+        metadata = doc.get("metadata", {})
+        return " ".join([
+            metadata.get("heading", "") or "",
+            metadata.get("subheading", "") or "",
+            doc.get("content", "")
+        ])
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def partition_ranges(self, partitions: Iterable[str]) -> List[Tuple[int, int]]:
+        """
+        Liefert die sortierten Bereiche der Dokumentindizes der angegebenen Partitionen.
+
+        Args:
+            partitions: Werte des Partitionsfelds (unbekannte Werte werden ignoriert)
+
+        Returns:
+            Liste von Bereichen [start, end), aufsteigend
+        """
+        return sorted(
+            doc_range
+            for partition in set(partitions)
+            for doc_range in self.partitions.get(partition, ())
+        )
+
+    def score(self, terms: Iterable[str], ranges: Optional[List[Tuple[int, int]]] = None) -> Dict[int, float]:
+        """
+        Berechnet die BM25-Scores aller Dokumente, die mindestens einen Begriff enthalten.
+
+        Args:
+            terms: Normalisierte Suchbegriffe
+            ranges: Optional, nur Dokumente in diesen Bereichen [start, end) bewerten
+
+        Returns:
+            Dictionary Dokumentindex -> Score
+        """
+        scores: Dict[int, float] = {}
+        k1_plus_one = self.k1 + 1
+        length_norms = self._length_norms
+
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            idf = self.idf[term]
+            frequencies = self.frequencies[term]
+            if ranges is None:
+                slices = [(postings, frequencies)]
+            else:
+                # Posting-Listen sind aufsteigend sortiert: Bereiche per Binärsuche ausschneiden
+                slices = []
+                for start, end in ranges:
+                    low = bisect_left(postings, start)
+                    high = bisect_left(postings, end, low)
+                    if low < high:
+                        slices.append((postings[low:high], frequencies[low:high]))
+
+            for doc_indices, doc_frequencies in slices:
+                for doc_index, frequency in zip(doc_indices, doc_frequencies):
+                    weight = idf * frequency * k1_plus_one / (frequency + length_norms[doc_index])
+                    scores[doc_index] = scores.get(doc_index, 0.0) + weight
+
+        return scores
+
+    def search(self, query: str, n_results: int = 3, partitions: Optional[Iterable[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Durchsucht den Index und liefert die besten Treffer.
+
+        Bei gleichem Score gewinnt das Dokument, das früher geladen wurde,
+        damit das Ranking stabil bleibt.
+
+        Args:
+            query: Die Suchanfrage
+            n_results: Anzahl der zurückzugebenden Ergebnisse
+            partitions: Optional, Suche auf diese Partitionen (z.B. Themen) beschränken
+
+        Returns:
+            Liste von (Dokumentindex, Score), absteigend nach Score
+        """
+        terms = tokenize(query)
+        if not terms or n_results <= 0:
+            return []
+
+        ranges = self.partition_ranges(partitions) if partitions is not None else None
+        scores = self.score(terms, ranges)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: (item[1], -item[0]))
@@ -0,0 +1,284 @@
+"""
+Semantischer Antwort-Cache für den Saalbach Tourismus Chatbot.
+Erkennt umformulierte Fragen ("gute Restaurants für Kinder" vs.
+"familienfreundliche Restaurants") über Embeddings und liefert die bereits
+generierte Antwort, wenn die Ähnlichkeit über einem Schwellwert liegt.
+"""
+
+import time
+import threading
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+from modules.chroma_manager import DEFAULT_EMBEDDING_MODEL, get_shared_embedding_model
+
+_shared_caches: Dict[Tuple, "SemanticAnswerCache"] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def _load_sentence_transformer(model_name: str) -> Callable[[List[str]], np.ndarray]:
+    """
+    Gibt eine Embedding-Funktion auf Basis des gemeinsam genutzten sentence-transformers-Modells zurück.
+
+    Args:
+        model_name: Name des Modells
+
+    Returns:
+        Funktion, die Texte in normalisierte Embeddings umwandelt
+    """
+    model = get_shared_embedding_model(model_name)
+
+    def embed(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+    return embed
+
+
+class SemanticAnswerCache:
+    """
+    Semantischer Cache mit fester Kapazität.
+    Alle Query-Embeddings liegen in einer vorab allokierten Matrix, sodass ein
+    Lookup eine einzige Matrix-Vektor-Multiplikation mit anschließendem argmax ist.
+    Ist der Cache voll, wird der am längsten nicht genutzte Eintrag ersetzt.
+    """
+
+    def __init__(self,
+                 embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 model_name: str = DEFAULT_EMBEDDING_MODEL,
+                 capacity: int = 1000,
+                 threshold: float = 0.92,
+                 ttl_seconds: float = 24 * 3600):
+        """
+        Initialisiert den semantischen Cache.
+
+        Args:
+            embed_fn: Optional, eigene Embedding-Funktion (Liste von Texten -> Matrix)
+            model_name: Name des sentence-transformers-Modells, falls keine embed_fn angegeben ist
+            capacity: Maximale Anzahl an Einträgen
+            threshold: Minimale Kosinus-Ähnlichkeit für einen Treffer
+            ttl_seconds: Lebensdauer eines Eintrags in Sekunden
+        """
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.is_functional = False
+
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._scope_codes = np.full(capacity, -1, dtype=np.int32)
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._queries: List[Optional[str]] = [None] * capacity
+        self._source_files: List[List[str]] = [[] for _ in range(capacity)]
+        self._scope_ids: Dict[str, int] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        try:
+            self._embed = embed_fn or _load_sentence_transformer(model_name)
+            self.is_functional = True
+        except Exception as e:
+            print(f"Semantischer Cache nicht verfügbar (Embedding-Modell konnte nicht geladen werden): {str(e)}")
+            self._embed = None
+
+    def embed(self, query: str) -> Optional[np.ndarray]:
+        """
+        Berechnet das normalisierte Embedding einer Anfrage.
+
+        Args:
+            query: Die Benutzeranfrage
+
+        Returns:
+            Der Embedding-Vektor oder None, wenn der Cache nicht funktionsbereit ist
+        """
+        if not self.is_functional:
+            return None
+
+        try:
+            vector = np.asarray(self._embed([query]), dtype=np.float32)[0]
+        except Exception as e:
+            print(f"Fehler beim Berechnen des Query-Embeddings: {str(e)}")
+            return None
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _scope_code(self, scope: str) -> int:
+        """Gibt die numerische ID eines Gültigkeitsbereichs zurück (Lock muss gehalten werden)."""
+        code = self._scope_ids.get(scope)
+        if code is None:
+            code = len(self._scope_ids)
+            self._scope_ids[scope] = code
+        return code
+
+    def lookup(self, vector: Optional[np.ndarray], scope: str) -> Optional[Dict[str, Any]]:
+        """
+        Sucht den ähnlichsten gespeicherten Eintrag im selben Gültigkeitsbereich.
+
+        Args:
+            vector: Das Embedding der Anfrage (aus embed)
+            scope: Gültigkeitsbereich, z.B. das LLM-Modell
+
+        Returns:
+            Dictionary mit Antwort, Ähnlichkeit und ursprünglicher Frage, oder None
+        """
+        if vector is None:
+            return None
+
+        now = time.time()
+
+        with self._lock:
+            if self._matrix is None or not self._valid.any():
+                self.misses += 1
+                return None
+
+            # Abgelaufene Einträge verwerfen
+            if self.ttl_seconds is not None:
+                expired = self._valid & (now - self._created > self.ttl_seconds)
+                if expired.any():
+                    self._valid &= ~expired
+
+            candidates = self._valid & (self._scope_codes == self._scope_ids.get(scope, -2))
+            if not candidates.any():
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ vector
+            similarities[~candidates] = -np.inf
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self._last_used[best] = now
+            self.hits += 1
+            return {
+                "answer": self._answers[best],
+                "similarity": similarity,
+                "matched_query": self._queries[best]
+            }
+
+    def add(self,
+            vector: Optional[np.ndarray],
+            query: str,
+            answer: str,
+            scope: str,
+            source_files: List[str] = None) -> None:
+        """
+        Speichert eine Antwort zum Embedding einer Anfrage.
+
+        Args:
+            vector: Das Embedding der Anfrage (aus embed)
+            query: Die ursprüngliche Anfrage
+            answer: Die generierte Antwort
+            scope: Gültigkeitsbereich, z.B. das LLM-Modell
+            source_files: Quelldateien, auf denen die Antwort basiert
+        """
+        if vector is None or not answer:
+            return
+
+        now = time.time()
+
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+            free_slots = np.flatnonzero(~self._valid)
+            if free_slots.size:
+                slot = int(free_slots[0])
+            else:
+                # Am längsten nicht genutzten Eintrag verdrängen
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._matrix[slot] = vector
+            self._valid[slot] = True
+            self._scope_codes[slot] = self._scope_code(scope)
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._answers[slot] = answer
+            self._queries[slot] = query
+            self._source_files[slot] = list(source_files or [])
+
+    def invalidate_files(self, file_names: List[str]) -> int:
+        """
+        Entfernt alle Einträge, die auf einer der angegebenen Quelldateien basieren.
+
+        Args:
+            file_names: Dateinamen der geänderten Wissensdateien
+
+        Returns:
+            Anzahl der entfernten Einträge
+        """
+        changed = set(file_names)
+        removed = 0
+
+        with self._lock:
+            for slot in np.flatnonzero(self._valid):
+                if changed.intersection(self._source_files[slot]):
+                    self._valid[slot] = False
+                    removed += 1
+
+        return removed
+
+    def clear(self) -> None:
+        """Leert den Cache vollständig."""
+        with self._lock:
+            self._valid[:] = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Gibt die Trefferstatistik des Caches zurück.
+
+        Returns:
+            Dictionary mit Treffern, Fehlversuchen, Trefferquote und Belegung
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": int(self._valid.sum()),
+                "capacity": self.capacity,
+                "threshold": self.threshold
+            }
+
+
+def get_shared_semantic_cache(capacity: int = 1000,
+                              threshold: float = 0.92,
+                              ttl_seconds: float = 24 * 3600,
+                              model_name: str = DEFAULT_EMBEDDING_MODEL) -> SemanticAnswerCache:
+    """
+    Gibt den prozessweit gemeinsamen semantischen Cache zurück.
+    Das Embedding-Modell wird dadurch nur einmal pro Prozess geladen.
+
+    Args:
+        capacity: Maximale Anzahl an Einträgen
+        threshold: Minimale Kosinus-Ähnlichkeit für einen Treffer
+        ttl_seconds: Lebensdauer eines Eintrags in Sekunden
+        model_name: Name des sentence-transformers-Modells
+
+    Returns:
+        Der gemeinsam genutzte Cache
+    """
+    key = (capacity, threshold, ttl_seconds, model_name)
+    with _shared_caches_lock:
+        cache = _shared_caches.get(key)
+        if cache is None:
+            cache = SemanticAnswerCache(
+                model_name=model_name,
+                capacity=capacity,
+                threshold=threshold,
+                ttl_seconds=ttl_seconds
+            )
+            _shared_caches[key] = cache
+        return cache
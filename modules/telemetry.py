@@ -0,0 +1,434 @@
+"""
+Leichtgewichtige Telemetrie für den Saalbach Tourismus Chatbot.
+Misst die Dauer jeder Stufe der Antwort-Pipeline (Spans), zählt Anfragen und
+Tokens und stellt alles als Prometheus-Metriken im Textformat sowie als Trace
+pro Anfrage bereit. Kommt ohne externe Abhängigkeiten aus.
+"""
+
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+
+# Histogramm-Grenzen in Sekunden (von Index-Lookups bis zu langen LLM-Antworten)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Der Metrik-Endpunkt ist ohne Authentifizierung und daher standardmäßig nur lokal erreichbar
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monoton steigender Zähler mit Labels."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Histogramm mit festen Grenzen, Summe und Anzahl je Label-Kombination."""
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Label-Kombination -> [Zähler je Grenze, Summe, Anzahl]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0.0, 0]
+                self._values[key] = entry
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def get_count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(_label_key(self.labelnames, labels))
+            return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    bucket_labels = _format_labels(self.labelnames, key, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                inf_labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf_labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Prozessweite Sammlung aller Metriken."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, documentation, labelnames)
+            return self._metrics[name]
+
+    def histogram(self,
+                  name: str,
+                  documentation: str,
+                  labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+            return self._metrics[name]
+
+    def render(self) -> str:
+        """
+        Gibt alle Metriken im Prometheus-Textformat aus.
+
+        Returns:
+            Die Metriken als Text (Content-Type text/plain; version=0.0.4)
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+REQUESTS = _registry.counter(
+    "saalbach_requests_total", "Beantwortete Anfragen nach Antwortpfad und Ergebnis", ("path", "outcome"))
+REQUEST_DURATION = _registry.histogram(
+    "saalbach_request_duration_seconds", "Gesamtdauer einer Anfrage", ("path",))
+STAGE_DURATION = _registry.histogram(
+    "saalbach_stage_duration_seconds", "Dauer einzelner Stufen der Pipeline", ("stage",))
+STAGE_ERRORS = _registry.counter(
+    "saalbach_stage_errors_total", "Fehler je Stufe und Ausnahmetyp", ("stage", "error"))
+LLM_TOKENS = _registry.counter(
+    "saalbach_llm_tokens_total", "Verbrauchte Tokens laut API", ("model", "purpose", "kind"))
+QUERY_EMBEDDING_CACHE = _registry.counter(
+    "saalbach_query_embedding_cache_total", "Lookups im Cache der Anfrage-Embeddings nach Ergebnis", ("result",))
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Gibt die prozessweite Metrik-Sammlung zurück.
+
+    Returns:
+        Die gemeinsam genutzte MetricsRegistry
+    """
+    return _registry
+
+
+def render_prometheus() -> str:
+    """
+    Gibt alle Metriken im Prometheus-Textformat aus.
+
+    Returns:
+        Die Metriken als Text
+    """
+    return _registry.render()
+
+
+class Span:
+    """Eine gemessene Stufe innerhalb eines Traces."""
+
+    def __init__(self, name: str, parent: Optional[str], start_ms: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.start_ms = start_ms
+        self.duration_ms: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        """Ergänzt Attribute des Spans (z.B. Trefferzahl oder Tokens)."""
+        self.attributes.update(attributes)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "start_ms": round(self.start_ms, 3),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": dict(self.attributes),
+            "error": self.error
+        }
+
+
+class Trace:
+    """Alle Spans einer Anfrage mit Gesamtdauer, Ergebnis und Token-Verbrauch."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.attributes = attributes
+        self.outcome = "ok"
+        self.duration_ms: Optional[float] = None
+        self._start = time.perf_counter()
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def offset_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def add_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.attributes["prompt_tokens"] = self.attributes.get("prompt_tokens", 0) + prompt_tokens
+            self.attributes["completion_tokens"] = self.attributes.get("completion_tokens", 0) + completion_tokens
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Gibt den Trace als JSON-kompatibles Dictionary zurück.
+
+        Returns:
+            Dictionary mit ID, Dauer, Ergebnis, Attributen und Spans in Startreihenfolge
+        """
+        spans = sorted(self.spans, key=lambda span: span.start_ms)
+        with self._lock:
+            attributes = dict(self.attributes)
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "outcome": self.outcome,
+            "attributes": attributes,
+            "spans": [span.as_dict() for span in spans]
+        }
+
+
+# Laufender Trace und Span des aktuellen Kontexts (Thread bzw. asyncio-Task)
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("saalbach_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("saalbach_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    """
+    Gibt den Trace des aktuellen Kontexts zurück.
+
+    Returns:
+        Der laufende Trace oder None
+    """
+    return _current_trace.get()
+
+
+def _reset(variable: contextvars.ContextVar, token: contextvars.Token) -> None:
+    try:
+        variable.reset(token)
+    except ValueError:
+        # Generator wurde in einem anderen Kontext beendet, als er gestartet wurde
+        variable.set(None)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Trace]:
+    """
+    Startet einen Trace für eine Anfrage. Alle Spans im selben Kontext werden ihm zugeordnet.
+    Beim Verlassen werden Anfragezähler und Gesamtdauer erfasst; das Ergebnis
+    kann über trace.outcome gesetzt werden.
+
+    Args:
+        name: Name des Traces (z.B. "answer_query")
+        **attributes: Attribute des Traces; "path" dient als Label der Metriken
+    """
+    trace = Trace(name, attributes)
+    token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    except GeneratorExit:
+        # Stream wurde vom Aufrufer vorzeitig beendet
+        trace.outcome = "cancelled"
+        raise
+    except BaseException:
+        trace.outcome = "error"
+        raise
+    finally:
+        trace.duration_ms = trace.offset_ms()
+        _reset(_current_span, span_token)
+        _reset(_current_trace, token)
+        path = attributes.get("path", name)
+        REQUESTS.inc(path=path, outcome=trace.outcome)
+        REQUEST_DURATION.observe(trace.duration_ms / 1000, path=path)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Misst eine Stufe der Pipeline. Die Dauer geht immer in das Histogramm
+    saalbach_stage_duration_seconds ein, innerhalb eines Traces zusätzlich in dessen Spans.
+    Ausnahmen werden gezählt und weitergereicht.
+
+    Args:
+        name: Name der Stufe (z.B. "retrieval")
+        **attributes: Attribute des Spans
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(name, parent.name if parent is not None else None,
+                   trace.offset_ms() if trace is not None else 0.0, attributes)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {str(e)}"
+        STAGE_ERRORS.inc(stage=name, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        current.duration_ms = elapsed * 1000
+        _reset(_current_span, token)
+        STAGE_DURATION.observe(elapsed, stage=name)
+        if trace is not None:
+            trace.add(current)
+
+
+def record_span(name: str, seconds: float, trace: Optional[Trace] = None, **attributes: Any) -> None:
+    """
+    Erfasst eine außerhalb gemessene Stufe, z.B. die Darstellung in der Oberfläche.
+
+    Args:
+        name: Name der Stufe
+        seconds: Gemessene Dauer in Sekunden
+        trace: Optional, Trace, dem die Stufe zugeordnet wird (Standard: laufender Trace)
+        **attributes: Attribute des Spans
+    """
+    STAGE_DURATION.observe(seconds, stage=name)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        recorded = Span(name, None, max(0.0, trace.offset_ms() - seconds * 1000), attributes)
+        recorded.duration_ms = seconds * 1000
+        trace.add(recorded)
+
+
+def record_token_usage(model: str, prompt_tokens: int, completion_tokens: int, purpose: str = "answer") -> None:
+    """
+    Erfasst den Token-Verbrauch eines LLM-Aufrufs laut API-Antwort.
+
+    Args:
+        model: Name des Modells
+        prompt_tokens: Tokens des Prompts
+        completion_tokens: Tokens der Antwort
+        purpose: Zweck des Aufrufs (z.B. "answer" oder "summary")
+    """
+    LLM_TOKENS.inc(prompt_tokens, model=model, purpose=purpose, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, purpose=purpose, kind="completion")
+
+    current = _current_span.get()
+    if current is not None:
+        current.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_tokens(prompt_tokens, completion_tokens)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_metrics_servers: Dict[int, ThreadingHTTPServer] = {}
+_metrics_servers_lock = threading.Lock()
+
+
+def start_metrics_server(port: int, host: str = DEFAULT_METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Startet (einmal pro Prozess und Port) einen HTTP-Endpunkt /metrics für Prometheus.
+    Standardmäßig nur lokal erreichbar; eine andere Adresse (z.B. "0.0.0.0") muss
+    ausdrücklich konfiguriert werden.
+
+    Args:
+        port: Port des Endpunkts
+        host: Adresse, an die der Endpunkt gebunden wird (Standard: nur localhost)
+
+    Returns:
+        Der laufende Server oder None, wenn der Port nicht verfügbar ist
+    """
+    with _metrics_servers_lock:
+        server = _metrics_servers.get(port)
+        if server is not None:
+            return server
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            server.daemon_threads = True
+        except OSError as e:
+            print(f"Metrik-Endpunkt auf Port {port} konnte nicht gestartet werden: {str(e)}")
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        _metrics_servers[port] = server
+        print(f"Metrik-Endpunkt läuft auf http://{host}:{port}/metrics")
+        return server
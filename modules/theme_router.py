@@ -0,0 +1,278 @@
+"""
+Themen-Router für den Saalbach Tourismus Chatbot.
+Ordnet eine Anfrage vor dem Retrieval einem oder mehreren Themen zu (Restaurants,
+Unterkünfte, Wandern, ...), damit Stichwort- und Vektorsuche nur die Abschnitte
+dieser Themen durchsuchen. Grundlage sind genannte Eintragsnamen, Stichwortlisten
+je Thema und ein kleiner Naive-Bayes-Klassifikator, der aus dem BM25-Index der
+Wissensbasis abgeleitet wird. Eingeschränkt wird nur auf Themen mit einem ausdrücklichen
+Hinweis (Eintragsname oder Stichwort), und jedes Thema mit einem solchen Hinweis bleibt in
+der Suche ("Wanderung zu einer Hütte" sucht in Wandern und Restaurants). Ist die Zuordnung
+unsicher, wird ohne Einschränkung gesucht.
+"""
+
+import re
+import math
+from typing import List, Dict, Any, Optional, Tuple
+
+from modules.search_index import BM25Index, tokenize
+
+# Mindestwahrscheinlichkeit der gewählten Themen, darunter wird der gesamte Korpus durchsucht
+DEFAULT_MIN_CONFIDENCE = 0.8
+DEFAULT_MAX_KINDS = 2
+
+# Gewichte (Log-Odds) der Hinweise auf ein Thema
+ENTRY_WEIGHT = 6.0     # Name eines Eintrags (z.B. "Hotel Astrid") wird genannt
+LEXICON_WEIGHT = 2.0   # je Treffer eines Stichworts des Themas
+# Naive Bayes ist bei vielen Begriffen überzuversichtlich, daher gedämpft
+CLASSIFIER_WEIGHT = 0.5
+
+# Begriffe in mehr als diesem Anteil der Dokumente tragen für den Klassifikator keine Information
+MAX_TERM_DOC_RATIO = 0.2
+
+# Längste Eintragsnamen (in Wörtern), nach denen in der Anfrage gesucht wird
+MAX_ENTRY_NAME_WORDS = 5
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+# Art (Präfix des Dateinamens) -> Stichwörter, die auf das Thema hinweisen
+THEME_LEXICONS = {
+    "restaurants": re.compile(
+        r"restaurant|\bessen\b|mittagessen|abendessen|\bküche\b|\bspeise|\bgericht|"
+        r"gasthaus|wirtshaus|\bwirt\b|hütte|\balm(en)?\b|einkehr|\bcaf[eé]s?\b|konditorei|kuchen|"
+        r"\bbars?\b|après|apres|steak|pizz|italienisch|vegetar|vegan|kaiserschmarrn|gourmet|"
+        r"\blokal|\bdinner\b|\bschmeckt?\b|\bhunger",
+        re.IGNORECASE
+    ),
+    "unterkuenfte": re.compile(
+        r"unterkunft|unterkünfte|\bhotels?\b|pension|chalet|ferienwohnung|apartment|appartement|"
+        r"übernacht|\bzimmer\b|\bschlafen\b|gasthof|\bsterne\b|\bbuchen\b|\bwohnen\b|hostel|"
+        r"\bbleibe\b|wellnesshotel|\bquartier",
+        re.IGNORECASE
+    ),
+    "wandern": re.compile(
+        r"\bwander|wanderung|wanderweg|\bgipfel|höhenweg|\bsteig\b|klettersteig|bergtour|rundweg|"
+        r"höhenmeter|\broute\b|spaziergang|spazier|aufstieg|abstieg|\btrail|\bwege?\b|"
+        r"\brunde\b|\bgehzeit|\bwanderschuh",
+        re.IGNORECASE
+    ),
+}
+
+
+def theme_kind(theme: str) -> str:
+    """
+    Art eines Themas (Präfix des Dateinamens, z.B. "restaurants_saalbach" -> "restaurants").
+
+    Args:
+        theme: Thema aus den Metadaten
+
+    Returns:
+        Die Art des Themas
+    """
+    return theme.split("_")[0]
+
+
+def _name_key(text: str) -> str:
+    return " ".join(_WORD_PATTERN.findall(text.lower()))
+
+
+def theme_filter(themes: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """
+    Erstellt den where-Filter für ChromaDB aus einer Liste von Themen.
+
+    Args:
+        themes: Themen (Metadatum "theme") oder None für keine Einschränkung
+
+    Returns:
+        Der Filter oder None
+    """
+    if not themes:
+        return None
+    if len(themes) == 1:
+        return {"theme": themes[0]}
+    return {"theme": {"$in": list(themes)}}
+
+
+class ThemeRouter:
+    """
+    Sagt die Themen einer Anfrage mit einer Wahrscheinlichkeit voraus.
+    Die Hinweise (Eintragsnamen, Stichwörter, Naive Bayes) werden als Log-Odds
+    addiert und per Softmax in Wahrscheinlichkeiten je Art umgerechnet.
+    """
+
+    def __init__(self,
+                 index: BM25Index,
+                 min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                 max_kinds: int = DEFAULT_MAX_KINDS,
+                 use_classifier: bool = True):
+        """
+        Leitet Themen, Eintragsnamen und den Klassifikator aus dem Suchindex ab.
+
+        Args:
+            index: BM25-Index der Wissensbasis (partitioniert nach "theme")
+            min_confidence: Mindestwahrscheinlichkeit der gewählten Themen
+            max_kinds: Höchstens so viele Arten werden ausgewählt
+            use_classifier: Naive-Bayes-Klassifikator zusätzlich zu den Stichwörtern nutzen
+        """
+        self.min_confidence = min_confidence
+        self.max_kinds = max_kinds
+
+        # Art -> Themen (Partitionen des Index)
+        self.kind_themes: Dict[str, List[str]] = {}
+        for theme in sorted(index.partitions):
+            self.kind_themes.setdefault(theme_kind(theme), []).append(theme)
+        self.kinds: List[str] = sorted(self.kind_themes)
+        kind_ids = {kind: kind_id for kind_id, kind in enumerate(self.kinds)}
+
+        # Art je Dokument
+        doc_kinds = [0] * len(index)
+        for theme, ranges in index.partitions.items():
+            kind_id = kind_ids[theme_kind(theme)]
+            for start, end in ranges:
+                doc_kinds[start:end] = [kind_id] * (end - start)
+
+        # Eintragsnamen -> Arten, in denen ein Eintrag dieses Namens vorkommt
+        self.entry_kinds: Dict[str, set] = {}
+        for doc_index, doc in enumerate(index.documents):
+            name = _name_key(doc.get("metadata", {}).get("entry", "") or "")
+            if name:
+                self.entry_kinds.setdefault(name, set()).add(doc_kinds[doc_index])
+
+        # Naive Bayes: Log-Wahrscheinlichkeit je Begriff und Art (Laplace-Glättung)
+        self.log_likelihoods: Dict[str, Tuple[float, ...]] = {}
+        if use_classifier and len(self.kinds) > 1:
+            self._train(index, doc_kinds)
+
+    def _train(self, index: BM25Index, doc_kinds: List[int]) -> None:
+        """
+        Zählt die Begriffshäufigkeiten je Art direkt aus den Posting-Listen.
+
+        Args:
+            index: Der Suchindex
+            doc_kinds: Art je Dokumentindex
+        """
+        max_doc_count = max(1, int(len(index) * MAX_TERM_DOC_RATIO))
+        term_counts: Dict[str, List[int]] = {}
+        totals = [0] * len(self.kinds)
+
+        for term, postings in index.postings.items():
+            if len(postings) > max_doc_count:
+                continue
+            counts = [0] * len(self.kinds)
+            for doc_index, frequency in zip(postings, index.frequencies[term]):
+                counts[doc_kinds[doc_index]] += frequency
+            term_counts[term] = counts
+            for kind_id, count in enumerate(counts):
+                totals[kind_id] += count
+
+        vocabulary = len(term_counts)
+        denominators = [math.log(total + vocabulary) for total in totals]
+        self.log_likelihoods = {
+            term: tuple(math.log(count + 1) - denominators[kind_id] for kind_id, count in enumerate(counts))
+            for term, counts in term_counts.items()
+        }
+
+    def _entry_mentions(self, words: List[str]) -> List[int]:
+        """
+        Sucht genannte Eintragsnamen (Wortfolgen der Anfrage) und liefert deren Arten.
+        """
+        mentioned: List[int] = []
+        for start in range(len(words)):
+            for length in range(1, min(MAX_ENTRY_NAME_WORDS, len(words) - start) + 1):
+                kinds = self.entry_kinds.get(" ".join(words[start:start + length]))
+                if kinds:
+                    mentioned.extend(kinds)
+        return mentioned
+
+    def explicit_kinds(self, query: str) -> List[str]:
+        """
+        Arten, auf die die Anfrage ausdrücklich hinweist (genannter Eintrag oder Stichwort).
+
+        Args:
+            query: Die Suchanfrage
+
+        Returns:
+            Die Arten in der Reihenfolge von self.kinds
+        """
+        kind_ids = set(self._entry_mentions(_WORD_PATTERN.findall(query.lower())))
+        for kind_id, kind in enumerate(self.kinds):
+            pattern = THEME_LEXICONS.get(kind)
+            if pattern is not None and pattern.search(query):
+                kind_ids.add(kind_id)
+        return [self.kinds[kind_id] for kind_id in sorted(kind_ids)]
+
+    def scores(self, query: str) -> Optional[Dict[str, float]]:
+        """
+        Berechnet die Wahrscheinlichkeit je Art.
+
+        Args:
+            query: Die Suchanfrage
+
+        Returns:
+            Dictionary Art -> Wahrscheinlichkeit oder None, wenn die Anfrage keinen Hinweis enthält
+        """
+        if not self.kinds:
+            return None
+
+        log_odds = [0.0] * len(self.kinds)
+        evidence = False
+
+        for kind_id in self._entry_mentions(_WORD_PATTERN.findall(query.lower())):
+            log_odds[kind_id] += ENTRY_WEIGHT
+            evidence = True
+
+        for kind_id, kind in enumerate(self.kinds):
+            pattern = THEME_LEXICONS.get(kind)
+            if pattern is not None:
+                hits = len(pattern.findall(query))
+                if hits:
+                    log_odds[kind_id] += LEXICON_WEIGHT * hits
+                    evidence = True
+
+        for term in set(tokenize(query)):
+            likelihoods = self.log_likelihoods.get(term)
+            if likelihoods is not None:
+                evidence = True
+                for kind_id, likelihood in enumerate(likelihoods):
+                    log_odds[kind_id] += CLASSIFIER_WEIGHT * likelihood
+
+        if not evidence:
+            return None
+
+        # Softmax (numerisch stabil)
+        top = max(log_odds)
+        weights = [math.exp(value - top) for value in log_odds]
+        total = sum(weights)
+        return {kind: weight / total for kind, weight in zip(self.kinds, weights)}
+
+    def route(self, query: str) -> Dict[str, Any]:
+        """
+        Wählt die Arten mit ausdrücklichem Hinweis in der Anfrage (siehe explicit_kinds).
+
+        Die Suche wird nur eingeschränkt, wenn es solche Arten gibt, es höchstens max_kinds
+        sind und sie zusammen mindestens min_confidence erreichen. Der Klassifikator kann
+        eine Einschränkung damit verhindern, aber keine Art mit Hinweis ausschließen.
+
+        Args:
+            query: Die Suchanfrage
+
+        Returns:
+            Dictionary mit "kinds", "confidence" und "themes" (Partitionen für die Suche;
+            None, wenn ohne Einschränkung gesucht werden soll)
+        """
+        route = {"kinds": [], "confidence": 0.0, "themes": None}
+        probabilities = self.scores(query)
+        if probabilities is None:
+            return route
+
+        # Nur Arten mit ausdrücklichem Hinweis, die wahrscheinlichste zuerst
+        explicit = self.explicit_kinds(query)
+        route["kinds"] = sorted(explicit, key=lambda kind: (-probabilities[kind], kind))
+        route["confidence"] = round(sum((probabilities[kind] for kind in explicit), 0.0), 4)
+
+        # Ohne Hinweis, zu unsicher oder zu viele Arten: gesamten Korpus durchsuchen
+        if (not explicit or route["confidence"] < self.min_confidence
+                or len(explicit) > self.max_kinds or len(explicit) == len(self.kinds)):
+            return route
+
+        route["themes"] = [theme for kind in route["kinds"] for theme in self.kind_themes[kind]]
+        return route
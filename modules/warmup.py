@@ -0,0 +1,173 @@
+"""
+Hintergrund-Aufwärmen für den Saalbach Tourismus Chatbot.
+Lädt Embedding-Modell, ChromaDB-Collection und Stichwortindex in einem Hintergrund-Thread,
+während die Oberfläche bereits bedienbar ist. Der Fortschritt jedes Schritts steht als
+Bereitschaftsstatus zur Verfügung; Sessions, die eine Ressource vorher brauchen, warten
+über die Sperren des Ressourcen-Registers auf das Ergebnis statt sie doppelt zu laden.
+"""
+
+import time
+import threading
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from modules.telemetry import span
+from modules.resources import shared_resources
+
+# Zustände eines Schritts
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+class WarmupStep:
+    """Ein Schritt des Aufwärmens mit Zustand, Dauer und Fehlermeldung."""
+
+    def __init__(self, name: str, label: str, function: Callable[[], Any]):
+        """
+        Args:
+            name: Kurzname des Schritts (z.B. "keyword_index")
+            label: Anzeigename für die Oberfläche
+            function: Funktion ohne Argumente, die die Ressource lädt
+        """
+        self.name = name
+        self.label = label
+        self.function = function
+        self.state = PENDING
+        self.seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+
+class BackgroundWarmup:
+    """
+    Führt die Schritte nacheinander in einem Daemon-Thread aus.
+    Ein fehlgeschlagener Schritt hält die folgenden nicht auf; die App lädt die
+    Ressource dann wie bisher beim ersten Zugriff.
+    """
+
+    def __init__(self, steps: List[Tuple[str, str, Callable[[], Any]]]):
+        """
+        Args:
+            steps: Schritte als (Name, Anzeigename, Funktion) in der Reihenfolge der Ausführung
+        """
+        self.steps: Dict[str, WarmupStep] = {
+            name: WarmupStep(name, label, function) for name, label, function in steps
+        }
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "BackgroundWarmup":
+        """
+        Startet den Hintergrund-Thread (nur beim ersten Aufruf).
+
+        Returns:
+            Das Aufwärm-Objekt selbst
+        """
+        with self._lock:
+            if self._thread is None:
+                self.started_at = time.perf_counter()
+                self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        for step in self.steps.values():
+            step.state = RUNNING
+            start = time.perf_counter()
+            try:
+                with span(f"warmup_{step.name}"):
+                    step.function()
+                step.state = READY
+            except Exception as e:
+                step.error = str(e)
+                step.state = FAILED
+                print(f"Fehler beim Aufwärmen ({step.label}): {str(e)}")
+            finally:
+                step.seconds = time.perf_counter() - start
+                step.done.set()
+
+        self.finished_at = time.perf_counter()
+        print(f"Aufwärmen abgeschlossen nach {self.finished_at - self.started_at:.1f} s: "
+              + ", ".join(f"{step.name}={step.state}" for step in self.steps.values()))
+
+    def is_ready(self, name: Optional[str] = None) -> bool:
+        """
+        Prüft, ob ein Schritt (oder alle Schritte) erfolgreich abgeschlossen ist.
+
+        Args:
+            name: Optional, Name des Schritts; None prüft die gesamte Pipeline
+
+        Returns:
+            True, wenn bereit
+        """
+        if name is not None:
+            step = self.steps.get(name)
+            return step is not None and step.state == READY
+        return all(step.state == READY for step in self.steps.values())
+
+    def is_finished(self, name: Optional[str] = None) -> bool:
+        """
+        Prüft, ob ein Schritt (oder alle Schritte) abgeschlossen ist, auch wenn er fehlgeschlagen ist.
+
+        Args:
+            name: Optional, Name des Schritts; None prüft alle Schritte
+
+        Returns:
+            True, wenn abgeschlossen
+        """
+        steps = [self.steps[name]] if name is not None else list(self.steps.values())
+        return all(step.done.is_set() for step in steps)
+
+    def wait(self, name: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Wartet, bis ein Schritt (oder alle Schritte) abgeschlossen ist.
+
+        Args:
+            name: Optional, Name des Schritts; None wartet auf alle Schritte
+            timeout: Optional, maximale Wartezeit in Sekunden
+
+        Returns:
+            True, wenn der Schritt bzw. alle Schritte bereit sind
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        steps = [self.steps[name]] if name is not None else list(self.steps.values())
+        for step in steps:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if not step.done.wait(remaining):
+                return False
+        return self.is_ready(name)
+
+    def get_status(self) -> List[Dict[str, Any]]:
+        """
+        Gibt den Zustand aller Schritte zurück.
+
+        Returns:
+            Liste mit Name, Anzeigename, Zustand, Dauer in Sekunden und Fehlermeldung je Schritt
+        """
+        return [
+            {
+                "name": step.name,
+                "label": step.label,
+                "state": step.state,
+                "seconds": round(step.seconds, 2) if step.seconds is not None else None,
+                "error": step.error
+            }
+            for step in self.steps.values()
+        ]
+
+
+def get_shared_warmup(steps: List[Tuple[str, str, Callable[[], Any]]]) -> BackgroundWarmup:
+    """
+    Gibt das prozessweit gemeinsame Aufwärmen zurück und startet es beim ersten Aufruf.
+    Spätere Aufrufe (weitere Sessions, Reruns) liefern dasselbe Objekt, ihre Schritte werden ignoriert.
+
+    Args:
+        steps: Schritte als (Name, Anzeigename, Funktion)
+
+    Returns:
+        Das laufende oder abgeschlossene Aufwärmen
+    """
+    return shared_resources.get(("warmup",), lambda: BackgroundWarmup(steps).start())